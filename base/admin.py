@@ -1,3 +1,7 @@
 from django.contrib import admin
+from base.models import Curve, PointBlock, Result
 
 # Register your models here.
+admin.site.register(Curve)
+admin.site.register(PointBlock)
+admin.site.register(Result)
@@ -0,0 +1,201 @@
+import random
+from itertools import islice
+
+from base.curves import t_edwards, s_weirstrass_curve, montgomery_curve
+from base.curves import ecm, glv, shards, tables
+from base import singleflight
+from base.models import Curve, PointBlock
+
+# Catalogue of computed curve facts. Counting the points of a curve
+# is an O(p) scan, so the group order, its factorisation, a generator
+# and the per-block point counts are worked out once per curve and
+# read back from the database afterwards.
+
+# pages of generatePoints() span 1000 x values, the blocks are a
+# multiple of that so that a page never straddles two blocks
+BLOCK_SIZE = 1000
+MAX_BLOCKS = 4096
+
+# points on a page of seek_points()
+PAGE_POINTS = 1000
+
+# seeking may count every block of the curve, about p legendre
+# symbols, so points are only numbered in fields below this
+SEEK_MAX_P = 10**7
+
+# above this size the order of a y^2 = x^3 + b curve comes from its
+# complex multiplication (glv.cm_order()) instead of a scan
+CM_THRESHOLD = 10**6
+
+# fields from this size on are counted by a process pool
+PARALLEL_THRESHOLD = 10**6
+
+
+def curve_module(opt):
+    if opt == '2':
+        return s_weirstrass_curve
+    elif opt == '3':
+        return montgomery_curve
+    return t_edwards
+
+
+def curve_key(opt, a, d, p):
+    return '{}:{}:{}:{}'.format(opt, a, d, p)
+
+
+def block_size(p):
+    return BLOCK_SIZE * max(1, -(-p // (BLOCK_SIZE * MAX_BLOCKS)))
+
+
+def lookup(opt, a, d, p):
+    """Return the catalogued Curve for the parameters, or None."""
+    return Curve.objects.filter(key=curve_key(opt, a, d, p)).first()
+
+
+def get_curve(opt, a, d, p):
+    curve, _ = Curve.objects.get_or_create(
+        key=curve_key(opt, a, d, p),
+        defaults={'opt': opt, 'a': str(a), 'd': str(d), 'p': str(p), 'block_size': str(block_size(p))},
+    )
+    return curve
+
+
+def factorise(n):
+    # trial division, rho and ECM across a process pool, see curves/ecm.py
+    return ecm.factorise(n)
+
+
+def block_count(curve):
+    return -(-int(curve.p) // int(curve.block_size))
+
+
+def count_blocks(curve):
+    """Count the points of every x-block, store them and return the group order."""
+    module = curve_module(curve.opt)
+    a, d, p = int(curve.a), int(curve.d), int(curve.p)
+    counts = list(curve.blocks.values_list('count', flat=True))
+    # seek_points() may have counted them all already
+    if len(counts) != block_count(curve):
+        size = int(curve.block_size)
+        # small fields are counted in the request, larger ones across all cores
+        jobs = 1 if p < PARALLEL_THRESHOLD else None
+        counts = shards.count_blocks(curve.opt, a, d, p, size, jobs)
+        blocks = [PointBlock(curve=curve, index=index, count=count) for index, count in enumerate(counts)]
+        PointBlock.objects.filter(curve=curve).delete()
+        PointBlock.objects.bulk_create(blocks, batch_size=500)
+    return sum(counts) + module.points_at_infinity(a, d, p)
+
+
+def seek_block(curve, index):
+    """Return (block, points before it) of the x-block holding affine point number index
+    (from 0, in x order), or None past the last point. Blocks up to it that were never
+    counted are counted and stored, so the index grows with the pages asked for."""
+    a, d, p = int(curve.a), int(curve.d), int(curve.p)
+    size = int(curve.block_size)
+    stored = dict(curve.blocks.values_list('index', 'count'))
+    fresh = {}
+    if p >= PARALLEL_THRESHOLD:
+        # about one point per x, the blocks up to the one after index // size
+        # are counted across all cores first
+        missing = [b for b in range(min(block_count(curve), index // size + 2)) if b not in stored]
+        fresh = shards.count_listed(curve.opt, a, d, p, size, missing)
+    counted, before, found = [], 0, None
+    for block in range(block_count(curve)):
+        count = stored.get(block)
+        if count is None:
+            count = fresh.get(block)
+            if count is None:
+                count = shards.count_range(curve.opt, a, d, p, block * size, (block + 1) * size)
+            counted.append(PointBlock(curve=curve, index=block, count=count))
+        if before + count > index:
+            found = block, before
+            break
+        before += count
+    PointBlock.objects.bulk_create(counted, batch_size=500, ignore_conflicts=True)
+    return found
+
+
+def seek_points(opt, a, d, p, index, count=PAGE_POINTS):
+    """Return the affine points number index to index + count - 1 (from 0, in the order
+    generatePoints() lists them) as ([x], [y]), without scanning the blocks before them.
+
+    Raises ValueError from SEEK_MAX_P on, where the blocks are too long to count."""
+    if p >= SEEK_MAX_P:
+        raise ValueError('points are only numbered for p below {}, page them by x instead'.format(SEEK_MAX_P))
+    curve = get_curve(opt, a, d, p)
+    found = seek_block(curve, index)
+    if found is None:
+        return [], []
+    block, before = found
+    x, skip = shards.locate(opt, a, d, p, block * int(curve.block_size), index - before)
+    points = list(islice(shards.points_range(opt, a, d, p, x, p), skip, skip + count))
+    return [pt[0] for pt in points], [pt[1] for pt in points]
+
+
+def find_generator(opt, a, d, p, order, factors, tries=100):
+    """Return (G, n), G a random point of the largest prime order n dividing order."""
+    module = curve_module(opt)
+    if not factors:
+        return None, 1
+    n = factors[-1][0]
+    h = order // n
+    for _ in range(tries):
+        pt = module.liftpoint(a, d, p, random.randrange(p))
+        if pt is None:
+            continue
+        g = module.multiplypoint(a, d, p, pt, h)
+        if g != module.IDENTITY and g[1] != -1:
+            return g, n
+    return None, n
+
+
+def facts(opt, a, d, p):
+    """Catalogued Curve with order, factorisation, cofactor and generator filled in."""
+    curve = get_curve(opt, a, d, p)
+    if curve.order is None:
+        # concurrent requests for the same curve count it once
+        curve = singleflight.run(('facts', curve.key), lambda: fill_facts(curve),
+                                 lambda: Curve.objects.filter(key=curve.key, order__isnull=False).first())
+    prepare(curve)
+    return curve
+
+
+def fill_facts(curve):
+    """Work out and save the order, factorisation, cofactor and generator of curve."""
+    opt, a, d, p = curve.opt, int(curve.a), int(curve.d), int(curve.p)
+    order = None
+    if opt == '2' and glv.applies(a, p) and p > CM_THRESHOLD:
+        order = glv.cm_order(d % p, p)
+    if order is None:
+        order = count_blocks(curve)
+    factors = factorise(order)
+    g, n = find_generator(opt, a, d, p, order, factors)
+    curve.order = str(order)
+    curve.factors = factors
+    curve.subgroup_order = str(n)
+    curve.cofactor = str(order // n)
+    if g is not None:
+        curve.gx, curve.gy = str(g[0]), str(g[1])
+    curve.save()
+    return curve
+
+
+def prepare(curve):
+    """Set up the in-process precomputations a catalogued curve allows."""
+    if curve.order is None:
+        return
+    a, d, p = int(curve.a), int(curve.d), int(curve.p)
+    if curve.opt == '2' and glv.applies(a, p) and curve.factors == [[int(curve.order), 1]]:
+        glv.register(d, p, int(curve.order))
+
+
+def preload_tables(count=tables.MAX_TABLES):
+    """Build the group tables of the most recently used small catalogued curves."""
+    curves = []
+    for curve in Curve.objects.order_by('-updated'):
+        if int(curve.p) < tables.LIMIT:
+            curves.append((curve.opt, int(curve.a), int(curve.d), int(curve.p)))
+        if len(curves) == count:
+            break
+    tables.preload(curves)
+    return curves
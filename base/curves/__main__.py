@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import random
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from base.curves import dispatch, planner, search, shards, validate
+
+#
+# Command line batch computations, without Django
+#
+#   python -m base.curves [--jobs N] [--curve <opt>:<a>:<d>:<p>] < ops.ndjson > results.ndjson
+#
+# reads one JSON operation per line from stdin and writes one JSON
+# result per line to stdout, in the order of the input, as soon as it
+# and every line before it are done (anything else goes to stderr) :
+#
+#   {"op": "enumerate", "start": x, "count": n}  the n points from x on
+#   {"op": "add", "p1": [x, y], "p2": [x, y]}    null for the identity of
+#   {"op": "mul", "point": [x, y], "k": k}       a Weierstrass curve
+#   {"op": "dlog", "point": [x, y], "base": [x, y], "n": n, "factors": [[q, e], ...]}
+#                                                 k with point = k*base,
+#                                                 -1 when there is none,
+#                                                 by the cheapest method
+#                                                 when n (a multiple of
+#                                                 the order of base) is
+#                                                 given (see planner.py)
+#   {"op": "plan", ...}                           the methods of a dlog
+#                                                 and their estimates
+#   {"op": "count"}                               #E, see search.order()
+#
+# every operation names its curve with "curve": "<opt>:<a>:<d>:<p>"
+# (as catalogue.curve_key()) unless --curve gives one, an "id" is
+# copied to the result, which is {"id": .., "result": ..} or
+# {"id": .., "error": ".."} for a line that failed
+#
+# with --jobs the lines are handed to a process pool CHUNK at a time,
+# at most 4 chunks per worker in flight, so memory stays bounded
+# whatever the length of the input
+#
+
+CHUNK = 64
+# points of an enumerate without "count"
+PAGE_POINTS = 1000
+
+def parse_curve(key):
+  opt, a, d, p = key.split(':')
+  if opt not in ('1', '2', '3'):
+    raise ValueError('unknown curve model {}'.format(opt))
+  return opt, int(a), int(d), int(p)
+
+def point(curve, value):
+  x, y = value
+  pt = (int(x), int(y))
+  if not validate.on_curve(*curve, pt):
+    raise ValueError('({}, {}) is not on the curve'.format(*pt))
+  return pt
+
+def coords(pt):
+  # the Weierstrass identity has no coordinates
+  return None if pt == dispatch.MODULES['2'].IDENTITY else list(pt)
+
+#
+# run() :- the result of the operation @op
+#
+
+def run(op, default=None):
+  key = op.get('curve', default)
+  if key is None:
+    raise ValueError('no curve, pass "curve": "<opt>:<a>:<d>:<p>" or --curve')
+  curve = opt, a, d, p = parse_curve(key)
+  name = op.get('op')
+  if name == 'enumerate':
+    start = int(op.get('start', 0))
+    count = int(op.get('count', PAGE_POINTS))
+    return [list(pt) for pt in islice(shards.points_range(opt, a, d, p, start, p), count)]
+  if name == 'add':
+    return coords(dispatch.addpoints(opt, a, d, p, point(curve, op['p1']), point(curve, op['p2'])))
+  if name == 'mul':
+    return coords(dispatch.multiplypoint(opt, a, d, p, point(curve, op['point']), int(op['k'])))
+  if name == 'dlog':
+    n = op.get('n')
+    if n is None:
+      return dispatch.bsgs(opt, a, d, p, point(curve, op['point']), point(curve, op['base']))
+    return planner.solve(opt, a, d, p, point(curve, op['point']), point(curve, op['base']), int(n), op.get('factors'), jobs=1)
+  if name == 'plan':
+    return planner.plan(opt, a, d, p, point(curve, op['point']), point(curve, op['base']), int(op['n']), op.get('factors'))
+  if name == 'count':
+    n = search.order(opt, a, d, p, random.Random(op.get('seed', 0)))
+    if n is None:
+      raise ValueError('order undecided')
+    return n
+  raise ValueError('unknown op {}'.format(name))
+
+def answer(line, default=None):
+  op = {}
+  try:
+    op = json.loads(line)
+    res = {'result': run(op, default)}
+  except Exception as e:
+    res = {'error': '{}: {}'.format(type(e).__name__, e)}
+  if isinstance(op, dict) and 'id' in op:
+    res = {'id': op['id'], **res}
+  return json.dumps(res)
+
+def answer_chunk(lines, default=None):
+  return [answer(line, default) for line in lines]
+
+def chunks(lines, size):
+  chunk = []
+  for line in lines:
+    if line.strip():
+      chunk.append(line)
+      if len(chunk) == size:
+        yield chunk
+        chunk = []
+  if chunk:
+    yield chunk
+
+#
+# process() :- the result line of every operation line, in order
+#
+
+def process(lines, jobs=1, default=None):
+  if jobs == 1:
+    for chunk in chunks(lines, 1):
+      yield from answer_chunk(chunk, default)
+    return
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    pending = deque()
+    for chunk in chunks(lines, CHUNK):
+      pending.append(pool.submit(answer_chunk, chunk, default))
+      if len(pending) >= 4*jobs:
+        yield from pending.popleft().result()
+    while pending:
+      yield from pending.popleft().result()
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog='python -m base.curves',
+                                   description='Curve operations read as JSON lines from stdin, results written as JSON lines to stdout.')
+  parser.add_argument('--jobs', type=int, default=1, help='worker processes, 0 for all cores')
+  parser.add_argument('--curve', default=None, help='<opt>:<a>:<d>:<p> of the lines without a "curve"')
+  args = parser.parse_args(argv)
+  jobs = args.jobs or os.cpu_count() or 1
+  # the curve modules print their steps : the results go to a copy of
+  # stdout, and file descriptor 1 (of this process and of the workers
+  # it forks) is pointed at stderr
+  sys.stdout.flush()
+  out = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+  os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+  for res in process(sys.stdin, jobs, args.curve):
+    out.write(res + '\n')
+    out.flush()
+
+if __name__ == '__main__':
+  main()
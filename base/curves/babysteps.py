@@ -0,0 +1,229 @@
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+from math import isqrt
+
+from base.curves import birational as br
+from base.curves import tables
+
+#
+# Out of core baby-step giant-step on y^2 = x^3 + ax + b
+#
+# the baby steps i*P, i = 1..m, are written as fixed width records
+# (key, i) of 12 bytes, key a 64 bit hash of the x coordinate, so a
+# table of 2^28 steps takes 3 GiB of disk and no memory : the records
+# are spread over SORT_BUCKETS files by the top bits of the key while
+# they are generated, each file is sorted on its own and appended to
+# the table, which ends up sorted by key and is read back through a
+# memory map, a giant step is a binary search (np.searchsorted) over
+# it, CHUNK probes at a time
+#
+# x only keys match both i*P and -i*P, so with the giant stride
+# s = 2m + 1 every k = sj + r, |r| <= m, is found and the same work
+# covers twice the range of the in memory bsgs ; the sign of r comes
+# from the y of i*P, worked out for the (rare) matching keys only,
+# and a key collision is caught by checking the answer
+#
+# tables live in DIRECTORY (TEDWARDS_BSGS_DIR, a directory of the
+# temporary one per user otherwise) named after the curve, the base
+# point and m, they are written under a temporary name and renamed
+# once complete : they survive restarts, every process dividing by
+# the same base maps the same file (and shares its pages), and a
+# table with more steps than needed is used as it is
+#
+# DIRECTORY is only used when this user owns it and nobody else can
+# reach it (mode 0700, see check_directory()), a table planted or
+# swapped by another user could hide every answer
+#
+# the tables of DIRECTORY are a cache of at most MAX_BYTES : using a
+# table marks it as recently used (its mtime) and the least recently
+# used ones are deleted to make room for a new one, a process still
+# mapping a deleted table keeps reading it until it unmaps it
+#
+
+UID = os.getuid() if hasattr(os, 'getuid') else 0
+DIRECTORY = os.environ.get('TEDWARDS_BSGS_DIR', os.path.join(tempfile.gettempdir(), 'tedwards-bsgs-{}'.format(UID)))
+
+# orders from which dispatch.bsgs() divides out of core
+MIN_ORDER = 1 << 40
+
+# disk the tables of DIRECTORY may take together, one table larger
+# than this is still built, and deleted before the next one
+MAX_BYTES = int(os.environ.get('TEDWARDS_BSGS_MAX_BYTES', 4 << 30))
+RECORD_BYTES = 12
+
+SORT_BUCKETS = 256
+CHUNK = 1 << 16
+
+MASK = (1 << 64) - 1
+# odd multiplier of Fibonacci hashing, spreads the low bits of x to
+# the top ones the buckets are taken from
+MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+def record_dtype():
+  import numpy as np
+
+  return np.dtype([('key', '<u8'), ('index', '<u4')])
+
+def key(x):
+  return (x & MASK) * MULTIPLIER & MASK
+
+def base_name(a, b, p, P):
+  data = '{}:{}:{}:{}:{}'.format(a % p, b % p, p, P[0], P[1]).encode()
+  return hashlib.sha256(data).hexdigest()[:32]
+
+#
+# build() :- write the table of i*P, i = 1..m, to @path
+#
+
+def build(a, b, p, P, m, path):
+  import numpy as np
+
+  dtype = record_dtype()
+  work = tempfile.mkdtemp(dir=os.path.dirname(path))
+  try:
+    buckets = [open(os.path.join(work, '{:03d}'.format(i)), 'wb') for i in range(SORT_BUCKETS)]
+    shift = 64 - SORT_BUCKETS.bit_length() + 1
+    pt, i = None, 0
+    while i < m:
+      count = min(CHUNK, m - i)
+      keys = []
+      for _ in range(count):
+        pt = tables.w_add(a, p, pt, P)
+        keys.append(0 if pt is None else key(pt[0]))
+      records = np.empty(count, dtype=dtype)
+      records['key'] = np.array(keys, dtype=np.uint64)
+      records['index'] = np.arange(i + 1, i + count + 1)
+      i += count
+      top = records['key'] >> np.uint64(shift)
+      order = np.argsort(top, kind='stable')
+      records, top = records[order], top[order]
+      edges = np.searchsorted(top, np.arange(SORT_BUCKETS + 1))
+      for j in range(SORT_BUCKETS):
+        if edges[j] < edges[j + 1]:
+          records[edges[j]:edges[j + 1]].tofile(buckets[j])
+    for f in buckets:
+      f.close()
+
+    partial = os.path.join(work, 'table')
+    with open(partial, 'wb') as out:
+      for f in buckets:
+        records = np.fromfile(f.name, dtype=dtype)
+        records[np.argsort(records['key'], kind='stable')].tofile(out)
+    os.replace(partial, path)
+  finally:
+    shutil.rmtree(work, ignore_errors=True)
+
+#
+# evict() :- delete the least recently used tables of @directory
+# but @keep until they take at most MAX_BYTES - @room
+#
+
+def evict(directory, room, keep=None):
+  found = []
+  for path in glob.glob(os.path.join(directory, '*.bsgs')):
+    try:
+      st = os.stat(path)
+    except FileNotFoundError:
+      continue
+    found.append((st.st_mtime_ns, st.st_size, path))
+  total = sum(size for _, size, _ in found)
+  for _, size, path in sorted(found):
+    if total + room <= MAX_BYTES:
+      break
+    if path == keep:
+      continue
+    try:
+      os.remove(path)
+    except FileNotFoundError:
+      pass
+    total -= size
+
+#
+# check_directory() :- create @directory (mode 0700) when missing,
+# PermissionError unless this user owns it and nobody else can reach it
+#
+
+def check_directory(directory):
+  os.makedirs(directory, mode=0o700, exist_ok=True)
+  st = os.stat(directory)
+  if hasattr(os, 'getuid') and (st.st_uid != UID or st.st_mode & 0o077):
+    raise PermissionError('{} is not a directory only this user can reach, set TEDWARDS_BSGS_DIR'.format(directory))
+
+#
+# open_table() :- (memory mapped records, m) of a table of at least
+# @m steps of P, built when there is none
+#
+
+def open_table(a, b, p, P, m, directory=None):
+  import numpy as np
+
+  directory = directory or DIRECTORY
+  check_directory(directory)
+  name = base_name(a, b, p, P)
+  sizes = []
+  for path in glob.glob(os.path.join(directory, name + '-*.bsgs')):
+    size = int(path.rsplit('-', 1)[1].split('.')[0])
+    if size >= m:
+      sizes.append(size)
+  if sizes:
+    m = min(sizes)
+  path = os.path.join(directory, '{}-{}.bsgs'.format(name, m))
+  if sizes:
+    try:
+      os.utime(path)
+      return np.memmap(path, dtype=record_dtype(), mode='r'), m
+    except FileNotFoundError:
+      # evicted by another process in the meantime
+      pass
+  evict(directory, m * RECORD_BYTES)
+  build(a, b, p, P, m, path)
+  evict(directory, 0, path)
+  return np.memmap(path, dtype=record_dtype(), mode='r'), m
+
+#
+# solve() :- k mod n with p1 = k*p2, -1 when there is none, points
+# with the IDENTITY of s_weirstrass_curve.py
+#
+
+def solve(a, b, p, p1, p2, n, directory=None):
+  import numpy as np
+
+  Q = None if p1 == br.WEIERSTRASS_IDENTITY else (p1[0] % p, p1[1] % p)
+  P = None if p2 == br.WEIERSTRASS_IDENTITY else (p2[0] % p, p2[1] % p)
+  if Q is None:
+    return 0
+  if P is None:
+    return -1
+  records, m = open_table(a, b, p, P, isqrt(n // 2) + 1, directory)
+  keys = records['key']
+  s = 2*m + 1
+  step = tables.w_neg(p, tables.w_mul(a, p, P, s))
+  R, j = Q, 0
+  # k = sj + r up to n - 1 with |r| <= m
+  while s*j <= n + m:
+    chunk = []
+    while len(chunk) < CHUNK and s*(j + len(chunk)) <= n + m:
+      chunk.append(R)
+      R = tables.w_add(a, p, R, step)
+    probes = np.array([0 if pt is None else key(pt[0]) for pt in chunk], dtype=np.uint64)
+    lo = np.searchsorted(keys, probes, side='left')
+    hi = np.searchsorted(keys, probes, side='right')
+    hits = np.nonzero(hi > lo)[0].tolist() + [c for c, pt in enumerate(chunk) if pt is None]
+    for c in sorted(set(hits)):
+      pt = chunk[c]
+      if pt is None:
+        return s*(j + c) % n
+      for r in range(int(lo[c]), int(hi[c])):
+        i = int(records['index'][r])
+        iP = tables.w_mul(a, p, P, i)
+        if iP is None or iP[0] != pt[0]:
+          continue
+        k = (s*(j + c) + (i if iP[1] == pt[1] else -i)) % n
+        if tables.w_mul(a, p, P, k) == Q:
+          return k
+    j += len(chunk)
+  return -1
@@ -0,0 +1,255 @@
+from functools import lru_cache
+import random
+
+from gmpy2 import invert, legendre, powmod
+
+#
+# Birational maps between the three curve models
+#
+# Twisted Edwards   : ax^2 + y^2 = 1 + dx^2y^2
+# Montgomery        : Bv^2 = u^3 + Au^2 + u
+# Short Weierstrass : y^2 = x^3 + ax + b
+#
+# every twisted Edwards curve is birational to a Montgomery curve
+# and every Montgomery curve to a short Weierstrass one, a short
+# Weierstrass curve has a Montgomery (and so an Edwards) model only
+# when x^3 + ax + b has a root alpha with 3*alpha^2 + a a square
+#
+# the maps are group isomorphisms, points are passed as the (x, y)
+# tuples used by the curve modules with the IDENTITY of each module
+# for the neutral element, a point without an affine image in the
+# target model (the points at infinity of an Edwards curve) maps
+# to None
+#
+
+EDWARDS_IDENTITY = (0, 1)
+MONTGOMERY_IDENTITY = (0, 1)
+WEIERSTRASS_IDENTITY = (None, None)
+
+
+def inv(x, p):
+  return int(invert(x, p))
+
+#
+# curve maps
+#
+
+def edwards_to_montgomery(a, d, p):
+  t = inv(a - d, p)
+  return (2*(a + d)*t % p, 4*t % p)
+
+def montgomery_to_edwards(A, B, p):
+  t = inv(B, p)
+  return ((A + 2)*t % p, (A - 2)*t % p)
+
+def montgomery_to_weierstrass(A, B, p):
+  a = (3 - A*A) * inv(3*B*B, p) % p
+  b = (2*A*A*A - 9*A) * inv(27*B*B*B, p) % p
+  return (a, b)
+
+#
+# weierstrass_to_montgomery() :- Montgomery model (A, B, alpha, s)
+# of y^2 = x^3 + ax + b, or None if there is none
+#
+# with alpha a root of the cubic and s = 1/sqrt(3*alpha^2 + a)
+# the curve is Bv^2 = u^3 + Au^2 + u for A = 3*alpha*s, B = s
+# under (u, v) = (s(x - alpha), sy)
+#
+
+@lru_cache(maxsize=256)
+def weierstrass_to_montgomery(a, b, p):
+  for alpha in cubic_roots(a, b, p):
+    t = (3*alpha*alpha + a) % p
+    if t == 0 or legendre(t, p) != 1:
+      continue
+    s = inv(sqrt_mod(t, p), p)
+    return (3*alpha*s % p, s, alpha, s)
+  return None
+
+def edwards_to_weierstrass(a, d, p):
+  return montgomery_to_weierstrass(*edwards_to_montgomery(a, d, p), p)
+
+#
+# point maps
+#
+
+def edwards_point_to_montgomery(a, d, p, pt):
+  x, y = pt[0] % p, pt[1] % p
+  if x == 0:
+    return MONTGOMERY_IDENTITY if y == 1 else (0, 0)
+  u = (1 + y) * inv(1 - y, p) % p
+  return (u, u * inv(x, p) % p)
+
+def montgomery_point_to_edwards(A, B, p, pt):
+  if pt == MONTGOMERY_IDENTITY:
+    return EDWARDS_IDENTITY
+  u, v = pt[0] % p, pt[1] % p
+  if u == 0 and v == 0:
+    return (0, p - 1)
+  if v == 0 or (u + 1) % p == 0:
+    return None
+  return (u * inv(v, p) % p, (u - 1) * inv(u + 1, p) % p)
+
+def montgomery_point_to_weierstrass(A, B, p, pt):
+  if pt == MONTGOMERY_IDENTITY:
+    return WEIERSTRASS_IDENTITY
+  t = inv(B, p)
+  return ((pt[0]*t + A*inv(3*B, p)) % p, pt[1]*t % p)
+
+def weierstrass_point_to_montgomery(A, B, alpha, s, p, pt):
+  if pt == WEIERSTRASS_IDENTITY:
+    return MONTGOMERY_IDENTITY
+  return (s*(pt[0] - alpha) % p, s*pt[1] % p)
+
+def edwards_point_to_weierstrass(a, d, p, pt):
+  A, B = edwards_to_montgomery(a, d, p)
+  return montgomery_point_to_weierstrass(A, B, p, edwards_point_to_montgomery(a, d, p, pt))
+
+#
+# helpers for the Weierstrass to Montgomery map
+#
+
+#
+# sqrt_mod() :- square root of a quadratic residue n modulo an
+# odd prime p (Tonelli-Shanks)
+#
+
+def sqrt_mod(n, p):
+  n %= p
+  if n == 0:
+    return 0
+  if p % 4 == 3:
+    return int(powmod(n, (p + 1)//4, p))
+  q, s, z = tonelli_constants(p)
+  m, c, t, r = s, z, int(powmod(n, q, p)), int(powmod(n, (q + 1)//2, p))
+  while t != 1:
+    i, t2 = 0, t
+    while t2 != 1:
+      t2 = t2*t2 % p
+      i += 1
+    b = pow(c, 1 << (m - i - 1), p)
+    m, c = i, b*b % p
+    t, r = t*c % p, r*b % p
+  return r
+
+#
+# tonelli_constants() :- (q, s, z^q) with p - 1 = q*2^s, q odd, and
+# z a non residue, worked out once per p
+#
+
+@lru_cache(maxsize=256)
+def tonelli_constants(p):
+  q, s = p - 1, 0
+  while q % 2 == 0:
+    q //= 2
+    s += 1
+  z = 2
+  while legendre(z, p) != -1:
+    z += 1
+  return q, s, pow(z, q, p)
+
+#
+# batch_inv() :- inverses of the non zero @values modulo p with a
+# single modular inversion (Montgomery's trick), 0 maps to 0
+#
+
+def batch_inv(values, p):
+  prefix, acc = [], 1
+  for v in values:
+    prefix.append(acc)
+    if v:
+      acc = acc * v % p
+  t = inv(acc, p)
+  res = [0] * len(values)
+  for i in range(len(values) - 1, -1, -1):
+    if values[i]:
+      res[i] = t * prefix[i] % p
+      t = t * values[i] % p
+  return res
+
+#
+# polynomials over F_p are lists of coefficients, lowest degree
+# first, used to find the roots of x^3 + ax + b
+#
+
+def poly_trim(f):
+  while f and f[-1] == 0:
+    f.pop()
+  return f
+
+def poly_mulmod(f, g, m, p):
+  r = [0] * (len(f) + len(g) - 1) if f and g else []
+  for i, x in enumerate(f):
+    for j, y in enumerate(g):
+      r[i + j] = (r[i + j] + x*y) % p
+  return poly_mod(r, m, p)
+
+def poly_mod(f, m, p):
+  f = poly_trim(list(f))
+  lead = inv(m[-1], p)
+  while len(f) >= len(m):
+    c = f[-1] * lead % p
+    shift = len(f) - len(m)
+    for i, y in enumerate(m):
+      f[shift + i] = (f[shift + i] - c*y) % p
+    poly_trim(f)
+  return f
+
+def poly_powmod(f, e, m, p):
+  r = [1]
+  while e:
+    if e & 1:
+      r = poly_mulmod(r, f, m, p)
+    f = poly_mulmod(f, f, m, p)
+    e >>= 1
+  return r
+
+def poly_gcd(f, g, p):
+  f, g = poly_trim(list(f)), poly_trim(list(g))
+  while g:
+    f, g = g, poly_mod(f, g, p)
+  if f:
+    lead = inv(f[-1], p)
+    f = [c*lead % p for c in f]
+  return f
+
+def poly_sub(f, g, p):
+  n = max(len(f), len(g))
+  f, g = f + [0]*(n - len(f)), g + [0]*(n - len(g))
+  return poly_trim([(x - y) % p for x, y in zip(f, g)])
+
+#
+# poly_roots() :- distinct roots of f in F_p, the gcd with x^p - x
+# keeps the linear factors which Cantor-Zassenhaus then splits
+#
+
+def poly_roots(f, p):
+  g = poly_gcd(f, poly_sub(poly_powmod([0, 1], p, f, p), [0, 1], p), p)
+  return split_roots(g, p)
+
+def split_roots(g, p):
+  if len(g) <= 1:
+    return []
+  if len(g) == 2:
+    return [(-g[0]) * inv(g[1], p) % p]
+  while True:
+    r = random.randrange(p)
+    h = poly_gcd(g, poly_sub(poly_powmod([r, 1], (p - 1)//2, g, p), [1], p), p)
+    if 1 < len(h) < len(g):
+      q = poly_divexact(g, h, p)
+      return split_roots(h, p) + split_roots(q, p)
+
+def poly_divexact(f, g, p):
+  f = list(f)
+  q = [0] * (len(f) - len(g) + 1)
+  lead = inv(g[-1], p)
+  for k in range(len(q) - 1, -1, -1):
+    c = f[k + len(g) - 1] * lead % p
+    q[k] = c
+    for i, y in enumerate(g):
+      f[k + i] = (f[k + i] - c*y) % p
+  return q
+
+@lru_cache(maxsize=256)
+def cubic_roots(a, b, p):
+  return tuple(sorted(poly_roots([b % p, a % p, 0, 1], p)))
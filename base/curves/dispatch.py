@@ -0,0 +1,348 @@
+from base.curves import birational as br
+from base.curves import babysteps, glv, mov, primes, smart, tables
+from base.curves import t_edwards, s_weirstrass_curve, montgomery_curve
+
+#
+# Dispatch layer running every operation in the curve model with the
+# cheapest arithmetic for it, the result is mapped back to the model
+# the user chose (@opt : '1' Twisted Edwards, '2' Short Weierstrass,
+# '3' Montgomery, as in the home form)
+#
+# scalar multiplication : x-only Montgomery ladder, no inversion per
+#                         step, y is recovered once at the end (or
+#                         the GLV endomorphism when there is one)
+# addition, subtraction,
+# doubling              : Edwards unified addition law
+# bsgs, point counting  : Short Weierstrass, whose addition needs a
+#                         single inversion and whose right hand side
+#                         needs none
+#
+# fields below tables.LIMIT use the full group table of the curve
+# instead, every operation is then a table lookup
+#
+# whenever the target model does not exist for the curve (a short
+# Weierstrass curve without a point of order 2) or a point has no
+# affine image in it, the operation runs in the user's own model
+#
+# a Twisted Edwards curve whose d is a square has points at infinity
+# (the u = -1 and the v = 0 but (0, 0) points of its Montgomery
+# curve), a result
+# there has no (x, y) at all and PointAtInfinity is raised for it
+#
+
+MODULES = {'1': t_edwards, '2': s_weirstrass_curve, '3': montgomery_curve}
+
+class PointAtInfinity(ArithmeticError):
+  pass
+
+#
+# to_montgomery(), point_to_montgomery(), point_from_montgomery() :-
+# (A, B) of the Montgomery model and the point maps to and from it,
+# None when there is none
+#
+
+def to_montgomery(opt, a, d, p):
+  if opt == '3':
+    return (a % p, d % p)
+  if opt == '1':
+    return br.edwards_to_montgomery(a, d, p)
+  m = br.weierstrass_to_montgomery(a % p, d % p, p)
+  return None if m is None else m[:2]
+
+def point_to_montgomery(opt, a, d, p, pt):
+  if opt == '3':
+    return (pt[0] % p, pt[1] % p)
+  if opt == '1':
+    return br.edwards_point_to_montgomery(a, d, p, pt)
+  A, B, alpha, s = br.weierstrass_to_montgomery(a % p, d % p, p)
+  return br.weierstrass_point_to_montgomery(A, B, alpha, s, p, point_to_weierstrass(opt, a, d, p, pt))
+
+def point_from_montgomery(opt, a, d, p, pt):
+  if opt == '3':
+    return pt
+  A, B = to_montgomery(opt, a, d, p)
+  if opt == '1':
+    return br.montgomery_point_to_edwards(A, B, p, pt)
+  return br.montgomery_point_to_weierstrass(A, B, p, pt)
+
+def to_edwards(opt, a, d, p):
+  if opt == '1':
+    return (a % p, d % p)
+  m = to_montgomery(opt, a, d, p)
+  if m is None or (m[0] + 2) % p == 0 or (m[0] - 2) % p == 0:
+    return None
+  return br.montgomery_to_edwards(*m, p)
+
+def point_to_edwards(opt, a, d, p, pt):
+  if opt == '1':
+    return (pt[0] % p, pt[1] % p)
+  A, B = to_montgomery(opt, a, d, p)
+  return br.montgomery_point_to_edwards(A, B, p, point_to_montgomery(opt, a, d, p, pt))
+
+def point_from_edwards(opt, a, d, p, pt):
+  if opt == '1':
+    return pt
+  ea, ed = to_edwards(opt, a, d, p)
+  return point_from_montgomery(opt, a, d, p, br.edwards_point_to_montgomery(ea, ed, p, pt))
+
+def to_weierstrass(opt, a, d, p):
+  if opt == '2':
+    return (a % p, d % p)
+  if opt == '1':
+    return br.edwards_to_weierstrass(a, d, p)
+  return br.montgomery_to_weierstrass(a % p, d % p, p)
+
+def point_to_weierstrass(opt, a, d, p, pt):
+  if opt == '2':
+    return pt if pt == br.WEIERSTRASS_IDENTITY else (pt[0] % p, pt[1] % p)
+  if opt == '1':
+    return br.edwards_point_to_weierstrass(a, d, p, pt)
+  return br.montgomery_point_to_weierstrass(a % p, d % p, p, pt)
+
+#
+# ladder() :- x-only Montgomery ladder on Bv^2 = u^3 + Au^2 + u
+#
+# keeps R0 = k'P and R1 = (k'+1)P as projective (X:Z) pairs for
+# the prefix k' of the bits of k, the difference R1 - R0 = P is
+# known so xADD needs only u(P)
+#
+# returns the projective x coordinates of kP and (k+1)P
+#
+
+def ladder(A, p, u, k):
+  red = primes.fast_reducer(p)
+  if red is not None:
+    return ladder_reduced(A, p, u, k, red)
+  a24 = (A + 2) * br.inv(4, p) % p
+  x0, z0, x1, z1 = 1, 0, u, 1
+  for i in range(k.bit_length() - 1, -1, -1):
+    if (k >> i) & 1:
+      x0, z0, x1, z1 = x1, z1, x0, z0
+    # xADD(R0, R1) into R1 and xDBL(R0) into R0
+    t1 = (x0 - z0) * (x1 + z1) % p
+    t2 = (x0 + z0) * (x1 - z1) % p
+    x1, z1 = (t1 + t2) * (t1 + t2) % p, u * (t1 - t2) * (t1 - t2) % p
+    s, t = (x0 + z0) * (x0 + z0) % p, (x0 - z0) * (x0 - z0) % p
+    c = s - t
+    x0, z0 = s * t % p, c * (t + a24 * c) % p
+    if (k >> i) & 1:
+      x0, z0, x1, z1 = x1, z1, x0, z0
+  return x0, z0, x1, z1
+
+#
+# ladder_reduced() :- ladder() with the shift and add reduction
+# @red of a special prime in place of % (see primes.py)
+#
+
+def ladder_reduced(A, p, u, k, red):
+  a24 = (A + 2) * br.inv(4, p) % p
+  x0, z0, x1, z1 = 1, 0, u, 1
+  for i in range(k.bit_length() - 1, -1, -1):
+    if (k >> i) & 1:
+      x0, z0, x1, z1 = x1, z1, x0, z0
+    t1 = red((x0 - z0) * (x1 + z1))
+    t2 = red((x0 + z0) * (x1 - z1))
+    x1, z1 = red((t1 + t2) * (t1 + t2)), red(u * red((t1 - t2) * (t1 - t2)))
+    s, t = red((x0 + z0) * (x0 + z0)), red((x0 - z0) * (x0 - z0))
+    c = s - t
+    x0, z0 = red(s * t), red(c * red(t + a24 * c))
+    if (k >> i) & 1:
+      x0, z0, x1, z1 = x1, z1, x0, z0
+  return x0, z0, x1, z1
+
+#
+# ladder_multiply() :- k*P on a Montgomery curve with the ladder
+# and Okeya-Sakurai y recovery
+#
+# with Q = kP = (xq, yq) and xs = x(Q + P),
+# yq = ((xq*xp + 1)(xq + xp + 2A) - 2A - (xq - xp)^2 xs) / 2Byp
+#
+
+def ladder_multiply(A, B, p, pt, k):
+  identity = montgomery_curve.IDENTITY
+  if pt == identity or k == 0:
+    return identity
+  xp, yp = pt[0] % p, pt[1] % p
+  if k < 0:
+    yp, k = (p - yp) % p, -k
+  if yp == 0:
+    # points of order 2, including (0, 0) whose u breaks the ladder
+    return identity if k % 2 == 0 else (xp, yp)
+  x0, z0, x1, z1 = ladder(A, p, xp, k)
+  if z0 == 0:
+    return identity
+  xq = x0 * br.inv(z0, p) % p
+  if z1 == 0:
+    # Q + P is the identity, so Q = -P
+    return (xp, (p - yp) % p)
+  xs = x1 * br.inv(z1, p) % p
+  num = (xq*xp + 1) * (xq + xp + 2*A) - 2*A - (xq - xp) * (xq - xp) * xs
+  return (xq, num * br.inv(2*B*yp, p) % p)
+
+#
+# montgomery_add() :- chord and tangent addition on the Montgomery
+# curve, complete with its IDENTITY
+#
+
+def montgomery_add(A, B, p, p1, p2):
+  identity = montgomery_curve.IDENTITY
+  if p1 == identity:
+    return p2
+  if p2 == identity:
+    return p1
+  (u1, v1), (u2, v2) = p1, p2
+  if u1 == u2:
+    if (v1 + v2) % p == 0:
+      return identity
+    lam = (3*u1*u1 + 2*A*u1 + 1) * br.inv(2*B*v1, p) % p
+  else:
+    lam = (v2 - v1) * br.inv(u2 - u1, p) % p
+  u3 = (B*lam*lam - A - u1 - u2) % p
+  return (u3, (lam*(u1 - u3) - v1) % p)
+
+#
+# multiplypoint() :- scalar multiplication through the Montgomery
+# model, native when the curve has none, GLV for the a = 0 short
+# Weierstrass curves registered in glv.py
+#
+
+def multiplypoint(opt, a, d, p, p1, scalar):
+  curve = MODULES[opt]
+  table = tables.lookup(opt, a, d, p)
+  if table is not None:
+    res = table.multiply(p1, scalar)
+    if res is not None:
+      return res
+  if opt == '2':
+    params = glv.registered(a, d, p)
+    if params is not None:
+      return glv.multiplypoint(a, d, p, p1, scalar, params)
+  m = to_montgomery(opt, a, d, p)
+  if m is not None:
+    pt = point_to_montgomery(opt, a, d, p, p1)
+    if pt is not None and pt != (0, 0):
+      res = point_from_montgomery(opt, a, d, p, ladder_multiply(m[0], m[1], p, pt, scalar))
+      if res is None:
+        raise PointAtInfinity('the result is a point at infinity of the Edwards curve')
+      return res
+  return curve.multiplypoint(a, d, p, p1, scalar)
+
+#
+# addpoints(), substractpoints(), doublepoint() :- Edwards addition
+# law, native when the curve has no Edwards model or a point lies
+# at infinity on it ; the law fails on a Twisted Edwards curve whose
+# d is a square for a sum at infinity, the sum of such a curve is
+# then taken on its Montgomery curve
+#
+
+def addpoints(opt, a, d, p, p1, p2):
+  curve = MODULES[opt]
+  table = tables.lookup(opt, a, d, p)
+  if table is not None:
+    res = table.add(p1, p2)
+    if res is not None:
+      return res
+  e = to_edwards(opt, a, d, p)
+  if e is not None:
+    q1 = point_to_edwards(opt, a, d, p, p1)
+    q2 = point_to_edwards(opt, a, d, p, p2)
+    if q1 is not None and q2 is not None:
+      res = t_edwards.addpoints(e[0], e[1], p, q1, q2)
+      if res[1] != -1:
+        res = point_from_edwards(opt, a, d, p, res)
+        if res is not None:
+          return res
+  if opt == '1':
+    A, B = to_montgomery(opt, a, d, p)
+    res = montgomery_add(A, B, p, point_to_montgomery(opt, a, d, p, p1), point_to_montgomery(opt, a, d, p, p2))
+    res = point_from_montgomery(opt, a, d, p, res)
+    if res is None:
+      raise PointAtInfinity('the result is a point at infinity of the Edwards curve')
+    return res
+  return curve.addpoints(a, d, p, p1, p2)
+
+def substractpoints(opt, a, d, p, p1, p2):
+  return addpoints(opt, a, d, p, p1, negate(opt, p, p2))
+
+def doublepoint(opt, a, d, p, p1):
+  return addpoints(opt, a, d, p, p1, p1)
+
+def negate(opt, p, pt):
+  if pt == MODULES[opt].IDENTITY:
+    return pt
+  if opt == '1':
+    return ((p - pt[0]) % p, pt[1])
+  return (pt[0], (p - pt[1]) % p)
+
+#
+# bsgs() :- division in the Short Weierstrass model, finds k with
+# p1 = k*p2 (see s_weirstrass_curve.bsgs()), by Smart's attack on
+# anomalous curves (see smart.py), through the pairing when n has
+# a small embedding degree (see mov.py) and with the baby steps on
+# disk from babysteps.MIN_ORDER on (see babysteps.py)
+#
+
+def bsgs(opt, a, d, p, p1, p2, n=None):
+  table = tables.lookup(opt, a, d, p)
+  if table is not None:
+    k = table.log(p1, p2)
+    if k is not None:
+      return k if n is None or k < 0 else k % n
+  wa, wb = to_weierstrass(opt, a, d, p)
+  w1 = point_to_weierstrass(opt, a, d, p, p1)
+  w2 = point_to_weierstrass(opt, a, d, p, p2)
+  if smart.is_anomalous(wa, wb, p):
+    k = smart.solve(wa, wb, p, w2, w1)
+    if k is not None:
+      return k if n is None else k % n
+  if n is not None and n >= mov.MIN_ORDER and mov.embedding_degree(n, p, mov.AUTO_KMAX):
+    k = mov.solve(wa, wb, p, w2, w1, n)
+    if k is not None:
+      return k
+  if n is not None and n >= babysteps.MIN_ORDER:
+    return babysteps.solve(wa, wb, p, w1, w2, n)
+  return s_weirstrass_curve.bsgs(wa, wb, p, w1, w2, n)
+
+def find_points(opt, a, d, p):
+  wa, wb = to_weierstrass(opt, a, d, p)
+  return s_weirstrass_curve.find_points(wa, wb, p)
+
+def is_anomalous(opt, a, d, p):
+  try:
+    wa, wb = to_weierstrass(opt, a, d, p)
+  except ZeroDivisionError:
+    # a = d or B = 0, the curve is degenerate
+    return False
+  return smart.is_anomalous(wa, wb, p)
+
+#
+# RoutedCurve :- stands in for a curve module with the operations
+# above bound to @opt, anything else (generatePoints, liftpoint,
+# count_points, IDENTITY, ...) comes from the module itself
+#
+
+class RoutedCurve:
+  def __init__(self, opt):
+    self.opt = opt
+    self.module = MODULES[opt]
+
+  def __getattr__(self, name):
+    return getattr(self.module, name)
+
+  def addpoints(self, a, d, p, p1, p2):
+    return addpoints(self.opt, a, d, p, p1, p2)
+
+  def substractpoints(self, a, d, p, p1, p2):
+    return substractpoints(self.opt, a, d, p, p1, p2)
+
+  def doublepoint(self, a, d, p, p1):
+    return doublepoint(self.opt, a, d, p, p1)
+
+  def multiplypoint(self, a, d, p, p1, scalar):
+    return multiplypoint(self.opt, a, d, p, p1, scalar)
+
+  def bsgs(self, a, d, p, p1, p2, n=None):
+    return bsgs(self.opt, a, d, p, p1, p2, n)
+
+  def find_points(self, a, d, p):
+    return find_points(self.opt, a, d, p)
@@ -0,0 +1,305 @@
+import os
+import random
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+
+from gmpy2 import gcd, invert, iroot, is_prime, mpz
+
+#
+# Integer factorisation for group orders
+#
+# factorise() splits n with, in turn :
+#
+#   trial division  : the primes below TRIAL_BOUND
+#   Pollard rho     : Brent's cycle finding, RHO_STEPS iterations,
+#                     the factors trial division just missed
+#   Lenstra ECM     : factors up to ~ 30 digits, see below
+#
+# a cofactor is tested with gmpy2.is_prime() (BPSW) after each split,
+# and perfect powers are taken apart with iroot() first
+#
+# ECM works on Montgomery curves By^2 = x^3 + Ax^2 + x over Z/nZ with
+# Suyama's parametrisation (the group order is divisible by 12), in
+# x-only projective coordinates (X : Z) as dispatch.ladder() :
+#
+#   stage 1 : Q = kP, k the product of the prime powers up to B1
+#   stage 2 : every prime B1 < q <= B2 as q = mD +- j, baby steps jQ
+#             (j < D/2, gcd(j, D) = 1) and giant steps mDQ, the
+#             products of X(mDQ)Z(jQ) - X(jQ)Z(mDQ) over the pairs
+#             that give a prime (stage2_plan()) are taken gcd with n
+#             every 64 giant steps
+#
+# a factor of n shows up as gcd(Z, n) (or a failed inversion while
+# setting a curve up) ; the curves of a level of SCHEDULE are run
+# CURVES_PER_TASK at a time across a process pool, the first factor
+# found stops the rest
+#
+# factorisations are kept per n (lru_cache), on top of the orders the
+# catalogue stores with its curves ; a number without a factor ECM
+# can reach keeps the last level running, as sympy's factorint would
+#
+
+TRIAL_BOUND = 1 << 16
+# finds the factors up to ~ 2^28, ECM takes over above
+RHO_STEPS = 1 << 14
+# (B1, curves), from the tables of GMP-ECM for 15, 20, 25, 30 and 35
+# digit factors
+SCHEDULE = [(2000, 25), (11000, 90), (50000, 300), (250000, 700), (1000000, 1800)]
+B2_RATIO = 50
+# stage 2 step, 2*3*5*7*11
+D = 2310
+CURVES_PER_TASK = 4
+
+
+def prime_flags(bound):
+  sieve = bytearray([1]) * bound
+  sieve[:2] = b'\0\0'
+  for i in range(2, int(bound**0.5) + 1):
+    if sieve[i]:
+      sieve[i*i::i] = bytearray(len(range(i*i, bound, i)))
+  return sieve
+
+@lru_cache(maxsize=None)
+def small_primes(bound):
+  return [i for i, flag in enumerate(prime_flags(bound)) if flag]
+
+#
+# stage1_multiplier() :- product of the largest powers of the primes
+# below B1 that do not exceed it
+#
+
+@lru_cache(maxsize=16)
+def stage1_multiplier(b1):
+  k = mpz(1)
+  for q in small_primes(b1 + 1):
+    qe = q
+    while qe * q <= b1:
+      qe *= q
+    k *= qe
+  return k
+
+#
+# Pollard rho, Brent's variant with the gcds batched every 128 steps
+#
+
+def rho(n, steps=RHO_STEPS, seed=1, tries=1):
+  n = mpz(n)
+  if n % 2 == 0:
+    return 2
+  rng = random.Random(seed)
+  for _ in range(tries):
+    c = mpz(rng.randrange(1, n - 1))
+    y, r, q, g = mpz(rng.randrange(n)), 1, mpz(1), mpz(1)
+    done = 0
+    while g == 1 and done < steps:
+      x = y
+      for _ in range(r):
+        y = (y*y + c) % n
+      k = 0
+      while k < r and g == 1:
+        ys = y
+        for _ in range(min(128, r - k)):
+          y = (y*y + c) % n
+          q = q * abs(x - y) % n
+        g = gcd(q, n)
+        k += 128
+      done += r
+      r *= 2
+    if g == n:
+      # the batch overshot, redo it one step at a time
+      g = mpz(1)
+      while g == 1:
+        ys = (ys*ys + c) % n
+        g = gcd(abs(x - ys), n)
+    if 1 < g < n:
+      return int(g)
+  return None
+
+#
+# Montgomery x-only arithmetic mod n, a24 = (A + 2)/4
+#
+
+def xdbl(n, a24, X, Z):
+  s, d = (X + Z) % n, (X - Z) % n
+  ss, dd = s*s % n, d*d % n
+  t = ss - dd
+  return ss*dd % n, t*(dd + a24*t) % n
+
+def xadd(n, X1, Z1, X2, Z2, Xd, Zd):
+  u = (X1 - Z1)*(X2 + Z2) % n
+  v = (X1 + Z1)*(X2 - Z2) % n
+  s, t = u + v, u - v
+  return Zd*s*s % n, Xd*t*t % n
+
+def xmul(n, a24, X, Z, k):
+  if k == 0:
+    return mpz(0), mpz(0)
+  if k == 1:
+    return X, Z
+  X0, Z0 = X, Z
+  X1, Z1 = xdbl(n, a24, X, Z)
+  for bit in bin(k)[3:]:
+    if bit == '1':
+      X0, Z0 = xadd(n, X1, Z1, X0, Z0, X, Z)
+      X1, Z1 = xdbl(n, a24, X1, Z1)
+    else:
+      X1, Z1 = xadd(n, X1, Z1, X0, Z0, X, Z)
+      X0, Z0 = xdbl(n, a24, X0, Z0)
+  return X0, Z0
+
+#
+# suyama() :- (a24, X, Z) of the curve of @sigma, or a factor of n
+# when setting it up needs an inversion that fails
+#
+
+def suyama(n, sigma):
+  u = (sigma*sigma - 5) % n
+  v = 4*sigma % n
+  X, Z = pow(u, 3, n), pow(v, 3, n)
+  num = pow(v - u, 3, n) * (3*u + v) % n
+  den = 16 * X * v % n
+  g = gcd(den, n)
+  if g != 1:
+    return g
+  return num * invert(den, n) % n, X, Z
+
+#
+# stage2_plan() :- (first m, [[index of j, ...] for every m]) with
+# mD +- j prime for B1 < mD +- j <= B2, j the odd numbers below D/2
+# prime to D
+#
+
+@lru_cache(maxsize=4)
+def stage2_plan(b1, b2):
+  js = [j for j in range(1, D // 2, 2) if gcd(j, D) == 1]
+  first = b1 // D + 1
+  last = (b2 + D // 2) // D
+  prime = prime_flags(last*D + D)
+  steps = [[i for i, j in enumerate(js) if prime[m*D - j] or prime[m*D + j]] for m in range(first, last + 1)]
+  return js, first, steps
+
+def stage2(n, a24, X, Z, b1, b2):
+  js, m, steps = stage2_plan(b1, b2)
+  # baby steps jQ for every odd j below D/2, kept for the ones in js
+  X2, Z2 = xdbl(n, a24, X, Z)
+  odd = {1: (X, Z)}
+  prev, cur = (X, Z), xadd(n, X2, Z2, X, Z, X, Z)
+  for j in range(3, js[-1] + 1, 2):
+    odd[j] = cur
+    prev, cur = cur, xadd(n, cur[0], cur[1], X2, Z2, prev[0], prev[1])
+  baby = [odd[j] for j in js]
+  # X_j Z_j, so that X_R Z_j - X_j Z_R = (X_R - X_j)(Z_R + Z_j) - X_R Z_R + X_j Z_j
+  beta = [Xj*Zj % n for Xj, Zj in baby]
+
+  XD, ZD = xmul(n, a24, X, Z, D)
+  R = xmul(n, a24, X, Z, m*D)
+  S = xmul(n, a24, X, Z, (m - 1)*D)
+  acc = mpz(1)
+  for i, step in enumerate(steps):
+    XR, ZR = R
+    alpha = XR*ZR % n
+    for j in step:
+      Xj, Zj = baby[j]
+      acc = acc * ((XR - Xj)*(ZR + Zj) - alpha + beta[j]) % n
+    if i % 64 == 63:
+      g = gcd(acc, n)
+      if g != 1:
+        return g
+    R, S = xadd(n, XR, ZR, XD, ZD, S[0], S[1]), R
+  return gcd(acc, n)
+
+#
+# ecm_curve() :- a factor of n found by the curve of @sigma, None
+# when it finds none (or only n)
+#
+
+def ecm_curve(n, sigma, b1, b2):
+  n = mpz(n)
+  curve = suyama(n, mpz(sigma))
+  if not isinstance(curve, tuple):
+    return int(curve) if curve != n else None
+  a24, X, Z = curve
+  X, Z = xmul(n, a24, X, Z, stage1_multiplier(b1))
+  g = gcd(Z, n)
+  if g == 1:
+    g = stage2(n, a24, X, Z, b1, b2)
+  return int(g) if 1 < g < n else None
+
+def ecm_curves(n, sigmas, b1, b2):
+  for sigma in sigmas:
+    g = ecm_curve(n, sigma, b1, b2)
+    if g is not None:
+      return g
+  return None
+
+#
+# ecm() :- a non trivial factor of the composite n, the levels of
+# SCHEDULE in turn, @jobs worker processes (all cores for None)
+#
+
+def ecm(n, jobs=None, seed=0):
+  jobs = jobs or os.cpu_count() or 1
+  rng = random.Random(seed ^ n)
+  level = 0
+  while True:
+    b1, count = SCHEDULE[min(level, len(SCHEDULE) - 1)]
+    b2 = b1 * B2_RATIO
+    tasks = [[rng.randrange(6, n - 1) for _ in range(CURVES_PER_TASK)] for _ in range(-(-count // CURVES_PER_TASK))]
+    if jobs == 1:
+      for sigmas in tasks:
+        g = ecm_curves(n, sigmas, b1, b2)
+        if g is not None:
+          return g
+    else:
+      with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending, tasks = set(), iter(tasks)
+        while True:
+          for sigmas in tasks:
+            pending.add(pool.submit(ecm_curves, n, sigmas, b1, b2))
+            if len(pending) >= 2*jobs:
+              break
+          if not pending:
+            break
+          done, pending = wait(pending, return_when=FIRST_COMPLETED)
+          for future in done:
+            g = future.result()
+            if g is not None:
+              for f in pending:
+                f.cancel()
+              return g
+    level += 1
+
+#
+# split() :- the prime factors of n > 1 with repetition
+#
+
+def split(n, jobs):
+  if is_prime(n):
+    return [n]
+  for k in range(n.bit_length(), 1, -1):
+    root, exact = iroot(mpz(n), k)
+    if exact:
+      return split(int(root), jobs) * k
+  g = rho(n) or ecm(n, jobs)
+  return split(g, jobs) + split(n // g, jobs)
+
+#
+# factorise() :- [[prime, exponent], ...] of n >= 1, smallest first
+#
+
+@lru_cache(maxsize=4096)
+def factorisation(n, jobs=None):
+  factors = {}
+  for q in small_primes(TRIAL_BOUND):
+    if q*q > n:
+      break
+    while n % q == 0:
+      factors[q] = factors.get(q, 0) + 1
+      n //= q
+  if n > 1:
+    for q in split(n, jobs):
+      factors[q] = factors.get(q, 0) + 1
+  return tuple(sorted(factors.items()))
+
+def factorise(n, jobs=None):
+  return [[q, e] for q, e in factorisation(int(n), jobs)]
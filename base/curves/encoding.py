@@ -0,0 +1,171 @@
+from gmpy2 import legendre
+
+from base.curves import birational as br
+
+#
+# Binary point encodings
+#
+# Short Weierstrass : SEC1 (SEC 1 v2, 2.3.3), 0x02/0x03 || x when
+#                     compressed, 0x04 || x || y when not, big endian,
+#                     a single 0x00 for the point at infinity
+# Twisted Edwards   : RFC 8032 (5.1.2) style, y little endian with the
+#                     parity of x in the top bit of the last byte,
+#                     x || y little endian when not compressed
+# Montgomery        : u only, little endian (RFC 7748), u || v when
+#                     not compressed
+#
+# the u only form keeps no sign for v, decoding it gives the point
+# with the even v (-P has the same u and the ladder only needs u), it
+# neither tells the identity from (0, 0)
+#
+# the Weierstrass identity (see s_weirstrass_curve.py) has no
+# coordinates, only its SEC1 encoding
+#
+# encode_points() / decode_points() work on fixed width records, the
+# Weierstrass identity is padded with zero bytes to the record width,
+# decode_points() finds every denominator inverse with one inversion
+# and the Tonelli-Shanks constants once per p
+#
+# a malformed or off curve encoding raises ValueError
+#
+
+WEIERSTRASS_IDENTITY = br.WEIERSTRASS_IDENTITY
+EDWARDS_IDENTITY = br.EDWARDS_IDENTITY
+MONTGOMERY_IDENTITY = br.MONTGOMERY_IDENTITY
+
+def field_size(p):
+  return (p.bit_length() + 7) // 8
+
+#
+# point_size() :- bytes of one encoded point (one record)
+#
+
+def point_size(opt, p, compressed=True):
+  n = field_size(p)
+  if opt == '1':
+    # one bit more than p for the sign of x
+    return p.bit_length() // 8 + 1 if compressed else 2*n
+  if opt == '2':
+    return 1 + n if compressed else 1 + 2*n
+  return n if compressed else 2*n
+
+#
+# rhs() :- (num, den) with the recovered coordinate squared equal
+# to num/den, for the coordinate read from the encoding
+#
+
+def rhs(opt, a, d, p, c):
+  if opt == '1':
+    # ax^2 + y^2 = 1 + dx^2y^2 : x^2 = (y^2 - 1)/(dy^2 - a)
+    return (c*c - 1) % p, (d*c*c - a) % p
+  if opt == '2':
+    return (c*c*c + a*c + d) % p, 1
+  return (c*c*c + a*c*c + c) % p, d % p
+
+#
+# encode_point(), encode_points()
+#
+
+def encode_point(opt, p, pt, compressed=True):
+  n = field_size(p)
+  if opt == '2' and pt == WEIERSTRASS_IDENTITY:
+    return b'\x00'
+  x, y = pt[0] % p, pt[1] % p
+  if opt == '1':
+    if not compressed:
+      return x.to_bytes(n, 'little') + y.to_bytes(n, 'little')
+    size = point_size(opt, p)
+    return (y | (x & 1) << (8*size - 1)).to_bytes(size, 'little')
+  if opt == '2':
+    if not compressed:
+      return b'\x04' + x.to_bytes(n, 'big') + y.to_bytes(n, 'big')
+    return bytes([2 | (y & 1)]) + x.to_bytes(n, 'big')
+  if not compressed:
+    return x.to_bytes(n, 'little') + y.to_bytes(n, 'little')
+  return x.to_bytes(n, 'little')
+
+def encode_points(opt, p, points, compressed=True):
+  size = point_size(opt, p, compressed)
+  return b''.join(encode_point(opt, p, pt, compressed).ljust(size, b'\x00') for pt in points)
+
+#
+# read() :- (coordinate, sign, other) from one record, sign is the
+# parity bit of the missing coordinate (None when the record has
+# both), None for the Weierstrass identity
+#
+
+def read(opt, p, data, compressed):
+  n = field_size(p)
+  if opt == '1':
+    if not compressed:
+      return int.from_bytes(data[n:], 'little'), None, int.from_bytes(data[:n], 'little')
+    v = int.from_bytes(data, 'little')
+    top = 8*len(data) - 1
+    return v & ~(1 << top), v >> top, None
+  if opt == '2':
+    if data[0] == 0 and not any(data[1:]):
+      return None
+    if compressed and data[0] in (2, 3):
+      return int.from_bytes(data[1:], 'big'), data[0] & 1, None
+    if not compressed and data[0] == 4:
+      return int.from_bytes(data[1:1 + n], 'big'), None, int.from_bytes(data[1 + n:], 'big')
+    raise ValueError('bad SEC1 prefix {:#04x}'.format(data[0]))
+  if not compressed:
+    return int.from_bytes(data[:n], 'little'), None, int.from_bytes(data[n:], 'little')
+  return int.from_bytes(data, 'little'), 0, None
+
+def point(opt, c, other):
+  # Edwards records carry y, the others x (u)
+  return (other, c) if opt == '1' else (c, other)
+
+#
+# decode_point(), decode_points() :- the points of the encoding(s),
+# see the note at the top of the file for the lossy u only form
+#
+
+def decode_point(opt, a, d, p, data, compressed=True):
+  return decode_points(opt, a, d, p, data, compressed)[0]
+
+def decode_points(opt, a, d, p, data, compressed=True):
+  size = point_size(opt, p, compressed)
+  if len(data) % size:
+    raise ValueError('{} bytes is not a whole number of {} byte points'.format(len(data), size))
+  records = [read(opt, p, data[i:i + size], compressed) for i in range(0, len(data), size)]
+
+  fracs = []
+  for r in records:
+    if r is None:
+      fracs.append((0, 0))
+      continue
+    c, sign, other = r
+    if c >= p or (other is not None and other >= p):
+      raise ValueError('coordinate out of range')
+    fracs.append(rhs(opt, a, d, p, c))
+  invs = br.batch_inv([den for _, den in fracs], p)
+
+  res = []
+  for r, (num, den), t in zip(records, fracs, invs):
+    if r is None:
+      res.append(WEIERSTRASS_IDENTITY)
+      continue
+    c, sign, other = r
+    if opt == '3' and (c, other) == MONTGOMERY_IDENTITY:
+      res.append(MONTGOMERY_IDENTITY)
+      continue
+    if den == 0:
+      raise ValueError('no point with coordinate {}'.format(c))
+    sq = num * t % p
+    if other is not None:
+      if other * other % p != sq:
+        raise ValueError('point is not on the curve')
+      res.append(point(opt, c, other))
+      continue
+    if sq != 0 and legendre(sq, p) != 1:
+      raise ValueError('no point with coordinate {}'.format(c))
+    root = br.sqrt_mod(sq, p)
+    if root == 0 and sign == 1:
+      raise ValueError('sign bit set for a zero coordinate')
+    if root & 1 != sign:
+      root = p - root
+    res.append(point(opt, c, root))
+  return res
@@ -0,0 +1,193 @@
+import random
+from math import isqrt
+
+from gmpy2 import is_prime
+
+from base.curves import s_weirstrass_curve as sw
+
+#
+# GLV scalar multiplication for y^2 = x^3 + b over p = 1 (mod 3)
+#
+# these curves have the endomorphism phi(x, y) = (beta*x, y) with
+# beta a cube root of unity mod p, on the subgroup of prime order n
+# it acts as multiplication by lambda, a cube root of unity mod n
+#
+# k is split into k1 + k2*lambda (mod n) with k1, k2 about sqrt(n)
+# and kP = k1*P + k2*phi(P) is evaluated jointly, which halves the
+# doublings of a plain double-and-add
+#
+# parameters are worked out once per (b, p, n) by glv_setup() and
+# kept in _REGISTRY, dispatch.multiplypoint() uses them for every
+# curve registered with register()
+#
+
+_REGISTRY = {}
+
+#
+# applies() :- whether the curve has the cube root endomorphism
+#
+
+def applies(a, p):
+  return a % p == 0 and p % 3 == 1
+
+#
+# cube_root_of_unity() :- a non trivial cube root of 1 modulo the
+# prime m, m = 1 (mod 3)
+#
+
+def cube_root_of_unity(m):
+  g = 2
+  while True:
+    r = pow(g, (m - 1)//3, m)
+    if r != 1:
+      return r
+    g += 1
+
+#
+# cornacchia() :- (t, v) with t^2 + 3v^2 = 4p, used to count the
+# points of the j = 0 curves
+#
+
+def cornacchia(p):
+  # t^2 + 3v^2 = 4p has a solution with t, v of the same parity,
+  # solve x^2 + 3y^2 = p first (it always has one for p = 1 mod 3)
+  r = sw.tonelli_shanks(p - 3, p) if p % 4 == 1 else pow(p - 3, (p + 1)//4, p)
+  r0, r1 = p, r
+  limit = isqrt(p)
+  while r1 > limit:
+    r0, r1 = r1, r0 % r1
+  rest = p - r1*r1
+  if rest % 3 != 0 or isqrt(rest//3)**2 != rest//3:
+    return None
+  return (2*r1, 2*isqrt(rest//3))
+
+#
+# cm_order() :- order of y^2 = x^3 + b over p = 1 (mod 3)
+#
+# with 4p = t^2 + 3v^2 the order is p + 1 - c for c one of the six
+# traces ±t, ±(t+3v)/2, ±(t-3v)/2, the candidate which kills a few
+# random points is the order
+#
+
+def cm_order(b, p, tries=20):
+  tv = cornacchia(p)
+  if tv is None:
+    return None
+  t, v = tv
+  traces = {t, -t, (t + 3*v)//2, -(t + 3*v)//2, (t - 3*v)//2, -(t - 3*v)//2}
+  candidates = [p + 1 - c for c in traces]
+  for _ in range(tries):
+    x = random.randrange(p)
+    pt = sw.liftpoint(0, b, p, x)
+    if pt is None:
+      continue
+    candidates = [n for n in candidates if sw.multiplypoint(0, b, p, pt, n) == sw.IDENTITY]
+    if len(candidates) == 1:
+      return candidates[0]
+  return None
+
+#
+# lattice_basis() :- short basis (v1, v2) of {(x, y) : x + y*lam = 0
+# (mod n)}, from the extended euclidean algorithm on (n, lam)
+# stopped around sqrt(n) (GLV, section 4)
+#
+
+def lattice_basis(n, lam):
+  r0, r1 = n, lam
+  t0, t1 = 0, 1
+  limit = isqrt(n)
+  while r1 >= limit:
+    q = r0 // r1
+    r0, r1 = r1, r0 - q*r1
+    t0, t1 = t1, t0 - q*t1
+  # r0 >= sqrt(n) > r1 now
+  v1 = (r1, -t1)
+  q = r0 // r1
+  r2, t2 = r0 - q*r1, t0 - q*t1
+  if r0*r0 + t0*t0 <= r2*r2 + t2*t2:
+    v2 = (r0, -t0)
+  else:
+    v2 = (r2, -t2)
+  return v1, v2
+
+#
+# glv_setup() :- (beta, lam, v1, v2) for y^2 = x^3 + b of prime
+# order n, or None when the curve has no usable endomorphism
+#
+
+def glv_setup(b, p, n):
+  if not applies(0, p) or n % 3 != 1 or not is_prime(n):
+    return None
+  beta = cube_root_of_unity(p)
+  lam = cube_root_of_unity(n)
+  pt = None
+  while pt is None or pt == sw.IDENTITY:
+    pt = sw.liftpoint(0, b, p, random.randrange(p))
+  # beta and lam have to belong to the same eigenvalue
+  if sw.multiplypoint(0, b, p, pt, lam) != (beta*pt[0] % p, pt[1]):
+    lam = lam*lam % n
+    if sw.multiplypoint(0, b, p, pt, lam) != (beta*pt[0] % p, pt[1]):
+      return None
+  v1, v2 = lattice_basis(n, lam)
+  return (beta, lam, v1, v2, n)
+
+def register(b, p, n):
+  key = (b % p, p)
+  if key not in _REGISTRY:
+    _REGISTRY[key] = glv_setup(b % p, p, n)
+  return _REGISTRY[key]
+
+def registered(a, b, p):
+  if not applies(a, p):
+    return None
+  return _REGISTRY.get((b % p, p))
+
+#
+# decompose() :- (k1, k2) with k = k1 + k2*lam (mod n), both about
+# sqrt(n) in size
+#
+# (k, 0) is written as c1*v1 + c2*v2 with c1, c2 rounded to the
+# nearest integers, the difference is a short lattice vector
+#
+
+def decompose(k, params):
+  beta, lam, (a1, b1), (a2, b2), n = params
+  det = a1*b2 - a2*b1
+  if det < 0:
+    # -v2 keeps the basis and makes the determinant positive, the
+    # rounding below needs it
+    a2, b2, det = -a2, -b2, -det
+  c1 = (2*b2*k + det) // (2*det)
+  c2 = (-2*b1*k + det) // (2*det)
+  return (k - c1*a1 - c2*a2, -c1*b1 - c2*b2)
+
+#
+# multiplypoint() :- k*P as k1*P + k2*phi(P) with one shared chain
+# of doublings (Straus-Shamir), same result as
+# s_weirstrass_curve.multiplypoint()
+#
+
+def multiplypoint(a, b, p, p1, scalar, params):
+  beta, lam, v1, v2, n = params
+  if p1 == sw.IDENTITY:
+    return sw.IDENTITY
+  k1, k2 = decompose(scalar % n, params)
+  q1 = (p1[0] % p, p1[1] % p)
+  q2 = (beta*p1[0] % p, p1[1] % p)
+  if k1 < 0:
+    q1, k1 = (q1[0], (p - q1[1]) % p), -k1
+  if k2 < 0:
+    q2, k2 = (q2[0], (p - q2[1]) % p), -k2
+  q12 = sw.addpoints(a, b, p, q1, q2)
+
+  pt = sw.IDENTITY
+  for i in range(max(k1.bit_length(), k2.bit_length()) - 1, -1, -1):
+    pt = sw.doublepoint(a, b, p, pt)
+    bit1, bit2 = (k1 >> i) & 1, (k2 >> i) & 1
+    if bit1 and bit2:
+      pt = sw.addpoints(a, b, p, pt, q12)
+    elif bit1:
+      pt = sw.addpoints(a, b, p, pt, q1)
+    elif bit2:
+      pt = sw.addpoints(a, b, p, pt, q2)
+  return pt
@@ -0,0 +1,97 @@
+import random
+
+from base.curves.dispatch import PointAtInfinity
+
+#
+# Group structure helpers shared by the three curve modules.
+#
+# @curve : one of t_edwards, s_weirstrass_curve or montgomery_curve,
+# the functions below only use its addpoints(), multiplypoint(),
+# liftpoint() and IDENTITY
+#
+# @n, @factors : order of the group and its factorisation as
+# [[prime, exponent], ...] (see base.catalogue.facts())
+#
+
+#
+# point_order() :- order of the point p1
+#
+# for every prime power q^e of n, the whole of q^e is divided
+# out of the running order m and (m)*p1 is then multiplied by q
+# until it reaches IDENTITY, the number of multiplications
+# needed is the power of q in the order of p1
+#
+# a multiple at infinity on an Edwards curve (see dispatch.py) is
+# not IDENTITY, it has no coordinates to go on from so the next one
+# is taken from p1 again
+#
+# time complexity : O(sum(e) * log(n)) point operations
+#
+
+def multiple(curve, a, d, p, pt, k):
+  try:
+    return curve.multiplypoint(a, d, p, pt, k)
+  except PointAtInfinity:
+    return None
+
+def point_order(curve, a, d, p, p1, n, factors):
+  m = n
+  for q, e in factors:
+    m //= q**e
+    pt = multiple(curve, a, d, p, p1, m)
+    for _ in range(e):
+      if pt == curve.IDENTITY:
+        break
+      m *= q
+      pt = multiple(curve, a, d, p, p1, m) if pt is None else multiple(curve, a, d, p, pt, q)
+  return m
+
+#
+# random_point() :- a uniformly chosen x lifted to the curve,
+# retried until x gives a point
+#
+
+def random_point(curve, a, d, p, tries=1000):
+  for _ in range(tries):
+    pt = curve.liftpoint(a, d, p, random.randrange(p))
+    if pt is not None:
+      if random.randrange(2):
+        pt = (pt[0], (p - pt[1]) % p)
+      return pt
+  return None
+
+#
+# random_generator() :- random point of the largest order
+# found in the group
+#
+# a point of order n generates the whole (cyclic) group, for
+# a non cyclic group no such point exists so the point of the
+# largest order seen in @tries attempts is returned
+#
+# returns (point, order of point)
+#
+
+def random_generator(curve, a, d, p, n, factors, tries=50):
+  best, best_order = None, 0
+  for _ in range(tries):
+    pt = random_point(curve, a, d, p)
+    if pt is None:
+      break
+    k = point_order(curve, a, d, p, pt, n, factors)
+    if k > best_order:
+      best, best_order = pt, k
+    if k == n:
+      break
+  return best, best_order
+
+#
+# batch_point_order() :- point_order() for many points at once,
+# repeated input points are only computed once
+#
+
+def batch_point_order(curve, a, d, p, points, n, factors):
+  orders = {}
+  for pt in points:
+    if pt not in orders:
+      orders[pt] = point_order(curve, a, d, p, pt, n, factors)
+  return [orders[pt] for pt in points]
@@ -0,0 +1,237 @@
+import hashlib
+import random
+from functools import lru_cache
+
+from gmpy2 import legendre
+
+from base.curves import birational as br
+from base.curves import dispatch
+
+#
+# Hashing to the curve and random points without enumeration
+#
+# a field element u is mapped to a point in constant cost :
+#
+# Elligator 2 (Montgomery and twisted Edwards, through the Montgomery
+# model Bv^2 = u^3 + Au^2 + u, A != 0) and the simplified SWU map
+# (short Weierstrass, a, b != 0), both as in RFC 9380 ; the other
+# curves (y^2 = x^3 + b, y^2 = x^3 + ax, A = 0) fall back to try and
+# increment, lifting x = u, u + 1, ... until a point turns up, which
+# takes two tries on average but is not constant cost
+#
+# hash_to_curve() maps two field elements drawn from the message by
+# expand_message_xmd (SHA-256) and adds the points, encode_to_curve()
+# maps one, sample() maps random field elements ; on a twisted
+# Edwards curve whose d is a square the sum may lie at infinity (see
+# dispatch.py), hash_to_curve() gives None for it
+#
+# the batch_* functions share one inversion between all the inputs
+# (br.batch_inv()) and pick the square root with a Jacobi symbol, so
+# each input costs a single exponentiation
+#
+# the points are not multiplied by the cofactor, see
+# validate.clear_cofactor() for points in the prime order subgroup
+#
+
+DST = b'tedwards-hash-to-curve-v1'
+
+#
+# expand_message_xmd() :- RFC 9380 5.3.1 with SHA-256
+#
+
+def expand_message_xmd(msg, dst, length):
+  ell = -(-length // 32)
+  if ell > 255 or len(dst) > 255:
+    raise ValueError('expand_message_xmd: length or domain separation tag too long')
+  dst_prime = dst + bytes([len(dst)])
+  b0 = hashlib.sha256(bytes(64) + msg + length.to_bytes(2, 'big') + b'\0' + dst_prime).digest()
+  blocks = [hashlib.sha256(b0 + b'\1' + dst_prime).digest()]
+  for i in range(2, ell + 1):
+    mixed = bytes(x ^ y for x, y in zip(b0, blocks[-1]))
+    blocks.append(hashlib.sha256(mixed + bytes([i]) + dst_prime).digest())
+  return b''.join(blocks)[:length]
+
+#
+# hash_to_field() :- @count elements of F_p from the message, each
+# from 128 more bits than p so that the bias is negligible
+#
+
+def hash_to_field(msg, p, count=2, dst=DST):
+  size = (p.bit_length() + 128 + 7) // 8
+  data = expand_message_xmd(msg, dst, count * size)
+  return [int.from_bytes(data[i*size:(i + 1)*size], 'big') % p for i in range(count)]
+
+def candidates(p):
+  c = 1
+  while c < p:
+    yield c
+    yield p - c
+    c += 1
+
+#
+# non_square() :- the Z of Elligator 2, the non square of smallest
+# absolute value
+#
+
+@lru_cache(maxsize=256)
+def non_square(p):
+  return next(z for z in candidates(p) if legendre(z, p) == -1)
+
+#
+# sswu_z() :- the Z of the simplified SWU map on y^2 = x^3 + ax + b,
+# a non square other than -1 with g(x) - Z irreducible and g(b/(Za))
+# a square, None when there is none (tiny p)
+#
+
+@lru_cache(maxsize=256)
+def sswu_z(a, b, p):
+  for z in candidates(p):
+    if legendre(z, p) != -1 or z == p - 1 or br.cubic_roots(a, b - z, p):
+      continue
+    x = b * br.inv(z*a, p) % p
+    if legendre((x*x*x + a*x + b) % p, p) == 1:
+      return z
+  return None
+
+def method(opt, a, d, p):
+  if opt == '2':
+    return 'sswu' if a % p and d % p and sswu_z(a % p, d % p, p) is not None else 'increment'
+  A, B = dispatch.to_montgomery(opt, a, d, p)
+  return 'elligator2' if A else 'increment'
+
+# y or -y, whichever has the parity of u (sgn0 of RFC 9380)
+def signed(y, u, p):
+  return y if y % 2 == u % 2 else (p - y) % p
+
+#
+# sswu() :- simplified SWU on y^2 = x^3 + ax + b for every u, with
+#
+#   x1 = (-b/a)(1 + 1/(Z^2u^4 + Zu^2)), or b/(Za) when that is 1/0
+#   x2 = Zu^2 x1, g(x2) = Z^3u^6 g(x1)
+#
+# so that one of g(x1), g(x2) is a square
+#
+
+def sswu(a, b, p, us):
+  z = sswu_z(a, b, p)
+  zu2 = [z*u*u % p for u in us]
+  tv = br.batch_inv([(t*t + t) % p for t in zu2] + [a, z*a % p], p)
+  ia, exceptional = tv[-2], b * tv[-1] % p
+  res = []
+  for u, t, t1 in zip(us, zu2, tv):
+    x = exceptional if t1 == 0 else -b * ia * (1 + t1) % p
+    gx = (x*x*x + a*x + b) % p
+    if legendre(gx, p) == -1:
+      x = t*x % p
+      gx = (x*x*x + a*x + b) % p
+    res.append((x, signed(br.sqrt_mod(gx, p), u, p)))
+  return res
+
+#
+# elligator2() :- Elligator 2 on Bv^2 = u^3 + Au^2 + u for every u,
+# worked on y^2 = x^3 + (A/B)x^2 + x/B^2 (u = Bx, v = By) with
+#
+#   x1 = -(A/B)/(1 + Zu^2), or -(A/B) when that is 1/0
+#   x2 = -x1 - A/B, g(x2) = Zu^2 g(x1)
+#
+# points of an Edwards curve are converted after, sharing one more
+# inversion, None for the ones without an Edwards image
+#
+
+def elligator2(opt, a, d, p, us):
+  A, B = dispatch.to_montgomery(opt, a, d, p)
+  z = non_square(p)
+  den = br.batch_inv([(1 + z*u*u) % p for u in us] + [B, B*B % p], p)
+  c1, c2 = A * den[-2] % p, den[-1]
+  res = []
+  for u, e in zip(us, den):
+    x = -c1 * e % p or -c1 % p
+    gx = x*(x*(x + c1) + c2) % p
+    if legendre(gx, p) == -1:
+      x = (-x - c1) % p
+      gx = x*(x*(x + c1) + c2) % p
+    res.append((B*x % p, B*signed(br.sqrt_mod(gx, p), u, p) % p))
+  if opt == '3':
+    return res
+
+  # (u, v) -> (u/v, (u - 1)/(u + 1)), see br.montgomery_point_to_edwards()
+  inv = br.batch_inv([v for _, v in res] + [(u + 1) % p for u, _ in res], p)
+  n = len(res)
+  edwards = []
+  for i, (u, v) in enumerate(res):
+    if u == 0 and v == 0:
+      edwards.append((0, p - 1))
+    elif v == 0 or inv[n + i] == 0:
+      edwards.append(None)
+    else:
+      edwards.append((u * inv[i] % p, (u - 1) * inv[n + i] % p))
+  return edwards
+
+#
+# try_and_increment() :- the first point (x, +-y) with x = u, u + 1,
+# ... other than the identity, the identity when the curve has no
+# other point
+#
+
+def try_and_increment(opt, a, d, p, u):
+  curve = dispatch.MODULES[opt]
+  for i in range(p):
+    pt = curve.liftpoint(a, d, p, (u + i) % p)
+    if pt is not None and pt != curve.IDENTITY:
+      return (pt[0], signed(pt[1], u, p))
+  return curve.IDENTITY
+
+#
+# batch_map_to_curve() :- the point of every field element in @us
+#
+
+def batch_map_to_curve(opt, a, d, p, us):
+  us = [u % p for u in us]
+  how = method(opt, a, d, p)
+  if how == 'sswu':
+    points = sswu(a % p, d % p, p, us)
+  elif how == 'elligator2':
+    points = elligator2(opt, a, d, p, us)
+  else:
+    points = [None] * len(us)
+  return [pt if pt is not None else try_and_increment(opt, a, d, p, u) for pt, u in zip(points, us)]
+
+def map_to_curve(opt, a, d, p, u):
+  return batch_map_to_curve(opt, a, d, p, [u])[0]
+
+#
+# hash_to_curve() :- the point of the message (bytes or str), its
+# distribution is indistinguishable from uniform, encode_to_curve()
+# costs half as much but reaches only part of the curve
+#
+
+def to_bytes(msg):
+  return msg.encode() if isinstance(msg, str) else msg
+
+def batch_hash_to_curve(opt, a, d, p, msgs, dst=DST):
+  us = []
+  for msg in msgs:
+    us += hash_to_field(to_bytes(msg), p, 2, dst)
+  points = batch_map_to_curve(opt, a, d, p, us)
+  return [add(opt, a, d, p, points[i], points[i + 1]) for i in range(0, len(points), 2)]
+
+def add(opt, a, d, p, p1, p2):
+  try:
+    return dispatch.addpoints(opt, a, d, p, p1, p2)
+  except dispatch.PointAtInfinity:
+    return None
+
+def hash_to_curve(opt, a, d, p, msg, dst=DST):
+  return batch_hash_to_curve(opt, a, d, p, [msg], dst)[0]
+
+def encode_to_curve(opt, a, d, p, msg, dst=DST):
+  return map_to_curve(opt, a, d, p, hash_to_field(to_bytes(msg), p, 1, dst)[0])
+
+#
+# sample() :- @count random points, from @rng or the system's
+# source of randomness
+#
+
+def sample(opt, a, d, p, count, rng=None):
+  rng = rng or random.SystemRandom()
+  return batch_map_to_curve(opt, a, d, p, [rng.randrange(p) for _ in range(count)])
@@ -0,0 +1,324 @@
+from functools import lru_cache
+
+import numpy as np
+
+from base.curves import birational as br
+from base.curves import dispatch, primes
+
+#
+# Lane parallel batch scalar multiplication
+#
+# many independent k*P on one curve are run together, every field
+# element is a column of @W bit limbs in an int64 array of shape
+# (limbs, lanes) and each field operation is a handful of numpy
+# calls over all the lanes at once
+#
+# multiplication is Montgomery's (REDC) with R = 2^(W*limbs) >
+# 4096p, or a fold for the special primes of primes.py, either way
+# sums and differences of a few elements can go into a product
+# without being reduced : inputs below 64p give a result below 2p,
+# subtraction adds 16p so it never goes negative
+#
+# limbs are 26 bits wide so that a product of two (unreduced)
+# limbs, summed over a whole row, stays inside an int64, additions
+# and subtractions are then plain limb wise sums with no carries ;
+# they are signed (not uint32 / uint64) because carry() and the
+# products run on limbs that a lazy subtraction left negative
+#
+# scalar multiplication is the Montgomery ladder of dispatch.ladder()
+# where the curve has a Montgomery model, and a ladder over the
+# complete projective addition law of Renes, Costello and Batina
+# (2016, algorithm 1) for the short Weierstrass curves without one,
+# both run the same steps for every lane whatever its scalar
+#
+# lanes the ladders cannot take (the identity, points of order 2,
+# points with no image in the Montgomery model) go through
+# dispatch.multiplypoint() one by one, so multiply() returns (or
+# raises) exactly what a loop over dispatch.multiplypoint() would : a list
+# of (x, y) tuples of python integers, the limb arrays are converted
+# back at the end since coordinates above 2^64 have no fixed width
+# numpy dtype
+#
+
+W = 26
+MASK = (1 << W) - 1
+
+#
+# Field :- constants of the arithmetic modulo p and the operations
+# on (limbs, lanes) arrays
+#
+# Mersenne and pseudo Mersenne primes (see primes.py) reduce the
+# product by folding the bits above 2^k back in times c = 2^k - p,
+# their elements are kept as they are, every other prime goes
+# through REDC and keeps x*R
+#
+
+class Field:
+  def __init__(self, p, fold=None):
+    self.p = p
+    self.limbs = -(-(p.bit_length() + 12) // W)
+    self.R = 1 << (W * self.limbs)
+    form = primes.detect(p)
+    # @fold : None to fold whenever p allows it, False for REDC
+    if fold is None:
+      fold = form is not None and form[0] != 'solinas'
+    self.fold = fold
+    if self.fold:
+      self.k = form[1]
+      self.cdigits = digits(form[2], -(-form[2].bit_length() // W))
+      self.scale = 1
+    else:
+      self.pinv = self.constant(-pow(p, -1, self.R) % self.R, False)
+      self.pcol = self.constant(p, False)
+      self.scale = self.R
+      self.r2 = self.constant(self.R * self.R % p, False)
+    self.offset = self.constant(16*p, False)
+
+  def constant(self, x, mont=True):
+    if mont:
+      x = x * self.scale % self.p
+    return np.array(digits(x, self.limbs), dtype=np.int64)[:, None]
+
+  def add(self, x, y):
+    return x + y
+
+  def sub(self, x, y):
+    return x + self.offset - y
+
+  def mul(self, x, y):
+    L = self.limbs
+    x, y = np.broadcast_arrays(x, y)
+    t = np.zeros((2*L + 1, x.shape[1]), dtype=np.int64)
+    # schoolbook product, one row of partial products per limb of x
+    for i in range(L):
+      t[i:i + L] += x[i] * y
+    carry(t)
+    if self.fold:
+      # below 4096p^2, the first fold leaves about 2^k * 4096c and
+      # the second less than 2p
+      return self.reduce_fold(self.reduce_fold(t))[:L].copy()
+    # m = t * (-1/p) mod R, then t + m*p is divisible by R
+    m = np.zeros((L, x.shape[1]), dtype=np.int64)
+    for i in range(L):
+      m[i:] += t[i] * self.pinv[:L - i]
+    carry(m)
+    m[L - 1] &= MASK
+    for i in range(L):
+      t[i:i + L] += m[i] * self.pcol
+    carry(t)
+    return t[L:2*L].copy()
+
+  #
+  # reduce_fold() :- lo + c*hi for t = hi*2^k + lo, shifts and masks
+  # on the limbs and a product by the few limbs of c
+  #
+
+  def reduce_fold(self, t):
+    q, r = divmod(self.k, W)
+    hi = t[q:] >> r
+    if r:
+      hi[:-1] += (t[q + 1:] << (W - r)) & MASK
+    x = np.zeros((max(q + 1, len(hi) + len(self.cdigits), self.limbs) + 1, t.shape[1]), dtype=np.int64)
+    x[:q + 1] = t[:q + 1]
+    x[q] &= (1 << r) - 1
+    for j, c in enumerate(self.cdigits):
+      x[j:j + len(hi)] += c * hi
+    return carry(x)
+
+  def to_mont(self, x):
+    if self.fold:
+      return x.copy()
+    return self.mul(x, self.r2)
+
+#
+# carry() :- propagates carries in place until every limb but the
+# last is in [0, 2^W), limbs may start out negative
+#
+
+def carry(t):
+  while True:
+    c = t[:-1] >> W
+    if not c.any():
+      return t
+    t[:-1] &= MASK
+    t[1:] += c
+
+def digits(x, n):
+  return [(x >> (W*i)) & MASK for i in range(n)]
+
+@lru_cache(maxsize=32)
+def field(p):
+  return Field(p)
+
+#
+# to_limbs(), from_limbs() :- python integers to a (limbs, lanes)
+# array and back, through their little endian bytes, from_limbs()
+# takes unreduced limbs as well
+#
+
+def to_limbs(values, limbs):
+  nbytes = (W*limbs + 7) // 8
+  buf = b''.join(int(v).to_bytes(nbytes, 'little') for v in values)
+  bits = np.unpackbits(np.frombuffer(buf, dtype=np.uint8).reshape(len(values), nbytes), axis=1, bitorder='little')
+  bits = bits[:, :W*limbs].reshape(len(values), limbs, W).astype(np.int64)
+  return (bits @ (np.int64(1) << np.arange(W, dtype=np.int64))).T.copy()
+
+def from_limbs(t):
+  t = carry(t.copy())
+  lanes, limbs = t.shape[1], t.shape[0]
+  bits = ((t.T[:, :, None] >> np.arange(W)) & 1).astype(np.uint8).reshape(lanes, limbs*W)
+  packed = np.packbits(bits, axis=1, bitorder='little')
+  return [int.from_bytes(row.tobytes(), 'little') for row in packed]
+
+#
+# scalar_bits() :- (bits, lanes) boolean array of the scalars, most
+# significant bit first
+#
+
+def scalar_bits(scalars):
+  nbits = max(1, max(k.bit_length() for k in scalars))
+  nbytes = (nbits + 7) // 8
+  buf = b''.join(k.to_bytes(nbytes, 'little') for k in scalars)
+  bits = np.unpackbits(np.frombuffer(buf, dtype=np.uint8).reshape(len(scalars), nbytes), axis=1, bitorder='little')
+  return bits[:, :nbits].T[::-1].astype(bool)
+
+#
+# ladder() :- x-only Montgomery ladder of dispatch.ladder() on every
+# lane, @u the u coordinates (Montgomery form limbs), returns the
+# projective (X0, Z0, X1, Z1) of kP and (k+1)P as limb arrays
+#
+
+def ladder(f, A, u, bits):
+  lanes = u.shape[1]
+  a24 = f.constant((A + 2) * br.inv(4, f.p) % f.p)
+  one = np.broadcast_to(f.constant(1), u.shape).copy()
+  x0, z0, x1, z1 = one, np.zeros_like(u), u, one.copy()
+  swap = np.zeros(lanes, dtype=bool)
+  for b in bits:
+    # swapping on b, then back on the same b at the end of the step,
+    # is a single swap on the change of bit
+    s = swap ^ b
+    x0, x1 = np.where(s, x1, x0), np.where(s, x0, x1)
+    z0, z1 = np.where(s, z1, z0), np.where(s, z0, z1)
+    swap = b
+    t1 = f.mul(f.sub(x0, z0), f.add(x1, z1))
+    t2 = f.mul(f.add(x0, z0), f.sub(x1, z1))
+    e, g = f.add(t1, t2), f.sub(t1, t2)
+    x1, z1 = f.mul(e, e), f.mul(u, f.mul(g, g))
+    h, l = f.add(x0, z0), f.sub(x0, z0)
+    s, t = f.mul(h, h), f.mul(l, l)
+    c = f.sub(s, t)
+    x0, z0 = f.mul(s, t), f.mul(c, f.add(t, f.mul(a24, c)))
+  x0, x1 = np.where(swap, x1, x0), np.where(swap, x0, x1)
+  z0, z1 = np.where(swap, z1, z0), np.where(swap, z0, z1)
+  return x0, z0, x1, z1
+
+#
+# complete_add() :- P + Q on y^2 = x^3 + ax + b in projective
+# coordinates, valid for every pair of points including doublings
+# and the identity (0 : 1 : 0), @a and @b3 = 3b in Montgomery form
+#
+
+def complete_add(f, a, b3, P, Q):
+  X1, Y1, Z1 = P
+  X2, Y2, Z2 = Q
+  t0, t1, t2 = f.mul(X1, X2), f.mul(Y1, Y2), f.mul(Z1, Z2)
+  t3 = f.sub(f.mul(f.add(X1, Y1), f.add(X2, Y2)), f.add(t0, t1))
+  t4 = f.sub(f.mul(f.add(X1, Z1), f.add(X2, Z2)), f.add(t0, t2))
+  t5 = f.sub(f.mul(f.add(Y1, Z1), f.add(Y2, Z2)), f.add(t1, t2))
+  Z3 = f.add(f.mul(a, t4), f.mul(b3, t2))
+  X3, Z3 = f.sub(t1, Z3), f.add(t1, Z3)
+  Y3 = f.mul(X3, Z3)
+  at2 = f.mul(a, t2)
+  t1 = f.add(f.add(f.add(t0, t0), t0), at2)
+  t4 = f.add(f.mul(b3, t4), f.mul(a, f.sub(t0, at2)))
+  Y3 = f.add(Y3, f.mul(t1, t4))
+  X3 = f.sub(f.mul(t3, X3), f.mul(t5, t4))
+  Z3 = f.add(f.mul(t5, Z3), f.mul(t3, t1))
+  return X3, Y3, Z3
+
+def weierstrass_ladder(f, a, b, P, bits):
+  lanes = P[0].shape[1]
+  ma, mb3 = f.constant(a % f.p), f.constant(3*b % f.p)
+  zero = np.zeros_like(P[0])
+  one = np.broadcast_to(f.constant(1), zero.shape).copy()
+  R0, R1 = (zero, one, zero.copy()), P
+  swap = np.zeros(lanes, dtype=bool)
+  for bit in bits:
+    s = swap ^ bit
+    R0, R1 = (tuple(np.where(s, q, r) for r, q in zip(R0, R1)),
+              tuple(np.where(s, r, q) for r, q in zip(R0, R1)))
+    swap = bit
+    R1 = complete_add(f, ma, mb3, R0, R1)
+    R0 = complete_add(f, ma, mb3, R0, R0)
+  return tuple(np.where(swap, q, r) for r, q in zip(R0, R1))
+
+#
+# multiply() :- [dispatch.multiplypoint(opt, a, d, p, P, k) for P, k
+# in zip(points, scalars)], @points may also be a single point used
+# by every lane
+#
+
+def multiply(opt, a, d, p, points, scalars):
+  scalars = [int(k) for k in scalars]
+  if isinstance(points, tuple):
+    points = [points] * len(scalars)
+  res = [None] * len(scalars)
+  f = field(p)
+
+  if opt == '2' and br.weierstrass_to_montgomery(a % p, d % p, p) is None:
+    identity = dispatch.MODULES['2'].IDENTITY
+    lanes, xs, ys, ks = [], [], [], []
+    for i, (pt, k) in enumerate(zip(points, scalars)):
+      if pt == identity or k == 0:
+        res[i] = dispatch.multiplypoint(opt, a, d, p, pt, k)
+        continue
+      y = pt[1] % p if k > 0 else -pt[1] % p
+      lanes.append(i)
+      xs.append(pt[0] % p)
+      ys.append(y)
+      ks.append(abs(k))
+    if lanes:
+      X, Y, Z = weierstrass_ladder(f, a, d, tuple(f.to_mont(to_limbs(v, f.limbs)) for v in (xs, ys, [1]*len(xs))), scalar_bits(ks))
+      X, Y, Z = (from_limbs(v) for v in (X, Y, Z))
+      zi = br.batch_inv([z % p for z in Z], p)
+      for n, i in enumerate(lanes):
+        res[i] = identity if Z[n] % p == 0 else (X[n] * zi[n] % p, Y[n] * zi[n] % p)
+    return res
+
+  A, B = dispatch.to_montgomery(opt, a, d, p)
+  identity = br.MONTGOMERY_IDENTITY
+  lanes, us, vs, ks = [], [], [], []
+  for i, (pt, k) in enumerate(zip(points, scalars)):
+    m = dispatch.point_to_montgomery(opt, a, d, p, pt)
+    if k == 0 or m is None or m == identity or m[1] % p == 0:
+      res[i] = dispatch.multiplypoint(opt, a, d, p, pt, k)
+      continue
+    lanes.append(i)
+    us.append(m[0] % p)
+    vs.append(m[1] % p if k > 0 else -m[1] % p)
+    ks.append(abs(k))
+  if not lanes:
+    return res
+
+  x0, z0, x1, z1 = ladder(f, A, f.to_mont(to_limbs(us, f.limbs)), scalar_bits(ks))
+  x0, z0, x1, z1 = (from_limbs(v) for v in (x0, z0, x1, z1))
+  z0 = [z % p for z in z0]
+  z1 = [z % p for z in z1]
+  inv = br.batch_inv(z0 + z1 + [2*B*v % p for v in vs], p)
+  n = len(lanes)
+  for j, i in enumerate(lanes):
+    up, vp = us[j], vs[j]
+    if z0[j] == 0:
+      q = identity
+    elif z1[j] == 0:
+      q = (up, (p - vp) % p)
+    else:
+      # Okeya-Sakurai y recovery, as in dispatch.ladder_multiply()
+      uq = x0[j] * inv[j] % p
+      us_ = x1[j] * inv[n + j] % p
+      num = (uq*up + 1) * (uq + up + 2*A) - 2*A - (uq - up) * (uq - up) * us_
+      q = (uq, num * inv[2*n + j] % p)
+    q = dispatch.point_from_montgomery(opt, a, d, p, q)
+    res[i] = q if q is not None else dispatch.multiplypoint(opt, a, d, p, points[i], scalars[i])
+  return res
@@ -1,10 +1,18 @@
 #file: find_points.py
 #montgomery curve : By^2 = x^3 + Ax^2 + x
 
-from sympy import mod_inverse, nextprime
-import random
+from gmpy2 import invert, next_prime
 # import graph_points as graph
 
+#point at infinity, the neutral element of the group
+#(0, 0) is a point of order 2 on every Montgomery curve, (0, 1)
+#never lies on By^2 = x^3 + Ax^2 + x so it is used instead
+IDENTITY = (0, 1)
+
+#modular inverse, gmpy2 rather than sympy keeps the import cheap
+def mod_inverse(x, p):
+    return int(invert(x, p))
+
 #hasse's theorem
 def hassesTheorem(prime):
     upperBound = int(prime + 1 + 2*(prime ** 0.5))
@@ -13,7 +21,7 @@ def hassesTheorem(prime):
 
 #gets us the next prime if number isn't prime
 def getPrime(number):
-    new_prime = nextprime(number - 1)
+    new_prime = int(next_prime(number - 1))
     if number == new_prime:
         return number
     else:
@@ -101,9 +109,11 @@ def legendre_symbol(a: int, p: int, /) -> int:
 
 
 def _choose_b(p: int, /) -> int:
+    # the smallest non-square, a random one would make the root (and
+    # so the order of generatePoints()) change from one call to the next
     b = 2
     while legendre_symbol(b, p) == 1:
-        b = random.randrange(2, p)
+        b += 1
     return b
 
 
@@ -193,8 +203,47 @@ def generatePoints(a, b, p, start = 0):
     return (x_coordinates, y_coordinates)
 
 
+#counts the affine points with x in [start, stop)
+def count_points(a, b, p, start, stop):
+    totalPoints = 0
+    b_inverse = inverse_modulo(b, p)
+    for i in range(start, min(stop, p)):
+        m = ((i*i*i + a*i*i + i) * b_inverse) % p
+        quadraticResidue = legendre(m, p)
+        if quadraticResidue == 1:
+            totalPoints += 2
+        elif quadraticResidue == 0:
+            totalPoints += 1
+    return totalPoints
+
+def points_at_infinity(a, b, p):
+    return 1
+
+#order of the group, affine points plus the point at infinity
+def find_points(a, b, p):
+    return count_points(a, b, p, 0, p) + points_at_infinity(a, b, p)
+
+#point with the given x coordinate, None if there is none
+def liftpoint(a, b, p, x):
+    m = findM(a, b, x, p)
+    quadraticResidue = legendre(m, p)
+    if quadraticResidue == 0:
+        return (x % p, 0)
+    if quadraticResidue != 1:
+        return None
+    if p % 4 == 3:
+        y = euler(m, p)
+    else:
+        y = tonelli_shanks(m, p)
+    return (x % p, y)
+
+
 #add_points.py
 def addpoints(a, b, p, p1, p2):
+    if p1 == IDENTITY:
+        return p2
+    if p2 == IDENTITY:
+        return p1
     x1, y1 = p1
     x2, y2 = p2
     # x1 = p1[0]
@@ -206,8 +255,8 @@ def addpoints(a, b, p, p1, p2):
         print('Both the points are same! Perform point doubling operation instead addition.')
         return doublepoint(a, b, p, p1)
     elif x1 == x2 :
-        print("Addition of two points ({}, {}) and ({}, {}) is = ({}, {})".format(x1, y1, x2, y2, 0, 0))
-        return (0, 0)
+        print("Addition of two points ({}, {}) and ({}, {}) is the point at infinity".format(x1, y1, x2, y2))
+        return IDENTITY
     else :
         try :
             k = (((y2 - y1) % p) * mod_inverse((x2 - x1) % p, p)) % p
@@ -240,9 +289,11 @@ def substractpoints(a, b, p, p1, p2):
 
 #doubling
 def doublepoint(a,b,p,p1):
+    if p1 == IDENTITY:
+      return IDENTITY
     x, y = p1
     if y == 0:
-      return (0, 0)
+      return IDENTITY
     try :
         k = (((((((((x ** 2) % p) * 3) % p) + (((2 * a) % p) * x) % p) % p) + 1) % p) * mod_inverse((((2 * b) % p) * y) % p, p)) % p
         x3 = (((((((b * ((k ** 2) % p)) % p) - a) % p) - x) % p) - x) % p
@@ -265,8 +316,11 @@ def multiplypoint(a,b,p,p1,k):
     print("k = ", k)
     # x0 = 0
     # y0 = 0
+    if k < 0:
+        p1 = (p1[0], (p - p1[1]) % p)
+        k = -k
     x, y = p1
-    p0 = (0, 0)
+    p0 = IDENTITY
     idx = k.bit_length()
     while idx >= 0:
         print("idx = ", idx)
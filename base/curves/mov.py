@@ -0,0 +1,500 @@
+import random
+from functools import lru_cache
+from math import exp, isqrt, log
+
+from gmpy2 import invert, is_prime, mpz
+
+from base.curves import birational as br
+
+#
+# MOV / Frey-Ruck reduction for short Weierstrass curves
+#
+# when the order n of P divides p^k - 1 for a small k (the embedding
+# degree), the reduced Tate pairing
+#
+#   t(P, Q) = f_{n,P}(Q)^((p^k - 1)/n)
+#
+# maps <P> into the n-th roots of unity of F_{p^k}, with t(kP, Q) =
+# t(P, Q)^k, so the division R = kP becomes a discrete log in the
+# multiplicative group of the field : supersingular curves (k = 2
+# for p > 3) and curves with n | p - 1 (k = 1)
+#
+# the field log is Pohlig-Hellman over the factors of n, each prime
+# q solved by index calculus in F_p* for k = 1 and a large q, and by
+# baby-step giant-step on field elements otherwise, whose products
+# are far cheaper than curve additions
+#
+# F_{p^k} is F_p[x]/(m) for a monic irreducible m of degree k, its
+# elements are the coefficient lists of birational.py, lowest degree
+# first, [] being 0
+#
+# solve() checks its answer on the curve and returns None when the
+# reduction does not apply or fails, dispatch.bsgs() then falls back
+# to the generic algorithm
+#
+
+# embedding degrees the pairing is worked out for, and those
+# dispatch.bsgs() tries on its own
+KMAX = 6
+AUTO_KMAX = 2
+# n from which dispatch.bsgs() tries the reduction
+MIN_ORDER = 1 << 16
+# prime subgroups of F_p* from this size on are solved by index
+# calculus, below it the field baby-step giant-step is quicker
+IC_MIN = 1 << 40
+# largest prime q for the field baby-step giant-step
+BSGS_MAX = 1 << 48
+
+#
+# embedding_degree() :- smallest k <= kmax with n | p^k - 1, None
+# when there is none
+#
+
+def embedding_degree(n, p, kmax=KMAX):
+  if n < 2 or p % n == 0:
+    return None
+  t = 1
+  for k in range(1, kmax + 1):
+    t = t * p % n
+    if t == 1:
+      return k
+  return None
+
+#
+# irreducible() :- monic irreducible polynomial of degree k over F_p,
+# x^2 + 1 when it is one, the first irreducible one found otherwise
+#
+
+def prime_factors(n):
+  res, q = [], 2
+  while q*q <= n:
+    if n % q == 0:
+      res.append(q)
+      while n % q == 0:
+        n //= q
+    q += 1
+  if n > 1:
+    res.append(n)
+  return res
+
+def is_irreducible(f, p):
+  # Rabin's test, x^(p^k) = x and gcd(x^(p^(k/r)) - x, f) = 1 for
+  # every prime r | k
+  k = len(f) - 1
+  def frobenius(times):
+    h = [0, 1]
+    for _ in range(times):
+      h = br.poly_powmod(h, p, f, p)
+    return h
+  if br.poly_sub(frobenius(k), br.poly_mod([0, 1], f, p), p):
+    return False
+  return all(len(br.poly_gcd(f, br.poly_sub(frobenius(k // r), [0, 1], p), p)) == 1 for r in prime_factors(k))
+
+@lru_cache(maxsize=64)
+def irreducible(p, k):
+  if k == 1:
+    return (0, 1)
+  if k == 2 and p % 4 == 3:
+    return (1, 0, 1)
+  rng = random.Random(p)
+  while True:
+    f = [rng.randrange(p) for _ in range(k)] + [1]
+    if f[0] and is_irreducible(f, p):
+      return tuple(f)
+
+#
+# Extension :- arithmetic in F_{p^k}
+#
+
+class Extension:
+  def __init__(self, p, k):
+    self.p, self.k = p, k
+    self.m = list(irreducible(p, k))
+    self.q = p**k
+
+  def const(self, c):
+    return br.poly_trim([c % self.p])
+
+  def add(self, x, y):
+    n = max(len(x), len(y))
+    x, y = x + [0]*(n - len(x)), y + [0]*(n - len(y))
+    return br.poly_trim([(s + t) % self.p for s, t in zip(x, y)])
+
+  def sub(self, x, y):
+    return br.poly_sub(x, y, self.p)
+
+  def mul(self, x, y):
+    return br.poly_mulmod(x, y, self.m, self.p)
+
+  def pow(self, x, e):
+    return br.poly_powmod(x, e % (self.q - 1), self.m, self.p) if x else []
+
+  def inv(self, x):
+    return self.pow(x, self.q - 2)
+
+  def random(self, rng):
+    return br.poly_trim([rng.randrange(self.p) for _ in range(self.k)])
+
+  #
+  # sqrt() :- a square root of x, None for a non square
+  # (Tonelli-Shanks over F_q)
+  #
+
+  def sqrt(self, x, rng):
+    if not x:
+      return []
+    if self.pow(x, (self.q - 1)//2) != [1]:
+      return None
+    t, s = self.q - 1, 0
+    while t % 2 == 0:
+      t //= 2
+      s += 1
+    z = self.random(rng)
+    while not z or self.pow(z, (self.q - 1)//2) == [1]:
+      z = self.random(rng)
+    m, c, u, r = s, self.pow(z, t), self.pow(x, t), self.pow(x, (t + 1)//2)
+    while u != [1]:
+      i, u2 = 0, u
+      while u2 != [1]:
+        u2 = self.mul(u2, u2)
+        i += 1
+      b = self.pow(c, 1 << (m - i - 1))
+      m, c = i, self.mul(b, b)
+      u, r = self.mul(u, c), self.mul(r, b)
+    return r
+
+#
+# points of y^2 = x^3 + ax + b over F_{p^k} are pairs of field
+# elements, None the point at infinity
+#
+
+def embed(F, pt):
+  return None if pt is None else (F.const(pt[0]), F.const(pt[1]))
+
+def random_point(F, a, b, rng):
+  while True:
+    x = F.random(rng)
+    rhs = F.add(F.mul(F.add(F.mul(x, x), F.const(a)), x), F.const(b))
+    y = F.sqrt(rhs, rng)
+    if y is not None:
+      return (x, y)
+
+#
+# line() :- (l(Q), v(Q), T + S), l the line through T and S (the
+# tangent when T = S) and v the vertical line through T + S, both
+# evaluated at Q
+#
+
+def line(F, a, T, S, Q):
+  if T is None or S is None:
+    return [1], [1], S if T is None else T
+  (xt, yt), (xs, ys), (xq, yq) = T, S, Q
+  if xt == xs and not F.add(yt, ys):
+    return F.sub(xq, xt), [1], None
+  if T == S:
+    lam = F.mul(F.add(F.mul(F.const(3), F.mul(xt, xt)), F.const(a)), F.inv(F.add(yt, yt)))
+  else:
+    lam = F.mul(F.sub(ys, yt), F.inv(F.sub(xs, xt)))
+  x3 = F.sub(F.sub(F.mul(lam, lam), xt), xs)
+  y3 = F.sub(F.mul(lam, F.sub(xt, x3)), yt)
+  l = F.sub(F.sub(yq, yt), F.mul(lam, F.sub(xq, xt)))
+  return l, F.sub(xq, x3), (x3, y3)
+
+#
+# miller() :- (numerator, denominator) of f_{n,P}(Q), the function
+# with divisor n(P) - n(O), None when Q meets a zero or pole of one
+# of the lines
+#
+
+def miller(F, a, P, Q, n):
+  num, den, T = [1], [1], P
+  for bit in bin(n)[3:]:
+    l, v, T = line(F, a, T, T, Q)
+    num, den = F.mul(F.mul(num, num), l), F.mul(F.mul(den, den), v)
+    if bit == '1':
+      l, v, T = line(F, a, T, P, Q)
+      num, den = F.mul(num, l), F.mul(den, v)
+  if not num or not den:
+    return None
+  return num, den
+
+#
+# tate() :- reduced Tate pairing of P (order n) and Q, None when Q
+# is a bad choice (retry with another one)
+#
+
+def tate(F, a, P, Q, n):
+  f = miller(F, a, P, Q, n)
+  if f is None:
+    return None
+  return F.pow(F.mul(f[0], F.inv(f[1])), (F.q - 1) // n)
+
+#
+# weil() :- Weil pairing (-1)^n f_{n,P}(Q) / f_{n,Q}(P) of two n
+# torsion points of E(F_{p^k})
+#
+
+def weil(F, a, P, Q, n):
+  f, g = miller(F, a, P, Q, n), miller(F, a, Q, P, n)
+  if f is None or g is None:
+    return None
+  e = F.mul(F.mul(f[0], g[1]), F.inv(F.mul(f[1], g[0])))
+  return F.sub([], e) if n % 2 else e
+
+#
+# logs in the field
+#
+
+#
+# bsgs_field() :- x in [0, q) with g^x = h for g of order q, None
+# when there is none
+#
+
+def bsgs_field(F, g, h, q):
+  m = isqrt(q - 1) + 1
+  baby, t = {}, [1]
+  for j in range(m):
+    baby.setdefault(tuple(t), j)
+    t = F.mul(t, g)
+  step = F.inv(t)
+  t = h
+  for i in range(m + 1):
+    j = baby.get(tuple(t))
+    if j is not None:
+      return (i*m + j) % q
+    t = F.mul(t, step)
+  return None
+
+#
+# index calculus in F_p* for a subgroup of prime order q with q^2
+# not dividing p - 1
+#
+# with c = (p - 1)/q and gamma any element with gamma^c != 1, psi(x)
+# = log of x^c to the base gamma^c is a homomorphism onto Z/q with
+# psi(gamma^e) = e, so a smooth gamma^e = prod l_i^c_i gives the
+# relation e = sum c_i psi(l_i) (mod q), enough of them give psi of
+# every prime of the factor base and psi(h)/psi(g) is log_g(h)
+#
+# gamma^e is split as a/b with a, b about sqrt(p) (the rational
+# reconstruction of the extended Euclid), both halves are far more
+# likely smooth than the whole, and the sign drops out mod q
+#
+
+def sieve(bound):
+  flags = bytearray([1]) * (bound + 1)
+  flags[:2] = b'\x00\x00'
+  for i in range(2, isqrt(bound) + 1):
+    if flags[i]:
+      flags[i*i::i] = bytearray(len(flags[i*i::i]))
+  return [i for i in range(bound + 1) if flags[i]]
+
+def smoothness_bound(p):
+  s = log(isqrt(p))
+  return max(64, min(1 << 13, int(exp((s * log(s)) ** 0.5))))
+
+def smooth_part(x, base, product):
+  # x divides a power of the product of the base exactly when it is
+  # smooth, the exponents come from trial division afterwards
+  x = mpz(x)
+  if x == 0:
+    return None
+  y = product % x
+  for _ in range(x.bit_length().bit_length()):
+    y = y * y % x
+  if y != 0 and x != 1:
+    return None
+  res = {}
+  for i, l in enumerate(base):
+    while x % l == 0:
+      x //= l
+      res[i] = res.get(i, 0) + 1
+    if x == 1:
+      break
+  return res
+
+def split(r, p, root, base, product):
+  r0, r1, t0, t1 = p, r, 0, 1
+  while r1 > root:
+    k = r0 // r1
+    r0, r1, t0, t1 = r1, r0 - k*r1, t1, t0 - k*t1
+  num = smooth_part(r1, base, product)
+  if num is None:
+    return None
+  den = smooth_part(abs(t1), base, product)
+  if den is None:
+    return None
+  for i, e in den.items():
+    num[i] = num.get(i, 0) - e
+  return num
+
+#
+# solve_mod() :- values mod q of the unknowns fixed by the sparse
+# relations [({column: coefficient}, rhs), ...], None for the others
+#
+# Gauss-Jordan on dictionaries : pivot rows only ever hold their own
+# column and free ones, so a new relation is reduced in one pass and
+# a new pivot is cleared from the rows that have it
+#
+
+def solve_mod(rows, q):
+  pivots = {}
+  for row, e in rows:
+    row = {c: v % q for c, v in row.items() if v % q}
+    e %= q
+    for c in [c for c in row if c in pivots]:
+      coef = row.pop(c)
+      prow, pe = pivots[c]
+      for cc, v in prow.items():
+        if cc != c:
+          w = (row.get(cc, 0) - coef*v) % q
+          if w:
+            row[cc] = w
+          else:
+            row.pop(cc, None)
+      e = (e - coef*pe) % q
+    if not row:
+      continue
+    c = min(row)
+    t = int(invert(row[c], q))
+    row, e = {k: v*t % q for k, v in row.items()}, e*t % q
+    for d, (prow, pe) in pivots.items():
+      coef = prow.get(c)
+      if coef:
+        for cc, v in row.items():
+          w = (prow.get(cc, 0) - coef*v) % q
+          if w:
+            prow[cc] = w
+          else:
+            prow.pop(cc, None)
+        pivots[d] = (prow, (pe - coef*e) % q)
+    pivots[c] = (row, e)
+
+  values = {}
+  for c, (prow, e) in pivots.items():
+    values[c] = e if len(prow) == 1 else None
+  return values
+
+def index_calculus(p, g, h, q, rng, extra=20, tries=100000):
+  c = (p - 1) // q
+  gamma = 2
+  while pow(gamma, c, p) == 1:
+    gamma += 1
+  base = sieve(smoothness_bound(p))
+  product = mpz(1)
+  for l in base:
+    product *= l
+  root = isqrt(p)
+
+  rows = []
+  while len(rows) < len(base) + extra:
+    e = rng.randrange(1, p - 1)
+    rel = split(pow(gamma, e, p), p, root, base, product)
+    if rel is not None:
+      rows.append((rel, e))
+  logs = solve_mod(rows, q)
+
+  def psi(x):
+    for _ in range(tries):
+      e = rng.randrange(p - 1)
+      rel = split(x * pow(gamma, e, p) % p, p, root, base, product)
+      if rel is not None and all(logs.get(i) is not None for i in rel):
+        return (sum(v*logs[i] for i, v in rel.items()) - e) % q
+    return None
+
+  lg, lh = psi(g), psi(h)
+  if not lg or lh is None:
+    return None
+  res = lh * int(invert(lg, q)) % q
+  return res if pow(g, res, p) == h else None
+
+#
+# subgroup_log() :- x with g^x = h for g of prime order q
+#
+
+def subgroup_log(F, g, h, q, rng):
+  if h == [1]:
+    return 0
+  if F.k == 1 and q >= IC_MIN and ((F.p - 1)//q) % q:
+    x = index_calculus(F.p, g[0], h[0] if h else 0, q, rng)
+    if x is not None:
+      return x
+  if q > BSGS_MAX:
+    return None
+  return bsgs_field(F, g, h, q)
+
+#
+# factor() :- [(q, e), ...] of n by trial division up to @bound, a
+# composite cofactor left over is returned as one "prime"
+#
+
+def factor(n, bound=1 << 16):
+  res, q = [], 2
+  while q <= bound and q*q <= n:
+    e = 0
+    while n % q == 0:
+      n //= q
+      e += 1
+    if e:
+      res.append((q, e))
+    q += 1 if q == 2 else 2
+  if n > 1:
+    res.append((n, 1))
+  return res
+
+#
+# field_log() :- x mod n with g^x = h for g of order n (Pohlig-
+# Hellman), None when there is none
+#
+
+def field_log(F, g, h, n, rng):
+  x, modulus = 0, 1
+  for q, e in factor(n):
+    qe = q**e
+    gq, hq = F.pow(g, n // qe), F.pow(h, n // qe)
+    gamma = F.pow(gq, qe // q)
+    # digits of x mod q^e, lowest first
+    xq = 0
+    for i in range(e):
+      t = F.pow(F.mul(hq, F.pow(gq, -xq)), qe // q**(i + 1))
+      if is_prime(q):
+        d = subgroup_log(F, gamma, t, q, rng)
+      else:
+        # a composite cofactor factor() could not split
+        d = bsgs_field(F, gamma, t, q) if q <= BSGS_MAX else None
+      if d is None:
+        return None
+      xq += d * q**i
+    # chinese remainder with what is known so far
+    x += modulus * ((xq - x) * int(invert(modulus, qe)) % qe)
+    modulus *= qe
+  return x % n
+
+#
+# solve() :- k with R = kP on y^2 = x^3 + ax + b, P of order n, by
+# the pairing, None when the embedding degree is above @kmax or the
+# reduction fails
+#
+
+def solve(a, b, p, P, R, n, kmax=KMAX, tries=10, rng=None):
+  from base.curves import tables
+
+  k = embedding_degree(n, p, kmax)
+  if k is None or P == br.WEIERSTRASS_IDENTITY:
+    return None
+  rng = rng or random.Random(n)
+  F = Extension(p, k)
+  for _ in range(tries):
+    Q = random_point(F, a, b, rng)
+    g = tate(F, a, embed(F, P), Q, n)
+    # g must have order n for the log to be unique mod n
+    if g is None or any(F.pow(g, n // q) == [1] for q, _ in factor(n)):
+      continue
+    h = [1] if R == br.WEIERSTRASS_IDENTITY else tate(F, a, embed(F, R), Q, n)
+    if h is None:
+      continue
+    x = field_log(F, g, h, n, rng)
+    if x is None:
+      return None
+    check = tables.w_mul(a, p, P, x)
+    return x if check == (None if R == br.WEIERSTRASS_IDENTITY else R) else None
+  return None
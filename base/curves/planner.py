@@ -0,0 +1,269 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from math import exp, isqrt, log
+
+from gmpy2 import invert
+
+from base.curves import babysteps, dispatch, ecm, mov, smart, tables
+from base.curves import s_weirstrass_curve as sw
+
+#
+# Planner for the division p1 = k*p2
+#
+# every method that applies to the curve and the points is priced in
+# curve additions, turned into seconds with the time of an addition
+# measured on the curve itself, and the cheapest one is run :
+#
+#   table            : p < tables.LIMIT, a lookup in the group table
+#   smart            : anomalous curves (#E = p), O(log p), smart.py
+#   mov              : embedding degree k <= mov.KMAX, the pairing and
+#                      a log in F_{p^k}, whose products are cheaper
+#                      than additions (FIELD_RATIO k^2 each), mov.py
+#   pohlig-hellman   : n = prod q^e composite, a division of order q
+#                      for every digit, O(sum e sqrt(q))
+#   bsgs             : O(sqrt(n)) additions and sqrt(n) baby steps in
+#                      memory, ENTRY_BYTES each
+#   out-of-core bsgs : when the baby steps do not fit in MEMORY_SHARE
+#                      of the available memory, on disk (babysteps.py)
+#
+# the divisions of order q inside pohlig-hellman are themselves bsgs
+# or out-of-core bsgs by the same rule, and run across @jobs worker
+# processes when more than one of them is large (PARALLEL_STEPS)
+#
+# n is the order of p2 (or a multiple of it, reduced to the order
+# first) and @factors its factorisation or that of any multiple of
+# it such as the group order (see base.catalogue.facts())
+#
+# the points are worked on in the short Weierstrass model with None
+# for the identity (see tables.py)
+#
+
+# bytes per in-memory baby step (dict entry, tuple and two ints)
+ENTRY_BYTES = 250
+# share of the available memory the baby steps may take
+MEMORY_SHARE = 0.5
+# product in F_{p^k} against a curve addition, times k^2
+FIELD_RATIO = 0.3
+# baby steps from which the divisions of pohlig-hellman are run in
+# separate processes
+PARALLEL_STEPS = 1 << 16
+# additions timed to price the others
+CALIBRATION = 64
+
+
+def available_memory():
+  try:
+    return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+  except (ValueError, OSError, AttributeError):
+    return 1 << 30
+
+def factorise(n):
+  return ecm.factorise(n)
+
+#
+# order_factors() :- factorisation of n from that of a multiple of it
+#
+
+def order_factors(n, factors):
+  res = []
+  for q, _ in factors:
+    e = 0
+    while n % q == 0:
+      n //= q
+      e += 1
+    if e:
+      res.append([q, e])
+  return res
+
+def to_weierstrass(opt, a, d, p, pt):
+  w = dispatch.point_to_weierstrass(opt, a, d, p, pt)
+  return None if w is None or w == sw.IDENTITY else (w[0] % p, w[1] % p)
+
+#
+# add_seconds() :- measured time of one addition on the curve
+#
+
+def add_seconds(wa, p, P):
+  if P is None:
+    return 1e-6
+  pt, start = P, time.perf_counter()
+  for _ in range(CALIBRATION):
+    pt = tables.w_add(wa, p, pt, P) or P
+  return (time.perf_counter() - start) / CALIBRATION
+
+#
+# prime_method() :- (method, additions, memory) of a division of
+# order q with @memory bytes for the baby steps
+#
+
+def prime_method(q, memory):
+  m = isqrt(q) + 1
+  if m*ENTRY_BYTES <= memory:
+    # a giant step costs about half as much again as a baby step
+    return 'bsgs', 3*m, m*ENTRY_BYTES
+  m = isqrt(q // 2) + 1
+  # the table is written once, searched in sorted chunks
+  return 'out-of-core bsgs', 2*m + q // (2*m + 1), 0
+
+def mov_cost(n, p, k, factors):
+  field = FIELD_RATIO * k * k
+  ops = 2 * 1.5 * n.bit_length() * field
+  for q, e in factors:
+    if k == 1 and q >= mov.IC_MIN:
+      # L_p[1/2, sqrt 2] relations and a linear solve
+      lp = log(p)
+      ops += e * exp((2 * lp * log(lp)) ** 0.5) * field
+    elif q > mov.BSGS_MAX:
+      return None
+    else:
+      ops += e * (2 * isqrt(q) + 1.5 * q.bit_length()) * field
+  return ops
+
+#
+# plan() :- the options priced for p1 = k*p2, cheapest first, as
+#
+#   {'method', 'operations', 'seconds', 'memory', 'options': [...],
+#    'order', 'factors', 'steps': [[q, e, method], ...]}
+#
+# the top level keys describe the chosen (cheapest) option, @memory
+# bytes (MEMORY_SHARE of what is available by default) and @jobs
+# processes (all cores) may be used
+#
+
+def plan(opt, a, d, p, p1, p2, n, factors=None, memory=None, jobs=None):
+  memory = memory if memory is not None else int(available_memory() * MEMORY_SHARE)
+  jobs = jobs or os.cpu_count() or 1
+  wa, wb = dispatch.to_weierstrass(opt, a, d, p)
+  P = to_weierstrass(opt, a, d, p, p2)
+  factors = order_factors(n, factors or factorise(n))
+  if P is not None:
+    n = tables.w_order(wa, p, P, n, factors)
+    factors = order_factors(n, factors)
+  seconds = add_seconds(wa, p, P)
+
+  options = []
+  def option(method, ops, mem=0, **extra):
+    options.append(dict(method=method, operations=int(ops), seconds=ops * seconds, memory=mem, **extra))
+
+  if p < tables.LIMIT:
+    option('table', 1, 4*p + 8*n)
+  if smart.is_anomalous(wa, wb, p):
+    option('smart', 12 * p.bit_length())
+  k = mov.embedding_degree(n, p, mov.KMAX) if n > 1 else None
+  if k is not None:
+    ops = mov_cost(n, p, k, factors)
+    if ops is not None:
+      option('mov', ops, embedding_degree=k)
+  if len(factors) > 1 or (factors and factors[0][1] > 1):
+    steps, ops, mem, large = [], 0, 0, 0
+    for q, e in factors:
+      method, sub, sub_mem = prime_method(q, memory)
+      steps.append([q, e, method])
+      ops += e * (sub + 3 * n.bit_length())
+      mem = max(mem, sub_mem)
+      large += isqrt(q) >= PARALLEL_STEPS
+    option('pohlig-hellman', ops / max(1, min(jobs, large)), mem, steps=steps)
+  method, ops, mem = prime_method(n, memory)
+  option(method, ops, mem)
+
+  options.sort(key=lambda o: o['seconds'])
+  best = dict(options[0])
+  best.update(options=options, order=n, factors=factors)
+  best.setdefault('steps', [])
+  return best
+
+#
+# describe() :- one line summary of a plan for the user
+#
+
+def describe(plan):
+  best = plan['options'][0]
+  text = '{} : about {:.3g} additions, {:.3g} s'.format(best['method'], best['operations'], best['seconds'])
+  others = ', '.join('{} {:.3g} s'.format(o['method'], o['seconds']) for o in plan['options'][1:])
+  return text + (' (instead of ' + others + ')' if others else '')
+
+#
+# prime_power_log() :- x mod q^e with H = xG, G of order q^e, None
+# when there is none, digit by digit
+#
+
+def prime_power_log(wa, wb, p, G, H, q, e, method):
+  g = tables.w_mul(wa, p, G, q**(e - 1))
+  x = 0
+  for j in range(e):
+    R = tables.w_add(wa, p, H, tables.w_neg(p, tables.w_mul(wa, p, G, x)))
+    R = tables.w_mul(wa, p, R, q**(e - 1 - j))
+    if R is None:
+      digit = 0
+    elif g is None:
+      return None
+    elif method == 'out-of-core bsgs':
+      digit = babysteps.solve(wa, wb, p, R, g, q)
+    else:
+      digit = sw.bsgs(wa, wb, p, R, g, q)
+    if digit < 0:
+      return None
+    x += digit * q**j
+  return x
+
+def pohlig_hellman(wa, wb, p, P, Q, n, steps, jobs=1):
+  tasks = []
+  for q, e, method in steps:
+    c = n // q**e
+    tasks.append((wa, wb, p, tables.w_mul(wa, p, P, c), tables.w_mul(wa, p, Q, c), q, e, method))
+  large = sum(isqrt(q) >= PARALLEL_STEPS for q, _, _ in steps)
+  if jobs > 1 and large > 1:
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+      logs = list(pool.map(prime_power_log, *zip(*tasks)))
+  else:
+    logs = [prime_power_log(*t) for t in tasks]
+  if any(x is None for x in logs):
+    return -1
+  # chinese remainder
+  k, modulus = 0, 1
+  for (q, e, _), x in zip(steps, logs):
+    qe = q**e
+    k += modulus * ((x - k) * int(invert(modulus, qe)) % qe)
+    modulus *= qe
+  return k % n
+
+#
+# solve() :- k mod the order of p2 with p1 = k*p2 by the cheapest
+# method of @plan (plan() when not given), the next one when it
+# fails, -1 when there is no k
+#
+
+def solve(opt, a, d, p, p1, p2, n, factors=None, chosen=None, jobs=None):
+  chosen = chosen or plan(opt, a, d, p, p1, p2, n, factors, jobs=jobs)
+  jobs = jobs or os.cpu_count() or 1
+  n = chosen['order']
+  wa, wb = dispatch.to_weierstrass(opt, a, d, p)
+  P, Q = to_weierstrass(opt, a, d, p, p2), to_weierstrass(opt, a, d, p, p1)
+  if Q is None:
+    return 0
+  if P is None:
+    return -1
+  for option in chosen['options']:
+    method = option['method']
+    if method == 'table':
+      k = dispatch.bsgs(opt, a, d, p, p1, p2, n)
+    elif method == 'smart':
+      k = smart.solve(wa, wb, p, P, Q)
+    elif method == 'mov':
+      k = mov.solve(wa, wb, p, P, Q, n)
+    elif method == 'pohlig-hellman':
+      k = pohlig_hellman(wa, wb, p, P, Q, n, option['steps'], jobs)
+    elif method == 'out-of-core bsgs':
+      k = babysteps.solve(wa, wb, p, Q, P, n)
+    else:
+      k = sw.bsgs(wa, wb, p, Q, P, n)
+    if k is None:
+      continue
+    if k < 0:
+      return k
+    # a k that does not check out is a failure of the method
+    k %= n
+    if tables.w_mul(wa, p, P, k) == Q:
+      return k
+  return -1
@@ -0,0 +1,196 @@
+from functools import lru_cache
+
+#
+# Special form primes and their shift and add reduction
+#
+# Mersenne        : p = 2^k - 1
+# pseudo Mersenne : p = 2^k - c, c small (2^255 - 19, secp256k1's
+#                   2^256 - 2^32 - 977)
+# Solinas         : p = 2^k - sum of a few signed powers of two
+#                   (P-256 = 2^256 - 2^224 + 2^192 + 2^96 - 1)
+#
+# with x = hi*2^k + lo and 2^k = c (mod p), x = lo + hi*c (mod p)
+# folds x down by k - log2(c) bits with shifts, masks and, for the
+# pseudo Mersenne primes, a product by the small c
+#
+# reducer(p) returns the reduction for p, any integer in, x % p
+# out, and generic % for other primes
+#
+# CPython's % is already a C loop, the folds only keep up with it
+# where they need no multiplication at all, for Mersenne primes (on
+# par to 1.3x on a 2^521 - 1 ladder depending on the machine), so
+# fast_reducer() hands out just those and the curve modules keep %
+# for every other prime ; the pseudo Mersenne fold pays off in the
+# limb arithmetic of lanes.py (python -m base.curves.primes prints
+# the timings)
+#
+
+# the largest c of a pseudo Mersenne prime, relative to k, and the
+# most terms of a Solinas prime
+PSEUDO_BITS = 1/2
+SOLINAS_TERMS = 5
+# below a machine word generic % is as fast
+MIN_BITS = 64
+
+#
+# detect() :- ('mersenne', k, 1), ('pseudo-mersenne', k, c),
+# ('solinas', k, terms) with terms the (sign, exponent) pairs of
+# 2^k mod p, or None for a generic prime
+#
+
+@lru_cache(maxsize=256)
+def detect(p):
+  k = p.bit_length()
+  if k < MIN_BITS:
+    return None
+  if p == (1 << k) - 1:
+    return ('mersenne', k, 1)
+  # 2^(k-1) < p < 2^k, try the nearest power of two above
+  c = (1 << k) - p
+  if c.bit_length() <= k*PSEUDO_BITS and c.bit_length() <= 64:
+    return ('pseudo-mersenne', k, c)
+  terms = signed_binary(c)
+  if len(terms) <= SOLINAS_TERMS and max(e for _, e in terms) < k - 16:
+    return ('solinas', k, tuple(terms))
+  return None
+
+#
+# signed_binary() :- non adjacent form of n as (sign, exponent)
+# pairs, the fewest signed powers of two summing to n
+#
+
+def signed_binary(n):
+  terms, e = [], 0
+  while n:
+    if n & 1:
+      s = 2 - (n & 3)
+      terms.append((s, e))
+      n -= s
+    n >>= 1
+    e += 1
+  return terms
+
+#
+# the reductions, each takes any integer whose size is at most about
+# p^2 (the product of two reduced values, or of small sums of them)
+#
+
+def mersenne(k, p):
+  mask = (1 << k) - 1
+  def reduce(x):
+    x = (x & mask) + (x >> k)
+    x = (x & mask) + (x >> k)
+    if 0 <= x < p:
+      return x
+    return x % p
+  return reduce
+
+def pseudo_mersenne(k, c, p):
+  mask = (1 << k) - 1
+  def reduce(x):
+    x = (x & mask) + c*(x >> k)
+    x = (x & mask) + c*(x >> k)
+    if 0 <= x < p:
+      return x
+    return x % p
+  return reduce
+
+def solinas(k, terms, p):
+  mask = (1 << k) - 1
+  # each fold shrinks x by k minus the largest exponent, fold until
+  # x fits in k + 1 bits
+  limit = 1 << (k + 1)
+  plus = [e for s, e in terms if s > 0]
+  minus = [e for s, e in terms if s < 0]
+  def reduce(x):
+    while x >= limit or x <= -limit:
+      hi = x >> k
+      x &= mask
+      for e in plus:
+        x += hi << e
+      for e in minus:
+        x -= hi << e
+    if 0 <= x < p:
+      return x
+    return x % p
+  return reduce
+
+def generic(p):
+  def reduce(x):
+    return x % p
+  return reduce
+
+@lru_cache(maxsize=256)
+def reducer(p):
+  form = detect(p)
+  if form is None:
+    return generic(p)
+  kind, k, c = form
+  if kind == 'mersenne':
+    return mersenne(k, p)
+  if kind == 'pseudo-mersenne':
+    return pseudo_mersenne(k, c, p)
+  return solinas(k, c, p)
+
+#
+# fast_reducer() :- the reduction of p when it beats % on python
+# integers, None otherwise
+#
+
+def fast_reducer(p):
+  form = detect(p)
+  if form is None or form[0] != 'mersenne':
+    return None
+  return reducer(p)
+
+#
+# describe() :- the form of p as text ('2^255 - 19'), None for a
+# generic prime
+#
+
+def describe(p):
+  form = detect(p)
+  if form is None:
+    return None
+  kind, k, c = form
+  if kind == 'solinas':
+    # p = 2^k - c, c = sum of the signed terms
+    rest = ''.join(' {} 2^{}'.format('-' if s > 0 else '+', e) if e else ' {} 1'.format('-' if s > 0 else '+') for s, e in sorted(c, key=lambda t: -t[1]))
+    return 'Solinas prime 2^{}{}'.format(k, rest)
+  name = 'Mersenne' if kind == 'mersenne' else 'pseudo-Mersenne'
+  return '{} prime 2^{} - {}'.format(name, k, c)
+
+#
+# benchmark() :- seconds per reduction of a random product, generic
+# % against the shift and add reduction, and per lane of a lanes.py
+# multiplication of @lanes elements through REDC and the fold
+#
+
+def benchmark(p, n=100000, lanes=4096):
+  import random
+  import timeit
+  from base.curves import lanes as lanes_
+
+  x = random.randrange(p) * random.randrange(p)
+  special = reducer(p)
+  res = {
+    'generic': timeit.timeit(lambda: x % p, number=n) / n,
+    'special': timeit.timeit(lambda: special(x), number=n) / n,
+  }
+  f = lanes_.field(p)
+  a = lanes_.to_limbs([random.randrange(p) for _ in range(lanes)], f.limbs)
+  b = lanes_.to_limbs([random.randrange(p) for _ in range(lanes)], f.limbs)
+  redc = lanes_.Field(p, False)
+  res['lanes redc'] = timeit.timeit(lambda: redc.mul(a, b), number=20) / 20 / lanes
+  if f.fold:
+    res['lanes fold'] = timeit.timeit(lambda: f.mul(a, b), number=20) / 20 / lanes
+  return res
+
+if __name__ == '__main__':
+  for name, p in [('2^255 - 19', 2**255 - 19),
+                  ('P-256', 2**256 - 2**224 + 2**192 + 2**96 - 1),
+                  ('secp256k1', 2**256 - 2**32 - 977),
+                  ('2^521 - 1', 2**521 - 1)]:
+    print('{:10} {}'.format(name, describe(p)))
+    for key, t in benchmark(p).items():
+      print('  {:14} {:8.0f} ns'.format(key, t * 1e9))
@@ -1,8 +1,25 @@
+from collections import OrderedDict
 from gmpy2 import mpz, legendre, powmod, add, invert
 from math import sqrt
-from sympy import mod_inverse
-import numpy as np
-from datetime import datetime
+
+# point at infinity, the neutral element of the group ; it has no
+# affine coordinates, (0,0) is a point of y^2 = x^3 + ax when b = 0
+IDENTITY = (None,None)
+
+# baby step tables of the last BABY_TABLES bases divided by, up to
+# BABY_LIMIT steps each, see baby_steps()
+BABY_TABLES = 8
+BABY_LIMIT = 1 << 20
+
+_BABY = OrderedDict()
+
+# 
+# mod_inverse() :- inverse of x modulo p, from gmpy2 rather than
+# sympy so that importing the module stays cheap
+# 
+
+def mod_inverse(x, p):
+  return int(invert(x, p))
 
 # 
 # tonelli_shanks() :- implementation of Tonelli-Shanks algorithm
@@ -30,7 +47,7 @@ def tonelli_shanks(n, p):
   M = s
   c = pow(z,q,p)
   t = pow(n,q,p)
-  R = pow(n,(q+1)/2,p)
+  R = pow(n,(q+1)//2,p)
   while(True):
     if(t==0):
       return 0
@@ -89,7 +106,7 @@ def generatePoints(a, d, p, start=0):
       if(isResidue(fx, p) or fx == 0):
         # 4k+3 form
         if((p-3)%4 == 0):
-          y = pow(fx, (p+1)/4, p)   #euler's method
+          y = pow(fx, (p+1)//4, p)   #euler's method
         # 4k+1 form
         else:
           y = tonelli_shanks(fx,p)   #Tonneli-Shank's method
@@ -103,30 +120,27 @@ def generatePoints(a, d, p, start=0):
 #
 
 
-def find_points(a, b, p):
+# 
+# count_points() :- counts the affine points of the curve
+# whose x coordinate lies in [start, stop)
+# 
+# every x with a non-zero quadratic residue on the right
+# hand side gives two points (x,y) and (x,p-y), a zero
+# right hand side gives the single point (x,0)
+# 
+
+def count_points(a, b, p, start, stop):
     no_of_points = 0
-    for x in range(p):
-        temp1 = x**3
-        temp2 = x * a
-        temp3 = temp2 + b
-        xx = temp3 + temp1
-        xx %= p
-
-        if xx == 0:
-            y = xx
-            no_of_points += 1
-
-        ret = legendre(xx, p)
-        if ret == 1:
-            temp1 = (p + 1) // 4
-            y = pow(xx, temp1, p)
-            no_of_points += 1
-
-            y = p - y
-            no_of_points += 1
-
-    no_of_points += 1  # Including the point at infinity.
+    for x in range(start, min(stop, p)):
+        xx = (x*x*x + a*x + b) % p
+        no_of_points += 1 + legendre(xx, p)
     return no_of_points
+
+def points_at_infinity(a, b, p):
+    return 1
+
+def find_points(a, b, p):
+    return count_points(a, b, p, 0, p) + points_at_infinity(a, b, p)
 #
 # pow() :- helper function to execute
 # fast exponentiation with modular operation
@@ -150,6 +164,23 @@ def pow(a, b, m):
   else:
     return ((ans*ans)%m*a)%m
 
+# 
+# liftpoint() :- finds a point of the curve with the given
+# x coordinate, returns None when x^3+ax+d is not a square
+# 
+
+def liftpoint(a, d, p, x):
+  fx = (x*x*x + a*x + d) % p
+  if fx == 0:
+    return (x % p, 0)
+  if legendre(fx, p) != 1:
+    return None
+  if (p-3)%4 == 0:
+    y = pow(fx, (p+1)//4, p)
+  else:
+    y = tonelli_shanks(fx, p)
+  return (x % p, y)
+
 # 
 # isResidue() :- helper function to check whether a 
 # given number is a quadratic residue with respect to 
@@ -167,7 +198,7 @@ def pow(a, b, m):
 # 
 
 def isResidue(x, p):
-  return pow(x,(p-1)/2,p) == 1
+  return pow(x,(p-1)//2,p) == 1
 
 # 
 # addpoints() :- function to perform addition operation 
@@ -184,19 +215,21 @@ def isResidue(x, p):
 # this formula is altered for finite field and used here
 # final answer is returned as a tuple of (x3,y3)
 # 
+# IDENTITY stands for the point at infinity, P + (-P) gives
+# IDENTITY and P + P falls back to doublepoint()
+# 
 
 def addpoints(a,d,p,p1,p2):
-  # print(p1)
-  # print(p2)   
+  if p1 == IDENTITY:
+    return p2
+  if p2 == IDENTITY:
+    return p1
+  if (p1[0]-p2[0])%p == 0:
+    if (p1[1]+p2[1])%p == 0:
+      return IDENTITY
+    return doublepoint(a,d,p,p1)
 
   try:
-    # pm = p - p2[1]
-    # if p1[0] == 0 and p1[1] == 0:
-    #   return p2
-    # if p2[0] == 0 and p2[1] == 0:
-    #   return p1
-    # if p1[1] == pm:
-    #   return (0,0)
     gradient = (p2[1]-p1[1])*mod_inverse((p2[0]-p1[0]),p)
     x = (gradient**2-p2[0]-p1[0])%p
     y = (gradient*(p1[0]-x)-p1[1])%p
@@ -220,6 +253,8 @@ def addpoints(a,d,p,p1,p2):
 # 
 
 def substractpoints(a,d,p,p1,p2):
+  if p2 == IDENTITY:
+    return p1
   p3 = (p2[0],-1*p2[1])
   return addpoints(a,d,p,p1,p3)
 
@@ -242,6 +277,8 @@ def substractpoints(a,d,p,p1,p2):
 # 
 
 def doublepoint(a,d,p,p1):
+  if p1 == IDENTITY or p1[1]%p == 0:
+    return IDENTITY
   try:                      
     lam = (3*p1[0]*p1[0]+a)*mod_inverse((2*p1[1]),p)                      
     x = (lam**2-2*p1[0])%p
@@ -264,9 +301,17 @@ def doublepoint(a,d,p,p1):
 # 
 
 def multiplypoint(a,d,p,p1, scalar):
-  pt = (0,1)
+  pt = IDENTITY
 
-  if scalar == 1:
+  if p1 == IDENTITY:
+    return IDENTITY
+  if scalar < 0:
+    p1 = (p1[0],(p-p1[1])%p)
+    scalar = scalar * -1
+
+  if scalar == 0:
+    pt = IDENTITY
+  elif scalar == 1:
     pt = p1
   elif scalar%2 == 1:
     pt = addpoints(a,d,p,p1,multiplypoint(a,d,p,p1,scalar-1))
@@ -275,63 +320,60 @@ def multiplypoint(a,d,p,p1, scalar):
   return pt
 
 
-def bsgs(a,d,p,p1,p2):
-  p1,p2 = p2, p1
-  x_arr, y_arr = generatePoints(a,d,p)
-  # n = len(x_arr) + 1
-  n = find_points(a,d,p)
-  m = sqrt(n)+1
-  m = int(m)
-  count = m
-  mp = multiplypoint(a, d, p, p1, m)
-  # ip = [[mpz(0) for _ in range(3)] for _ in range(m+1)]
-  # jmp = [[mpz(0) for _ in range(3)] for _ in range(m+1)]
-  ip = [[0 for _ in range(3)] for _ in range(count+1)]
-  jmp = [[0 for _ in range(3)] for _ in range(count+1)]
-
-  for i in range(1,count+1):
-        # t3 = mpz(i)
-        pd = multiplypoint(a, d, p, p1, i)
-        ip[i][0], ip[i][1], ip[i][2] = i, pd[0], pd[1]
-
-  for i in range(1,count+1):
-        # t5 = mpz(i)
-        pd = multiplypoint(a, d, p, mp, i)
-        jmp[i][0], jmp[i][1], jmp[i][2] = i, pd[0], pd[1]
-
-  for i in range(1,count+1):
-        if jmp[i][2] != 0: 
-            jmp[i][2] = p - jmp[i][2]
-
-  for i in range(1,count+1):
-        # t5 = jmp[i][1]
-        # t6 = jmp[i][2]
-        ptmp = (jmp[i][1], jmp[i][2])
-        ps = addpoints(a, d, p, p2, ptmp)
-        jmp[i][1] = ps[0]
-        jmp[i][2] = ps[1]
-
-  match, I, J = 0, 0, 0
-  for i in range(1,count+1):
-            # J = 0
-            # I += 1
-            if match == 1:
-                break
-            for j in range(1,count+1):
-                J += 1
-                if ip[i][1] == jmp[j][1]:
-                    if ip[i][2] == jmp[j][2]:
-                        J = j
-                        match = 1
-                        break
-            I += 1
-  
-  if match == 0:
-     return -1
+# 
+# baby_steps() :- ({i*p1: i}, m) for i = 1..m, m at least the one
+# asked for
+# 
+# the table of a base is kept (see BABY_TABLES) and extended when a
+# later division needs more steps, so new targets on the same base
+# only pay for their giant steps
+# 
+
+def baby_steps(a,d,p,p1,m):
+  key = (a % p, d % p, p, p1)
+  entry = _BABY.get(key)
+  if entry is None:
+    entry = [{}, IDENTITY, 0]
   else:
-     k = int(((m*J) + I) % n)
-    #  k = int(n)
-    #  return (k, 0)
-     return k
+    _BABY.move_to_end(key)
+  ip, pd, count = entry
+  for i in range(count+1,m+1):
+    pd = addpoints(a,d,p,pd,p1)
+    if pd not in ip:
+      ip[pd] = i
+  entry[1], entry[2] = pd, max(count, m)
+  if entry[2] <= BABY_LIMIT:
+    _BABY[key] = entry
+    while len(_BABY) > BABY_TABLES:
+      _BABY.popitem(last=False)
+  return ip, entry[2]
 
+# 
+# bsgs() :- baby-step giant-step division, finds k with p1 = k*p2
+# 
+# @n : order of p2 (see group.point_order()), or any multiple of
+# it such as the group order, counted with find_points() when
+# not given; k is returned modulo n
+# 
+# baby steps i*p2 for i = 1..m are kept in a dictionary keyed by
+# the point (see baby_steps()), giant steps p1 - j*m*p2 are looked
+# up in it
+# 
+# returns -1 when p1 is not a multiple of p2
+# time complexity : O(sqrt(n))
+# 
 
+def bsgs(a,d,p,p1,p2,n=None):
+  p1,p2 = p2, p1
+  if n is None:
+    n = find_points(a,d,p)
+  ip, m = baby_steps(a,d,p,p1,int(sqrt(n))+1)
+
+  mp = multiplypoint(a,d,p,p1,m)
+  jmp = IDENTITY if mp == IDENTITY else (mp[0],(p-mp[1])%p)
+  ps = p2
+  for j in range(0,n//m+1):
+    if ps in ip:
+      return int(((m*j) + ip[ps]) % n)
+    ps = addpoints(a,d,p,ps,jmp)
+  return -1
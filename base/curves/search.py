@@ -0,0 +1,235 @@
+import os
+import random
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from math import isqrt
+
+from gmpy2 import is_prime
+
+from base.curves import birational as br
+from base.curves import dispatch, ecm, glv, mov, shards, tables
+
+#
+# Search for curves with good parameters over a fixed p
+#
+# candidate (a, d) of the three models are handed to a process pool
+# in chunks and every curve that meets the constraints is yielded as
+# soon as its chunk is done :
+#
+#   cofactor       : #E = h*q with q prime (1 : prime order), None
+#                    for the smallest the model allows, 1 for short
+#                    Weierstrass and 4 for the others
+#   twist_cofactor : the quadratic twist has order h'*q' with q'
+#                    prime for some h' up to this
+#   embedding      : q does not divide p^k - 1 for k up to this (MOV)
+#   min_cm         : |D| of the CM discriminant at least this
+#
+# the order is counted x by x below COUNT_LIMIT, comes from the CM
+# method for y^2 = x^3 + b (glv.cm_order()) and otherwise from the
+# points it kills in the Hasse interval (hasse_order(), Mestre's
+# baby-step giant-step on the trace, O(p^1/4)) ; anomalous curves
+# (q = p) are never returned
+#
+# candidates are rejected before counting when the parity of #E
+# rules the cofactor out : Montgomery and Edwards curves always have
+# 4 | #E, a Weierstrass curve has an even order exactly when x^3 +
+# ax + b has a root, and the costlier twist, MOV and CM checks only
+# run on the curves that passed the order
+#
+
+COUNT_LIMIT = 1 << 14
+# random points used to pin the order down among the Hasse candidates
+POINTS = 20
+CHUNK = 16
+
+#
+# valid() :- whether (a, d) is a non singular curve of the model
+#
+
+def valid(opt, a, d, p):
+  a, d = a % p, d % p
+  if opt == '1':
+    return a != 0 and d != 0 and a != d
+  if opt == '2':
+    return (4*a*a*a + 27*d*d) % p != 0
+  return d != 0 and (a*a - 4) % p != 0
+
+#
+# killing() :- every N = p + 1 - t, |t| <= w, with N*P = O, None when
+# P has a small order (two baby steps share their x)
+#
+# tP = (p + 1)P is solved for t = s*i + r, s = 2m + 1, |r| <= m, the
+# baby steps jP (j <= m) keyed by x match rP for both signs of r
+#
+
+def killing(a, b, p, P, w):
+  m = isqrt(w) + 1
+  baby, pt = {}, None
+  for j in range(1, m + 1):
+    pt = tables.w_add(a, p, pt, P)
+    if pt is None or pt[0] in baby:
+      return None
+    baby[pt[0]] = (j, pt[1])
+  s = 2*m + 1
+  steps = w // s + 1
+  R = tables.w_add(a, p, tables.w_mul(a, p, P, p + 1), tables.w_mul(a, p, P, s*steps))
+  back = tables.w_neg(p, tables.w_mul(a, p, P, s))
+  res = []
+  for i in range(-steps, steps + 1):
+    if R is None:
+      r = 0
+    elif R[0] in baby:
+      j, y = baby[R[0]]
+      r = j if y == R[1] else -j
+    else:
+      r = None
+    if r is not None and abs(s*i + r) <= w:
+      res.append(p + 1 - (s*i + r))
+    R = tables.w_add(a, p, R, back)
+  return res
+
+#
+# hasse_order() :- #E of y^2 = x^3 + ax + b, the one N of the Hasse
+# interval that kills POINTS random points, None when undecided
+#
+
+def hasse_order(a, b, p, rng, points=POINTS):
+  w = 2*isqrt(p) + 2
+  candidates = None
+  for _ in range(points):
+    P = tables.w_random(a, b, p, rng)
+    if candidates is None:
+      candidates = killing(a, b, p, P, w)
+    else:
+      candidates = [n for n in candidates if tables.w_mul(a, p, P, n) is None]
+    if candidates is not None and len(candidates) <= 1:
+      # a single candidate is confirmed by the points left
+      if candidates and all(tables.w_mul(a, p, tables.w_random(a, b, p, rng), candidates[0]) is None for _ in range(3)):
+        return candidates[0]
+      return None
+  return None
+
+def order(opt, a, d, p, rng):
+  wa, wb = dispatch.to_weierstrass(opt, a, d, p)
+  if p < COUNT_LIMIT:
+    return shards.count_range('2', wa, wb, p, 0, p) + 1
+  if wa == 0 and p % 3 == 1:
+    n = glv.cm_order(wb, p)
+    if n is not None:
+      return n
+  return hasse_order(wa, wb, p, rng)
+
+#
+# cm_discriminant() :- fundamental discriminant D of t^2 - 4p = Dv^2
+#
+
+def cm_discriminant(p, t):
+  s = 1
+  for q, e in ecm.factorise(4*p - t*t, jobs=1):
+    if e % 2:
+      s *= q
+  return -s if -s % 4 == 1 else -4*s
+
+def twist_secure(n, p, h):
+  twist = 2*p + 2 - n
+  return any(twist % c == 0 and is_prime(twist // c) for c in range(1, h + 1))
+
+#
+# evaluate() :- the facts of the curve as a dict when it meets the
+# constraints, None otherwise
+#
+
+def evaluate(opt, a, d, p, rng, cofactor=None, twist_cofactor=None, embedding=None, min_cm=None):
+  if not valid(opt, a, d, p):
+    return None
+  if cofactor is None:
+    cofactor = 1 if opt == '2' else 4
+  if opt != '2':
+    if cofactor % 4:
+      return None
+  elif cofactor % 2 and br.cubic_roots(a % p, d % p, p):
+    return None
+  n = order(opt, a, d, p, rng)
+  if n is None or n % cofactor or not is_prime(n // cofactor):
+    return None
+  q = n // cofactor
+  if q == p:
+    return None
+  if twist_cofactor is not None and not twist_secure(n, p, twist_cofactor):
+    return None
+  if embedding is not None and mov.embedding_degree(q, p, embedding) is not None:
+    return None
+  res = {'opt': opt, 'a': a, 'd': d, 'p': p, 'order': n, 'cofactor': cofactor, 'subgroup_order': q,
+         'twist_order': 2*p + 2 - n, 'trace': p + 1 - n}
+  if min_cm is not None:
+    D = cm_discriminant(p, p + 1 - n)
+    if abs(D) < min_cm:
+      return None
+    res['cm_discriminant'] = D
+  return res
+
+def evaluate_chunk(p, chunk, seed, constraints):
+  rng = random.Random(seed)
+  found = []
+  for opt, a, d in chunk:
+    res = evaluate(opt, a, d, p, rng, **constraints)
+    if res is not None:
+      found.append(res)
+  return found
+
+def candidates(models, a_range, d_range):
+  for opt in models:
+    for a in a_range:
+      for d in d_range:
+        yield opt, a, d
+
+def chunks(items, size):
+  chunk = []
+  for item in items:
+    chunk.append(item)
+    if len(chunk) == size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+#
+# search() :- yields the dict of every curve over p with (a, d) in
+# @a_range x @d_range that meets the constraints, in the order the
+# chunks finish, at most @limit of them
+#
+# @jobs : worker processes, None for os.cpu_count(), 1 runs inline ;
+# at most 4 chunks per worker are queued at a time, the rest are
+# never started once @limit is reached
+#
+
+def search(p, models=('1', '2', '3'), a_range=range(1, 100), d_range=range(1, 100), jobs=None,
+           limit=None, seed=0, **constraints):
+  jobs = jobs or os.cpu_count() or 1
+  tasks = enumerate(chunks(candidates(models, a_range, d_range), CHUNK))
+  found = 0
+  if jobs == 1:
+    for i, chunk in tasks:
+      for res in evaluate_chunk(p, chunk, seed + i, constraints):
+        yield res
+        found += 1
+        if found == limit:
+          return
+    return
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    pending = set()
+    while True:
+      for i, chunk in tasks:
+        pending.add(pool.submit(evaluate_chunk, p, chunk, seed + i, constraints))
+        if len(pending) >= 4*jobs:
+          break
+      if not pending:
+        return
+      done, pending = wait(pending, return_when=FIRST_COMPLETED)
+      for future in done:
+        for res in future.result():
+          yield res
+          found += 1
+          if found == limit:
+            for f in pending:
+              f.cancel()
+            return
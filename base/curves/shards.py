@@ -0,0 +1,203 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from gmpy2 import mpz, legendre, invert
+
+from base.curves.birational import sqrt_mod
+
+#
+# Sharded point counting and enumeration
+#
+# the x range [0, p) is cut into blocks of @block x values, runs of
+# blocks (shards) are handed to a ProcessPoolExecutor and the per
+# block counts, or per shard point files, are merged in x order
+#
+# @checkpoint : json file recording the finished shards, a run that
+# is interrupted and started again with the same file only does the
+# shards that are missing
+#
+# @jobs : worker processes, None for os.cpu_count(), 1 runs inline
+#
+# the workers use gmpy2 integers and legendre(), and never invert
+# per x value : (u/v / p) = (u*v / p) for the legendre symbol
+#
+
+# shards do not depend on the number of jobs, so a checkpoint can be
+# resumed with a different --jobs
+SHARDS = 256
+
+#
+# rhs() :- numerator and denominator of y^2 for the model @opt
+# ('1' Twisted Edwards, '2' Short Weierstrass, '3' Montgomery)
+#
+
+def rhs(opt, a, d, x):
+  if opt == '1':
+    xx = x*x
+    return a*xx - 1, d*xx - 1
+  if opt == '2':
+    return x*x*x + a*x + d, 1
+  return x*x*x + a*x*x + x, d
+
+#
+# count_range() :- affine points with x in [start, stop)
+#
+
+def count_range(opt, a, d, p, start, stop):
+  a, d, p = mpz(a), mpz(d), mpz(p)
+  total = 0
+  for x in range(start, min(stop, p)):
+    num, den = rhs(opt, a, d, mpz(x))
+    num, den = num % p, den % p
+    if den == 0:
+      continue
+    total += 1 + legendre(num*den, p)
+  return int(total)
+
+def count_shard(opt, a, d, p, start, stop, block):
+  return [count_range(opt, a, d, p, s, min(s + block, stop)) for s in range(start, stop, block)]
+
+#
+# points_range() :- the affine points with x in [start, stop), as
+# generatePoints() lists them
+#
+
+def points_range(opt, a, d, p, start, stop):
+  a, d, p = mpz(a), mpz(d), mpz(p)
+  for x in range(start, min(stop, p)):
+    num, den = rhs(opt, a, d, mpz(x))
+    num, den = num % p, den % p
+    if den == 0:
+      continue
+    fx = num * invert(den, p) % p
+    if fx == 0:
+      yield (x, 0)
+    elif legendre(fx, p) == 1:
+      y = sqrt_mod(int(fx), int(p))
+      yield (x, y)
+      yield (x, int(p) - y)
+
+#
+# locate() :- (x, k) with the point @skip points past the first one
+# with x >= @start being the k-th (from 0) of x, None when there are
+# not that many ; counts only, no square roots
+#
+
+def locate(opt, a, d, p, start, skip):
+  a, d, p = mpz(a), mpz(d), mpz(p)
+  for x in range(start, p):
+    num, den = rhs(opt, a, d, mpz(x))
+    num, den = num % p, den % p
+    if den == 0:
+      continue
+    n = 1 + legendre(num*den, p)
+    if skip < n:
+      return x, skip
+    skip -= n
+  return None
+
+def write_shard(opt, a, d, p, start, stop, path):
+  count = 0
+  tmp = path + '.tmp'
+  with open(tmp, 'w') as f:
+    for x, y in points_range(opt, a, d, p, start, stop):
+      f.write('{} {}\n'.format(x, y))
+      count += 1
+  os.replace(tmp, path)
+  return count
+
+#
+# shards() :- (index, start, stop) of every shard, each shard being
+# a whole number of blocks
+#
+
+def shards(p, block):
+  blocks = -(-p // block)
+  step = max(1, -(-blocks // SHARDS)) * block
+  return [(i, start, min(start + step, p)) for i, start in enumerate(range(0, p, step))]
+
+def load_checkpoint(path, key):
+  if path and os.path.exists(path):
+    with open(path) as f:
+      state = json.load(f)
+    if state.get('key') == key:
+      return state
+  return {'key': key, 'done': {}}
+
+def save_checkpoint(path, state):
+  if path:
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+      json.dump(state, f)
+    os.replace(tmp, path)
+
+def run(tasks, worker, jobs, state, checkpoint):
+  pending = [t for t in tasks if str(t[0]) not in state['done']]
+  if jobs == 1:
+    for t in pending:
+      state['done'][str(t[0])] = worker(*t[1:])
+      save_checkpoint(checkpoint, state)
+    return state['done']
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    futures = {pool.submit(worker, *t[1:]): t[0] for t in pending}
+    for future in as_completed(futures):
+      state['done'][str(futures[future])] = future.result()
+      save_checkpoint(checkpoint, state)
+  return state['done']
+
+#
+# count_blocks() :- affine point count of every block of @block x
+# values, in x order
+#
+
+def count_blocks(opt, a, d, p, block, jobs=None, checkpoint=None):
+  jobs = jobs or os.cpu_count() or 1
+  key = 'count:{}:{}:{}:{}:{}'.format(opt, a, d, p, block)
+  state = load_checkpoint(checkpoint, key)
+  tasks = [(i, opt, a, d, p, start, stop, block) for i, start, stop in shards(p, block)]
+  done = run(tasks, count_shard, jobs, state, checkpoint)
+  counts = []
+  for i, _, _ in shards(p, block):
+    counts.extend(done[str(i)])
+  return counts
+
+#
+# count_listed() :- {index: affine point count} of the blocks of
+# @block x values numbered @indices
+#
+
+def count_listed(opt, a, d, p, block, indices, jobs=None):
+  jobs = jobs or os.cpu_count() or 1
+  tasks = [(i, opt, a, d, p, i*block, min((i + 1)*block, p), block) for i in indices]
+  done = run(tasks, count_shard, jobs, {'done': {}}, None)
+  return {i: done[str(i)][0] for i in indices}
+
+def count(opt, a, d, p, jobs=None, checkpoint=None, block=10**5):
+  return sum(count_blocks(opt, a, d, p, block, jobs, checkpoint))
+
+#
+# enumerate_points() :- writes every affine point to @directory as
+# one "x y" file per shard, then merges them into points.txt
+#
+# returns (path of points.txt, number of points)
+#
+
+def enumerate_points(opt, a, d, p, directory, jobs=None, block=10**5):
+  jobs = jobs or os.cpu_count() or 1
+  os.makedirs(directory, exist_ok=True)
+  checkpoint = os.path.join(directory, 'checkpoint.json')
+  key = 'points:{}:{}:{}:{}:{}'.format(opt, a, d, p, block)
+  state = load_checkpoint(checkpoint, key)
+  parts = shards(p, block)
+  tasks = [(i, opt, a, d, p, start, stop, os.path.join(directory, 'shard-{:06d}.txt'.format(i))) for i, start, stop in parts]
+  done = run(tasks, write_shard, jobs, state, checkpoint)
+
+  path = os.path.join(directory, 'points.txt')
+  with open(path + '.tmp', 'w') as out:
+    for task in tasks:
+      with open(task[-1]) as f:
+        for line in f:
+          out.write(line)
+  os.replace(path + '.tmp', path)
+  return path, sum(done[str(i)] for i, _, _ in parts)
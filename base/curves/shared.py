@@ -0,0 +1,203 @@
+import atexit
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import tempfile
+from functools import lru_cache
+from multiprocessing import resource_tracker, shared_memory
+
+#
+# Read-only NumPy arrays shared between processes
+#
+# a precomputation (the group tables of tables.py) is published once
+# into a multiprocessing.shared_memory segment named after its key,
+# and every other worker process attaches to the segment instead of
+# building its own copy, the arrays it gets are zero copy views of
+# the segment with the writeable flag off
+#
+# a segment is a little endian 8 byte header length, the header
+# (JSON : the caller's metadata and the dtype, shape and offset of
+# every array) and the arrays, each ALIGN aligned ; the header
+# length is written last, so a segment still being filled reads as
+# absent
+#
+# the process that created a segment unlinks it when it releases it
+# (tables.py evicting it) or exits, the processes attached to it keep
+# their mapping until they release it themselves, a later lookup
+# elsewhere builds and publishes the table again
+#
+# arrays built in a parent process before fork (tables.preload())
+# are shared with the children as they are, copy on write pages that
+# are never written
+#
+# segment names are an HMAC of the key under a per deployment secret
+# (TEDWARDS_SHM_SECRET, or a random one kept in a file only this user
+# can read), so another local user cannot predict a name and create
+# the segment first ; a segment attached to must also carry the key
+# in its header and hold every array it lists, anything else is
+# ignored as absent
+#
+
+PREFIX = 'tedwards-'
+ALIGN = 64
+
+# name -> (SharedMemory, pid of the process that created it)
+_OWNED = {}
+# name -> SharedMemory attached to
+_ATTACHED = {}
+
+
+#
+# secret() :- the per deployment secret of the segment names, every
+# process of the same user on the machine reads the same one
+#
+
+@lru_cache(maxsize=None)
+def secret():
+  value = os.environ.get('TEDWARDS_SHM_SECRET')
+  if value:
+    return value.encode()
+  uid = os.getuid() if hasattr(os, 'getuid') else 0
+  directory = os.path.join(tempfile.gettempdir(), 'tedwards-{}'.format(uid))
+  try:
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.stat(directory)
+    if hasattr(os, 'getuid') and (st.st_uid != uid or st.st_mode & 0o077):
+      raise PermissionError(directory)
+    path = os.path.join(directory, 'shm.key')
+    if not os.path.exists(path):
+      # written aside and linked in, a reader never sees half a key
+      tmp = '{}.{}'.format(path, os.getpid())
+      fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+      with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(32))
+      try:
+        os.link(tmp, path)
+      except FileExistsError:
+        pass
+      finally:
+        os.unlink(tmp)
+    with open(path) as f:
+      return f.read().encode()
+  except OSError:
+    # a directory someone else made : the segments are only shared
+    # with the processes forked from this one
+    return secrets.token_hex(32).encode()
+
+def segment_name(key):
+  return PREFIX + hmac.new(secret(), repr(key).encode(), hashlib.sha256).hexdigest()[:20]
+
+def align(n):
+  return -(-n // ALIGN) * ALIGN
+
+#
+# views() :- (meta, arrays) of the segment of @key, None when it is
+# not complete or not a segment of @key
+#
+
+def views(shm, key):
+  import numpy as np
+
+  size = int.from_bytes(shm.buf[:8], 'little')
+  if size == 0 or 8 + size > shm.size:
+    return None
+  try:
+    header = json.loads(bytes(shm.buf[8:8 + size]))
+    if header.get('key') != repr(key):
+      return None
+    start = align(8 + size)
+    arrays = {}
+    for name, dtype, shape, offset in header['arrays']:
+      dtype, shape = np.dtype(dtype), tuple(shape)
+      if offset < 0 or start + offset + dtype.itemsize * int(np.prod(shape)) > shm.size:
+        return None
+      arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start + offset)
+      arr.flags.writeable = False
+      arrays[name] = arr
+    return header['meta'], arrays
+  except (ValueError, TypeError, KeyError, AttributeError):
+    return None
+
+#
+# publish() :- (meta, arrays) with the arrays moved into the segment
+# of @key, the segment of another process when it got there first,
+# None when shared memory is not available
+#
+
+def publish(key, meta, arrays):
+  import numpy as np
+
+  name = segment_name(key)
+  layout, size = [], 0
+  for array_name, arr in arrays.items():
+    size = align(size)
+    layout.append([array_name, arr.dtype.str, list(arr.shape), size])
+    size += arr.nbytes
+  header = json.dumps({'key': repr(key), 'meta': meta, 'arrays': layout}).encode()
+  start = align(8 + len(header))
+
+  try:
+    shm = shared_memory.SharedMemory(name=name, create=True, size=max(1, start + size))
+  except FileExistsError:
+    return attach(key)
+  except OSError:
+    return None
+  for (array_name, _, _, offset), arr in zip(layout, arrays.values()):
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf, offset=start + offset)[...] = arr
+  shm.buf[8:8 + len(header)] = header
+  shm.buf[:8] = len(header).to_bytes(8, 'little')
+  _OWNED[name] = (shm, os.getpid())
+  return views(shm, key)
+
+#
+# attach() :- (meta, arrays) of the segment of @key, None when there
+# is none (or it is not complete yet)
+#
+
+def attach(key):
+  name = segment_name(key)
+  try:
+    shm = shared_memory.SharedMemory(name=name)
+  except (FileNotFoundError, OSError):
+    return None
+  # the segment belongs to the process that created it, the resource
+  # tracker would unlink it when this one exits
+  resource_tracker.unregister(shm._name, 'shared_memory')
+  found = views(shm, key)
+  if found is None:
+    shm.close()
+    return None
+  _ATTACHED[name] = shm
+  return found
+
+#
+# release() :- drop this process's use of the segment of @key, the
+# mapping goes once the last view of it is gone
+#
+
+def release(key):
+  name = segment_name(key)
+  shm = _ATTACHED.pop(name, None)
+  owned = _OWNED.pop(name, None)
+  if owned is not None:
+    shm, pid = owned
+    if pid == os.getpid():
+      shm.unlink()
+  if shm is not None:
+    try:
+      shm.close()
+    except BufferError:
+      # views still in use, the mapping is freed with them
+      pass
+
+@atexit.register
+def release_all():
+  for name, (shm, pid) in list(_OWNED.items()):
+    if pid == os.getpid():
+      try:
+        shm.unlink()
+      except FileNotFoundError:
+        pass
+  _OWNED.clear()
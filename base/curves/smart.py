@@ -0,0 +1,141 @@
+import random
+from functools import lru_cache
+
+from gmpy2 import invert, legendre
+
+from base.curves import birational as br
+from base.curves import tables
+
+#
+# Smart's attack on anomalous curves, #E(F_p) = p
+#
+# P and Q = kP on y^2 = x^3 + ax + b are lifted to a curve over
+# Z/p^2 reducing to it (Hensel, y + tp with 2yt = (x^3 + ax + b -
+# y^2)/p mod p), then p*P~ and p*Q~ reduce to the point at infinity,
+# they lie in the kernel of reduction where the p-adic elliptic log
+# is z = -x/y to first order, and
+#
+#   k = z(pQ~) / z(pP~)  (mod p)
+#
+# since z(pQ~) = k z(pP~) up to p^2 and both are multiples of p
+#
+# points of the lift are kept in Jacobian coordinates (X : Y : Z),
+# x = X/Z^2, y = Y/Z^3, so nothing is divided by the multiple of p
+# that the last addition leaves in Z, and z = -XZ/Y
+#
+# a lift which is the canonical one gives z(pP~) = 0 mod p^2 and
+# the attack nothing, a, b are lifted with random multiples of p so
+# another lift is tried then
+#
+
+#
+# is_anomalous() :- whether #E(F_p) = p
+#
+# for p > 5 the Hasse bound keeps #E below 2p, so a point P != O
+# with pP = O has order p and the group is exactly <P>, while on an
+# anomalous curve every point has pP = O : one point decides
+#
+
+@lru_cache(maxsize=256)
+def is_anomalous(a, b, p):
+  if p < 7 or (4*a*a*a + 27*b*b) % p == 0:
+    return False
+  rng = random.Random(p)
+  while True:
+    x = rng.randrange(p)
+    f = (x*x*x + a*x + b) % p
+    if f and legendre(f, p) == 1:
+      return tables.w_mul(a, p, (x, br.sqrt_mod(f, p)), p) is None
+
+#
+# Jacobian arithmetic on y^2 = x^3 + ax + b modulo m, None for the
+# point at infinity
+#
+
+def jdouble(a, m, P):
+  if P is None:
+    return None
+  X, Y, Z = P
+  if Y % m == 0:
+    return None
+  YY = Y*Y % m
+  S = 4*X*YY % m
+  ZZ = Z*Z % m
+  M = (3*X*X + a*ZZ*ZZ) % m
+  X3 = (M*M - 2*S) % m
+  return (X3, (M*(S - X3) - 8*YY*YY) % m, 2*Y*Z % m)
+
+def jadd(a, m, P, Q):
+  if P is None:
+    return Q
+  if Q is None:
+    return P
+  (X1, Y1, Z1), (X2, Y2, Z2) = P, Q
+  Z1Z1, Z2Z2 = Z1*Z1 % m, Z2*Z2 % m
+  U1, U2 = X1*Z2Z2 % m, X2*Z1Z1 % m
+  S1, S2 = Y1*Z2*Z2Z2 % m, Y2*Z1*Z1Z1 % m
+  H, R = (U2 - U1) % m, (S2 - S1) % m
+  if H == 0:
+    return jdouble(a, m, P) if R == 0 else None
+  HH = H*H % m
+  HHH = H*HH % m
+  V = U1*HH % m
+  X3 = (R*R - HHH - 2*V) % m
+  return (X3, (R*(V - X3) - S1*HHH) % m, H*Z1*Z2 % m)
+
+def jmul(a, m, P, k):
+  res = None
+  for bit in bin(k)[2:]:
+    res = jdouble(a, m, res)
+    if bit == '1':
+      res = jadd(a, m, res, P)
+  return res
+
+#
+# lift() :- (x, y, 1) on y^2 = x^3 + ax + b over Z/p^2 above the
+# point (x, y) of the curve mod p
+#
+
+def lift(a, b, p, pt):
+  x, y = pt
+  m = p*p
+  t = (x*x*x + a*x + b - y*y) % m // p * invert(2*y, p) % p
+  return (x, (y + t*p) % m, 1)
+
+#
+# elliptic_log() :- z(pP~)/p mod p for P~ on the lifted curve, None
+# when pP~ does not reduce to the point at infinity
+#
+
+def elliptic_log(a, p, P):
+  m = p*p
+  R = jmul(a, m, P, p)
+  if R is None:
+    return 0
+  X, Y, Z = R
+  if Z % p or Y % p == 0:
+    return None
+  return int(-X*Z * invert(Y, m) % m // p)
+
+#
+# solve() :- k mod p with Q = kP on an anomalous curve, None when it
+# fails (the answer is checked)
+#
+
+def solve(a, b, p, P, Q, tries=5):
+  identity = br.WEIERSTRASS_IDENTITY
+  if Q == identity:
+    return 0
+  if P == identity or P[1] % p == 0 or Q[1] % p == 0:
+    return None
+  rng = random.Random(p)
+  for _ in range(tries):
+    a2, b2 = a + p*rng.randrange(1, p), b + p*rng.randrange(p)
+    zp = elliptic_log(a2, p, lift(a2, b2, p, P))
+    zq = elliptic_log(a2, p, lift(a2, b2, p, Q))
+    if not zp or zq is None:
+      continue
+    k = zq * int(invert(zp, p)) % p
+    if tables.w_mul(a, p, P, k) == (Q[0] % p, Q[1] % p):
+      return k
+  return None
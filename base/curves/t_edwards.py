@@ -1,6 +1,15 @@
-from sympy import mod_inverse
-import numpy as np
-from datetime import datetime
+from gmpy2 import legendre, invert
+
+# neutral element of the group
+IDENTITY = (0,1)
+
+# 
+# mod_inverse() :- inverse of x modulo p, from gmpy2 rather than
+# sympy so that importing the module stays cheap
+# 
+
+def mod_inverse(x, p):
+  return int(invert(x, p))
 
 # 
 # tonelli_shanks() :- implementation of Tonelli-Shanks algorithm
@@ -28,7 +37,7 @@ def tonelli_shanks(n, p):
   M = s
   c = pow(z,q,p)
   t = pow(n,q,p)
-  R = pow(n,(q+1)/2,p)
+  R = pow(n,(q+1)//2,p)
   while(True):
     if(t==0):
       return 0
@@ -84,10 +93,16 @@ def generatePoints(a, d, p, start=0):
   # take at max 1000 points
   for x in range(start, min(start+1000, p)):
       fx = ((a*x*x-1)*pow(d*x*x-1,p-2,p))%p   #finding values of y^2 mod p for every integer value of x in range
-      if(isResidue(fx, p)):
+      if (d*x*x-1)%p == 0:
+        continue
+      if fx == 0:
+        # a single point (x,0), as count_points() counts it
+        x_array.append(x)
+        y_array.append(0)
+      elif(isResidue(fx, p)):
         # 4k+3 form
         if((p-3)%4 == 0):
-          y = pow(fx, (p+1)/4, p)   #euler's method
+          y = pow(fx, (p+1)//4, p)   #euler's method
         # 4k+1 form
         else:
           y = tonelli_shanks(fx,p)   #Tonneli-Shank's method
@@ -98,6 +113,61 @@ def generatePoints(a, d, p, start=0):
         y_array.append(p-y)
   return (x_array,y_array)
 
+# 
+# count_points() :- counts the affine points of the curve
+# whose x coordinate lies in [start, stop)
+# 
+# x values with d*x^2 = 1 have no point, a zero right hand
+# side gives the single point (x,0), every other quadratic
+# residue gives (x,y) and (x,p-y)
+# 
+
+def count_points(a, d, p, start, stop):
+  no_of_points = 0
+  for x in range(start, min(stop, p)):
+    den = (d*x*x-1)%p
+    if den == 0:
+      continue
+    fx = ((a*x*x-1)*pow(den,p-2,p))%p
+    no_of_points += 1 + legendre(fx, p)
+  return no_of_points
+
+# 
+# find_points() :- order of the group of the curve
+# 
+# the affine points are not the whole group when a or d is
+# not a square, the desingularised curve has 1+(ad/p) + 1+(d/p)
+# more points at infinity ((./p) being the legendre symbol),
+# they match the v = 0 and u = -1 points of the birationally
+# equivalent Montgomery curve
+# 
+
+def points_at_infinity(a, d, p):
+  return 2 + legendre(a*d, p) + legendre(d, p)
+
+def find_points(a, d, p):
+  return count_points(a, d, p, 0, p) + points_at_infinity(a, d, p)
+
+# 
+# liftpoint() :- finds a point of the curve with the given
+# x coordinate, returns None when there is none
+# 
+
+def liftpoint(a, d, p, x):
+  den = (d*x*x-1)%p
+  if den == 0:
+    return None
+  fx = ((a*x*x-1)*pow(den,p-2,p))%p
+  if fx == 0:
+    return (x % p, 0)
+  if legendre(fx, p) != 1:
+    return None
+  if (p-3)%4 == 0:
+    y = pow(fx, (p+1)//4, p)
+  else:
+    y = tonelli_shanks(fx, p)
+  return (x % p, y)
+
 #
 # pow() :- helper function to execute
 # fast exponentiation with modular operation
@@ -138,7 +208,7 @@ def pow(a, b, m):
 # 
 
 def isResidue(x, p):
-  return pow(x,(p-1)/2,p) == 1
+  return pow(x,(p-1)//2,p) == 1
 
 # 
 # addpoints() :- function to perform addition operation 
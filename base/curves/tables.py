@@ -0,0 +1,356 @@
+import random
+from collections import OrderedDict
+from math import gcd
+
+from gmpy2 import invert, legendre
+
+from base.curves import birational as br
+from base.curves import dispatch, shards
+
+#
+# Full group tables for tiny fields
+#
+# for p < LIMIT the whole group is enumerated once and written as
+# Z/n1 x Z/n2 (n2 | n1) with generators P, Q : the point iP + jQ
+# gets the index i + n1*j, so adding, negating and multiplying
+# points is arithmetic on (i, j) and a table read, and for a cyclic
+# group (n2 = 1) the index of a point is its discrete log to P
+#
+# the group is built in the short Weierstrass model, with None for
+# the point at infinity (so that a genuine (0, 0) on y^2 = x^3 + ax
+# is not mistaken for it), and every point of the user's model is
+# mapped into it to find its index
+#
+# storage is NumPy int32 : xs[i], ys[i] the point of index i in the
+# user's model (-1 for the points at infinity of an Edwards curve,
+# which have no affine image there), slots[2x + (y > p/2)] the
+# index of (x, y), about 4p + 8n bytes per curve
+#
+# lookup() builds tables on first use and keeps the MAX_TABLES
+# most recently used ones, dispatch.py asks it before running the
+# general formulas ; a table built by one process is published in
+# shared memory (see shared.py) and the other worker processes attach
+# to it rather than building their own, preload() builds tables in a
+# parent process before it forks its workers
+#
+
+LIMIT = 1 << 16
+MAX_TABLES = 16
+
+_REGISTRY = OrderedDict()
+
+#
+# Weierstrass arithmetic on y^2 = x^3 + ax + b, None the identity
+#
+
+def w_add(a, p, p1, p2):
+  if p1 is None:
+    return p2
+  if p2 is None:
+    return p1
+  x1, y1 = p1
+  x2, y2 = p2
+  if x1 == x2:
+    if (y1 + y2) % p == 0:
+      return None
+    lam = (3*x1*x1 + a) * invert(2*y1, p) % p
+  else:
+    lam = (y2 - y1) * invert(x2 - x1, p) % p
+  x3 = (lam*lam - x1 - x2) % p
+  return (int(x3), int((lam*(x1 - x3) - y1) % p))
+
+def w_neg(p, pt):
+  return None if pt is None else (pt[0], (p - pt[1]) % p)
+
+def w_mul(a, p, pt, k):
+  res = None
+  while k:
+    if k & 1:
+      res = w_add(a, p, res, pt)
+    pt = w_add(a, p, pt, pt)
+    k >>= 1
+  return res
+
+def w_random(a, b, p, rng):
+  while True:
+    x = rng.randrange(p)
+    f = (x*x*x + a*x + b) % p
+    if f == 0:
+      return (x, 0)
+    if legendre(f, p) == 1:
+      return (x, br.sqrt_mod(f, p))
+
+#
+# factor() :- [(prime, exponent), ...] of a small n by trial division
+#
+
+def factor(n):
+  res, q = [], 2
+  while q*q <= n:
+    e = 0
+    while n % q == 0:
+      n //= q
+      e += 1
+    if e:
+      res.append((q, e))
+    q += 1
+  if n > 1:
+    res.append((n, 1))
+  return res
+
+def w_order(a, p, pt, n, factors):
+  m = n
+  for q, e in factors:
+    m //= q**e
+    r = w_mul(a, p, pt, m)
+    while r is not None:
+      r = w_mul(a, p, r, q)
+      m *= q
+  return m
+
+#
+# structure() :- (n1, n2, P, Q) with the group Z/n1 x Z/n2 generated
+# by P of order n1 and Q of order n2, Q None when the group is cyclic
+#
+# P is a point of the largest order n1 (the exponent of the group),
+# G/<P> is then cyclic of order n2 and an R of that order in it has
+# n2*R = tP with n2 | t, so that Q = R - (t/n2)P has order n2 and
+# <P> and <Q> only meet in the identity
+#
+
+def structure(a, b, p, n, rng, tries=200):
+  factors = factor(n)
+  for _ in range(tries):
+    P = w_random(a, b, p, rng)
+    n1 = w_order(a, p, P, n, factors)
+    n2 = n // n1
+    if n2 == 1:
+      return n1, 1, P, None
+    # n2 divides both n1 and p - 1 for the exponent
+    if n1 % n2 or (p - 1) % n2:
+      continue
+    cycle, pt = {}, None
+    for i in range(n1):
+      cycle[pt] = i
+      pt = w_add(a, p, pt, P)
+    for _ in range(tries):
+      R = w_random(a, b, p, rng)
+      S, m = R, 1
+      while S not in cycle and m < n2:
+        S, m = w_add(a, p, S, R), m + 1
+      t = cycle.get(S)
+      if m == n2 and t is not None and t % n2 == 0:
+        return n1, n2, P, w_add(a, p, R, w_neg(p, w_mul(a, p, P, t // n2)))
+  return None
+
+#
+# Table :- the indexed group of one curve, see the note at the top
+# of the file, methods return None for a point which is not on the
+# curve or a result without an image in the user's model
+#
+
+class Table:
+  def __init__(self, opt, a, d, p, n1, n2, xs, ys, slots, identity):
+    self.opt, self.a, self.d, self.p = opt, a, d, p
+    self.n1, self.n2, self.n = n1, n2, n1 * n2
+    self.xs, self.ys, self.slots = xs, ys, slots
+    self.identity = identity
+
+  def index(self, pt):
+    p = self.p
+    if pt == dispatch.MODULES[self.opt].IDENTITY:
+      return self.identity
+    x, y = pt[0] % p, pt[1] % p
+    i = int(self.slots[2*x + (y > p // 2)])
+    if i < 0 or int(self.ys[i]) != y or int(self.xs[i]) != x:
+      return None
+    return i
+
+  def point(self, i):
+    if i == self.identity:
+      return dispatch.MODULES[self.opt].IDENTITY
+    x = int(self.xs[i])
+    return None if x < 0 else (x, int(self.ys[i]))
+
+  def coords(self, i):
+    return i % self.n1, i // self.n1
+
+  def from_coords(self, i, j):
+    return i % self.n1 + self.n1 * (j % self.n2)
+
+  def add(self, p1, p2):
+    i1, i2 = self.index(p1), self.index(p2)
+    if i1 is None or i2 is None:
+      return None
+    (a1, b1), (a2, b2) = self.coords(i1), self.coords(i2)
+    return self.point(self.from_coords(a1 + a2, b1 + b2))
+
+  def negate(self, pt):
+    return self.multiply(pt, -1)
+
+  def multiply(self, pt, k):
+    i = self.index(pt)
+    if i is None:
+      return None
+    a1, b1 = self.coords(i)
+    return self.point(self.from_coords(k * a1, k * b1))
+
+  def order(self, pt):
+    i = self.index(pt)
+    if i is None:
+      return None
+    a1, b1 = self.coords(i)
+    o1, o2 = self.n1 // gcd(a1, self.n1), self.n2 // gcd(b1, self.n2)
+    return o1 * o2 // gcd(o1, o2)
+
+  #
+  # log() :- k with p1 = k*p2, the smallest such k >= 0 (so k is
+  # below the order of p2), -1 when there is none
+  #
+  # k*(i2, j2) = (i1, j1) is one linear congruence per coordinate,
+  # solved on their own and joined by the Chinese remainder theorem
+  #
+
+  def log(self, p1, p2):
+    i1, i2 = self.index(p1), self.index(p2)
+    if i1 is None or i2 is None:
+      return None
+    (a1, b1), (a2, b2) = self.coords(i1), self.coords(i2)
+    r1 = congruence(a2, a1, self.n1)
+    r2 = congruence(b2, b1, self.n2)
+    if r1 is None or r2 is None:
+      return -1
+    res = crt(r1, r2)
+    return -1 if res is None else res[0]
+
+#
+# congruence() :- (k, m) with a*k = b (mod n) exactly when k = k0
+# (mod m), None when it has no solution
+#
+
+def congruence(a, b, n):
+  g = gcd(a, n)
+  if b % g:
+    return None
+  m = n // g
+  if m == 1:
+    return 0, 1
+  return int(b // g * invert(a // g, m) % m), m
+
+def crt(r1, r2):
+  (k1, m1), (k2, m2) = r1, r2
+  g = gcd(m1, m2)
+  if (k2 - k1) % g:
+    return None
+  m = m1 // g * m2
+  if m2 // g == 1:
+    return k1 % m, m
+  t = (k2 - k1) // g * invert(m1 // g, m2 // g) % (m2 // g)
+  return int((k1 + m1 * t) % m), m
+
+#
+# build() :- the Table of the curve, None when the curve is too big
+# or singular
+#
+
+def build(opt, a, d, p):
+  import numpy as np
+
+  wa, wb = dispatch.to_weierstrass(opt, a, d, p)
+  if (4*wa*wa*wa + 27*wb*wb) % p == 0:
+    return None
+  n = shards.count_range('2', wa, wb, p, 0, p) + 1
+  if n == 1:
+    # no affine point for w_random() to find
+    return None
+  found = structure(wa, wb, p, n, random.Random(p))
+  if found is None:
+    return None
+  n1, n2, P, Q = found
+
+  # index of every Weierstrass point, row j holds jQ + iP
+  windex = {}
+  multiples, pt = [], None
+  for i in range(n1):
+    multiples.append(pt)
+    pt = w_add(wa, p, pt, P)
+  row = None
+  for j in range(n2):
+    for i, m in enumerate(multiples):
+      windex[w_add(wa, p, m, row)] = i + n1*j
+    row = w_add(wa, p, row, Q)
+
+  xs = np.full(n, -1, dtype=np.int32)
+  ys = np.full(n, -1, dtype=np.int32)
+  slots = np.full(2*p, -1, dtype=np.int32)
+  identity = dispatch.MODULES[opt].IDENTITY
+  # the identity of the Weierstrass and Montgomery modules is not
+  # an affine point, index() and point() find it without a slot
+  for u in shards.points_range(opt, a, d, p, 0, p):
+    w = None if u == identity else dispatch.point_to_weierstrass(opt, a, d, p, u)
+    i = windex.get(w if w is None else (int(w[0]), int(w[1])))
+    if i is None:
+      continue
+    xs[i], ys[i] = u
+    slots[2*u[0] + (u[1] > p // 2)] = i
+  return Table(opt, a, d, p, n1, n2, xs, ys, slots, windex[None])
+
+#
+# share(), attach() :- the Table with its arrays in shared memory,
+# the one published under @key by another process for attach(), None
+# when there is none
+#
+
+def from_shared(key, meta, arrays):
+  opt, a, d, p = key
+  return Table(opt, a, d, p, meta['n1'], meta['n2'], arrays['xs'], arrays['ys'], arrays['slots'], meta['identity'])
+
+def share(key, table):
+  from base.curves import shared
+
+  meta = {'n1': table.n1, 'n2': table.n2, 'identity': table.identity}
+  found = shared.publish(key, meta, {'xs': table.xs, 'ys': table.ys, 'slots': table.slots})
+  return table if found is None else from_shared(key, *found)
+
+def attach(key):
+  from base.curves import shared
+
+  found = shared.attach(key)
+  return None if found is None else from_shared(key, *found)
+
+#
+# lookup() :- the Table of the curve, built on first use, None for
+# p >= LIMIT
+#
+
+def lookup(opt, a, d, p):
+  if p >= LIMIT or p < 3:
+    return None
+  key = (opt, a % p, d % p, p)
+  if key in _REGISTRY:
+    _REGISTRY.move_to_end(key)
+    return _REGISTRY[key]
+  table = attach(key)
+  if table is None:
+    table = build(opt, a % p, d % p, p)
+    if table is not None:
+      table = share(key, table)
+  _REGISTRY[key] = table
+  while len(_REGISTRY) > MAX_TABLES:
+    evict(*_REGISTRY.popitem(last=False))
+  return table
+
+def evict(key, table):
+  from base.curves import shared
+
+  if table is not None:
+    shared.release(key)
+
+#
+# preload() :- build the tables of the (opt, a, d, p) @curves, in the
+# parent process before fork so that the workers start with them
+#
+
+def preload(curves):
+  for opt, a, d, p in curves:
+    lookup(opt, a, d, p)
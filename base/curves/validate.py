@@ -0,0 +1,112 @@
+from base.curves import birational as br
+from base.curves import dispatch
+
+#
+# Validation of the points handed to the operations
+#
+# on_curve()       : the curve equation of the model, the IDENTITY of
+#                    the module counts as on the curve
+# in_subgroup()    : n*P = O for the order n of a subgroup, n*P at
+#                    infinity on an Edwards curve (see dispatch.py)
+#                    is not O
+# clear_cofactor() : h*P, always in the subgroup of order #E/h
+#
+# batch_on_curve() and batch_in_subgroup() check many points at once,
+# the first with NumPy int64 columns when p < SMALL (every product of
+# two reduced values fits), the second with the lane parallel scalar
+# multiplication of lanes.py ; above SMALL the equation is a handful
+# of Python integer products per point, cheaper than the conversion
+# to limbs
+#
+# coordinates are taken modulo p, as the curve modules do
+#
+
+SMALL = 1 << 31
+
+#
+# residual() :- left minus right hand side of the curve equation at
+# (x, y), 0 on the curve
+#
+# Twisted Edwards   : ax^2 + y^2 - 1 - dx^2y^2
+# Short Weierstrass : y^2 - x^3 - ax - b
+# Montgomery        : By^2 - x^3 - Ax^2 - x
+#
+
+def residual(opt, a, d, p, x, y):
+  if opt == '1':
+    return (a*x*x + y*y - 1 - d*x*x*y*y) % p
+  if opt == '2':
+    return (y*y - x*x*x - a*x - d) % p
+  return (d*y*y - x*x*x - a*x*x - x) % p
+
+#
+# reduce() :- the point with its coordinates taken modulo p, the
+# Weierstrass identity (which has none) as it is
+#
+
+def reduce(opt, p, pt):
+  if pt == dispatch.MODULES[opt].IDENTITY:
+    return pt
+  return (pt[0] % p, pt[1] % p)
+
+def on_curve(opt, a, d, p, pt):
+  x, y = pt = reduce(opt, p, pt)
+  return pt == dispatch.MODULES[opt].IDENTITY or residual(opt, a, d, p, x, y) == 0
+
+def in_subgroup(opt, a, d, p, pt, n):
+  try:
+    return dispatch.multiplypoint(opt, a, d, p, reduce(opt, p, pt), n) == dispatch.MODULES[opt].IDENTITY
+  except dispatch.PointAtInfinity:
+    return False
+
+def clear_cofactor(opt, a, d, p, pt, h):
+  return dispatch.multiplypoint(opt, a, d, p, reduce(opt, p, pt), h)
+
+#
+# batch_on_curve() :- list of booleans, on_curve() of every point
+#
+
+def batch_on_curve(opt, a, d, p, points):
+  import numpy as np
+
+  if not points:
+    return []
+  identity = dispatch.MODULES[opt].IDENTITY
+  reduced = [reduce(opt, p, pt) for pt in points]
+  # any stand-in for the Weierstrass identity, it is on the curve
+  affine = [(0, 0) if pt == identity else pt for pt in reduced]
+  a, d = a % p, d % p
+  if p < SMALL:
+    xy = np.array(affine, dtype=np.int64)
+    x, y = xy[:, 0], xy[:, 1]
+    xx, yy = x*x % p, y*y % p
+    if opt == '1':
+      r = (a*xx % p + yy - 1 - d*xx % p * yy % p) % p
+    elif opt == '2':
+      r = (yy - xx*x % p - a*x % p - d) % p
+    else:
+      r = (d*yy % p - xx*x % p - a*xx % p - x) % p
+    ok = (r == 0).tolist()
+  else:
+    ok = [residual(opt, a, d, p, x, y) == 0 for x, y in affine]
+  return [o or pt == identity for o, pt in zip(ok, reduced)]
+
+#
+# batch_in_subgroup() :- list of booleans, in_subgroup() of every point
+#
+
+def batch_in_subgroup(opt, a, d, p, points, n):
+  from base.curves import lanes
+
+  if not points:
+    return []
+  identity = dispatch.MODULES[opt].IDENTITY
+  reduced = [reduce(opt, p, pt) for pt in points]
+  # the projective Weierstrass lanes lose to dispatch's own ladder,
+  # lanes only pay off through a Montgomery model
+  if opt == '2' and br.weierstrass_to_montgomery(a % p, d % p, p) is None:
+    return [dispatch.multiplypoint(opt, a, d, p, pt, n) == identity for pt in reduced]
+  try:
+    return [q == identity for q in lanes.multiply(opt, a, d, p, reduced, [n] * len(reduced))]
+  except dispatch.PointAtInfinity:
+    return [in_subgroup(opt, a, d, p, pt, n) for pt in reduced]
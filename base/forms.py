@@ -1,6 +1,7 @@
 from django import forms
 from gmpy2 import mpz
 from django.core.exceptions import ValidationError
+from base.curves import validate
 
 # class GmpyIntegerField(forms.IntegerField):
 #     def to_python(self, value):
@@ -13,12 +14,23 @@ class adp_form(forms.Form):
     ('3', "Montgomery")
     )
     opt = forms.ChoiceField(choices = opt_choices)
-    a = forms.IntegerField(min_value=2,label='a')
+    a = forms.IntegerField(min_value=0,label='a')
     d = forms.IntegerField(min_value=1,label='d')
     p = forms.IntegerField(min_value=3,label='p')
 
-    def clean_d(self):
+    def clean_a(self):
+        # y^2 = x^3 + b (a = 0) is a valid Short Weirstrass curve
+        opt = self.cleaned_data.get('opt')
         a = self.cleaned_data['a']
+        # an invalid opt already has its own error
+        if opt is None:
+            return a
+        if opt != '2' and a < 2:
+            raise ValidationError("Ensure this value is greater than or equal to 2.")
+        return a
+
+    def clean_d(self):
+        a = self.cleaned_data.get('a')
         d = self.cleaned_data['d']
         if a == d:
             raise ValidationError("Values of a and d cannot be equal!")
@@ -31,23 +43,130 @@ class opt_form(forms.Form):
     ('4', "Doubling (x2)"),
     ('5', "Scalar Multiplication (xScalar)"),
     ('6', "Division using bsgs (/)"),
+    ('7', "Group Order (#E)"),
+    ('8', "Point Order"),
+    ('9', "Random Generator"),
+    ('10', "Random Point"),
+    ('11', "Hash to Curve"),
     )
+    # operations that take no point
+    no_points = ('7', '9', '10', '11')
     opt = forms.ChoiceField(choices = opt_choices)
-    x1 = forms.IntegerField()
-    y1 = forms.IntegerField()
+    x1 = forms.IntegerField(required=False)
+    y1 = forms.IntegerField(required=False)
     x2 = forms.IntegerField(required=False)
     y2 = forms.IntegerField(required=False)
+    message = forms.CharField(required=False, max_length=1024)
+    # divisions estimated to run long wait for this, see views.divide()
+    confirm = forms.BooleanField(required=False, label='Confirm long runs')
+
+    def __init__(self, *args, curve=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (opt, a, d, p) of the session curve, the points are checked on it
+        self.curve = curve
+
+    def clean_x1(self):
+        opt = self.cleaned_data.get('opt')
+        x1 = self.cleaned_data['x1']
+        if opt is None:
+            return x1
+        if opt not in self.no_points and x1 == None:
+            raise ValidationError("x1: Value required!")
+        return x1
+
+    def clean_y1(self):
+        opt = self.cleaned_data.get('opt')
+        y1 = self.cleaned_data['y1']
+        if opt is None:
+            return y1
+        if opt not in self.no_points and y1 == None:
+            raise ValidationError("y1: Value required!")
+        return y1
 
     def clean_x2(self):
-        opt = self.cleaned_data['opt']
+        opt = self.cleaned_data.get('opt')
         x2 = self.cleaned_data['x2']
+        if opt is None:
+            return x2
         if (opt == '2' or opt == '3' or opt == '5' or opt == '6') and x2 == None:
             raise ValidationError("x2: Value required!")
         return x2
     
     def clean_y2(self):
-        opt = self.cleaned_data['opt']
+        opt = self.cleaned_data.get('opt')
         y2 = self.cleaned_data['y2']
+        if opt is None:
+            return y2
         if (opt == '2' or opt == '3' or opt == '6') and y2 == None:
             raise ValidationError("y2: Value required!")
-        return y2
\ No newline at end of file
+        return y2
+
+    def clean_message(self):
+        opt = self.cleaned_data.get('opt')
+        message = self.cleaned_data['message']
+        if opt is None:
+            return message
+        if opt == '11' and not message:
+            raise ValidationError("message: Value required!")
+        return message
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.curve is None or self.errors:
+            return cleaned_data
+        opt = cleaned_data['opt']
+        points = []
+        if opt not in self.no_points:
+            points.append(('x1', (cleaned_data['x1'], cleaned_data['y1'])))
+        # x2 of a scalar multiplication is the scalar
+        if opt in ('2', '3', '6'):
+            points.append(('x2', (cleaned_data['x2'], cleaned_data['y2'])))
+        for field, pt in points:
+            if not validate.on_curve(*self.curve, pt):
+                self.add_error(field, "({}, {}) is not on the curve".format(*pt))
+        return cleaned_data
+
+class batch_form(forms.Form):
+    opt_choices = (
+    ('1', "Point Order"),
+    ('2', "Random Generators"),
+    )
+    opt = forms.ChoiceField(choices = opt_choices)
+    points = forms.CharField(widget=forms.Textarea(attrs={'rows': 8}), required=False,
+                             help_text="one point per line as x,y")
+    count = forms.IntegerField(min_value=1, max_value=100, required=False)
+
+    def __init__(self, *args, curve=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.curve = curve
+
+    def clean_points(self):
+        opt = self.cleaned_data.get('opt')
+        points = []
+        for line in self.cleaned_data['points'].splitlines():
+            line = line.strip().strip('()')
+            if not line:
+                continue
+            try:
+                x, y = (int(v) for v in line.split(','))
+            except ValueError:
+                raise ValidationError("points: '{}' is not of the form x,y".format(line))
+            points.append((x, y))
+        if opt == '1' and not points:
+            raise ValidationError("points: Value required!")
+        if self.curve is not None and points:
+            off = [pt for pt, ok in zip(points, validate.batch_on_curve(*self.curve, points)) if not ok]
+            if off:
+                listed = ', '.join('({}, {})'.format(*pt) for pt in off[:5])
+                more = ' and {} more'.format(len(off) - 5) if len(off) > 5 else ''
+                raise ValidationError("points: {}{} not on the curve".format(listed, more))
+        return points
+
+    def clean_count(self):
+        opt = self.cleaned_data.get('opt')
+        count = self.cleaned_data['count']
+        if opt is None:
+            return count
+        if opt == '2' and count == None:
+            raise ValidationError("count: Value required!")
+        return count
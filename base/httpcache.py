@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    # optional, responses are only gzipped without it
+    brotli = None
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+# HTTP caching of the content-addressed pages. A URL that names its
+# curve (see catalogue.curve_key()) and its range of points always
+# shows the same points, so its response gets a strong ETag derived
+# from the URL parameters alone and Cache-Control: immutable. A
+# conditional GET with a matching If-None-Match is answered with 304
+# before anything is computed, and the body is brotli (when installed)
+# or gzip compressed once for the encodings the client accepts.
+#
+# The ETag is per encoding ("<digest>-gzip", "<digest>-br"), so each
+# representation keeps a strong validator. VERSION is part of every
+# ETag: bump it when the templates or the point encodings change, the
+# URLs stay the same but every cached copy is then replaced.
+
+VERSION = 1
+MAX_AGE = 365 * 24 * 3600
+# bodies shorter than this are sent as they are
+MIN_SIZE = 200
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def accepted_encodings(request):
+    """Return the content codings of the Accept-Encoding header, without the q=0 ones."""
+    codings = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        codings.add(coding.strip().lower())
+    return codings
+
+
+def choose_encoding(request):
+    codings = accepted_encodings(request)
+    if brotli is not None and 'br' in codings:
+        return 'br'
+    if 'gzip' in codings:
+        return 'gzip'
+    return ''
+
+
+def etag(key, encoding=''):
+    digest = hashlib.sha1(repr((VERSION,) + tuple(key)).encode()).hexdigest()
+    return '"{}{}"'.format(digest, '-' + encoding if encoding else '')
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def cache_headers(response, tag):
+    response['ETag'] = tag
+    response['Cache-Control'] = 'public, max-age={}, immutable'.format(MAX_AGE)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def immutable(request, key, render):
+    """Return render() for a URL whose response only depends on key, as immutable.
+
+    A request whose If-None-Match holds the ETag of key gets a 304 without
+    render() being called; only 200 responses are compressed and cached."""
+    encoding = choose_encoding(request)
+    tag = etag(key, encoding)
+    if request.method in ('GET', 'HEAD'):
+        tags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        # short bodies are cached uncompressed, under the identity ETag
+        for current in (tag, etag(key), '*'):
+            if current in tags:
+                return cache_headers(HttpResponseNotModified(), tag if current == '*' else current)
+    response = render()
+    if response.status_code != 200 or response.streaming:
+        return response
+    if encoding and len(response.content) >= MIN_SIZE:
+        response.content = compress(response.content, encoding)
+        response['Content-Encoding'] = encoding
+    else:
+        # the identity representation has its own ETag
+        tag = etag(key)
+    response['Content-Length'] = str(len(response.content))
+    return cache_headers(response, tag)
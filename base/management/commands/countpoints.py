@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from gmpy2 import is_prime
+
+from base import catalogue
+from base.curves import shards
+
+#
+# Exact point count, or full enumeration, of a curve over a mid-size
+# p across a process pool (see base/curves/shards.py)
+#
+#   python manage.py countpoints 2 2 3 1000003 --checkpoint count.json
+#   python manage.py countpoints 1 3 5 1000003 --points points/
+#
+# an interrupted run started again with the same --checkpoint (or
+# --points directory) only does the shards that are missing
+#
+
+
+class Command(BaseCommand):
+    help = 'Count (or write out) the points of a curve over p, resumable from a checkpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('opt', choices=['1', '2', '3'], help='1 Twisted Edwards, 2 Short Weierstrass, 3 Montgomery')
+        parser.add_argument('a', type=int)
+        parser.add_argument('d', type=int)
+        parser.add_argument('p', type=int)
+        parser.add_argument('--jobs', type=int, default=None, help='worker processes, all cores by default')
+        parser.add_argument('--block', type=int, default=10**5, help='x values per block')
+        parser.add_argument('--checkpoint', default=None, help='json file of the finished shards of a count')
+        parser.add_argument('--points', default=None,
+                            help='directory for the per shard point files, points.txt and their checkpoint')
+
+    def handle(self, *args, **options):
+        opt, a, d, p = options['opt'], options['a'], options['d'], options['p']
+        if p < 3 or not is_prime(p):
+            raise CommandError('p must be an odd prime')
+        if options['block'] < 1:
+            raise CommandError('--block must be positive')
+        res = {'curve': catalogue.curve_key(opt, a, d, p)}
+        if options['points']:
+            path, res['affine_points'] = shards.enumerate_points(opt, a, d, p, options['points'], options['jobs'],
+                                                                 options['block'])
+            res['path'] = path
+        else:
+            res['affine_points'] = shards.count(opt, a, d, p, options['jobs'], options['checkpoint'], options['block'])
+        res['order'] = res['affine_points'] + catalogue.curve_module(opt).points_at_infinity(a, d, p)
+        self.stdout.write(json.dumps(res))
@@ -0,0 +1,269 @@
+import json
+import random
+import statistics
+import threading
+import time
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from base.curves import dispatch
+
+#
+# Load generator for the home -> calculate -> operation flow
+#
+# every virtual user runs scripted sessions one after the other : the
+# home page, the curve form, a few pages of points, then a mix of
+# addition, scalar multiplication and bsgs POSTs with points worked
+# out locally, the latency of each request is recorded by endpoint
+# and curve size
+#
+#   python manage.py loadtest --users 8 --sessions 5 --save baseline.json
+#   python manage.py loadtest --users 8 --sessions 5 --compare baseline.json
+#
+# without --url the requests go through django.test.Client in this
+# process (migrate the database first), with --url to a running
+# server over HTTP
+#
+
+# (opt, a, d, p) per curve size, the large one is j = 0 so that its
+# order comes from the CM method rather than a count
+CURVES = {
+    'small': ('2', 2, 3, 1019),
+    'medium': ('2', 2, 3, 100003),
+    'large': ('2', 0, 7, 2147483647),
+}
+
+OPERATIONS = {'add': '2', 'mul': '5', 'bsgs': '6'}
+
+
+def allowed_host():
+    # with DEBUG on and no ALLOWED_HOSTS django takes localhost
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+class ClientDriver:
+    """Requests through the test client, in process."""
+
+    def __init__(self):
+        self.client = Client(SERVER_NAME=allowed_host(), raise_request_exception=False)
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def post(self, path, data):
+        return self.client.post(path, data).status_code
+
+    def close(self):
+        connection.close()
+
+
+class HttpDriver:
+    """Requests over HTTP to a running server, one cookie jar per user."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.jar = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.jar))
+
+    def send(self, request):
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except HTTPError as e:
+            return e.code
+
+    def get(self, path):
+        return self.send(Request(self.url + path))
+
+    def post(self, path, data):
+        token = next((c.value for c in self.jar if c.name == 'csrftoken'), '')
+        body = urlencode(dict(data, csrfmiddlewaretoken=token)).encode()
+        return self.send(Request(self.url + path, data=body, headers={'Referer': self.url + path}))
+
+    def close(self):
+        pass
+
+
+def random_point(opt, a, d, p, rng):
+    curve = dispatch.MODULES[opt]
+    while True:
+        pt = curve.liftpoint(a, d, p, rng.randrange(p))
+        if pt is not None and pt != curve.IDENTITY:
+            return pt
+
+
+def operation_data(name, opt, a, d, p, rng):
+    q1, q2 = random_point(opt, a, d, p, rng), random_point(opt, a, d, p, rng)
+    if name == 'add':
+        return {'opt': '2', 'x1': q1[0], 'y1': q1[1], 'x2': q2[0], 'y2': q2[1]}
+    if name == 'mul':
+        return {'opt': '5', 'x1': q1[0], 'y1': q1[1], 'x2': rng.randrange(1, p)}
+    # q1 = k*q2 so that the division has an answer
+    q1 = dispatch.multiplypoint(opt, a, d, p, q2, rng.randrange(1, p))
+    return {'opt': '6', 'x1': q1[0], 'y1': q1[1], 'x2': q2[0], 'y2': q2[1]}
+
+
+def timed(records, endpoint, size, fn, *args):
+    start = time.perf_counter()
+    try:
+        status = fn(*args)
+    except Exception:
+        status = None
+    records.append((endpoint, size, time.perf_counter() - start, status))
+
+
+def session(driver, size, pages, ops, mix, rng, records):
+    opt, a, d, p = CURVES[size]
+    timed(records, 'home GET', size, driver.get, '/')
+    timed(records, 'home POST', size, driver.post, '/', {'opt': opt, 'a': a, 'd': d, 'p': p})
+    for start in range(0, min(pages * 1000, p), 1000):
+        timed(records, 'calculate GET', size, driver.get, '/calculate/{}/'.format(start))
+    names = list(mix)
+    for _ in range(ops):
+        name = rng.choices(names, weights=[mix[n] for n in names])[0]
+        data = operation_data(name, opt, a, d, p, rng)
+        timed(records, 'calculate ' + name, size, driver.post, '/calculate/0/', data)
+
+
+def percentiles(values):
+    if len(values) == 1:
+        return values[0], values[0], values[0]
+    q = statistics.quantiles(values, n=100, method='inclusive')
+    return q[49], q[94], q[98]
+
+
+def summarise(records, wall):
+    groups = {}
+    for endpoint, size, seconds, status in records:
+        groups.setdefault((endpoint, size), []).append((seconds, status))
+    rows = {}
+    for (endpoint, size), items in sorted(groups.items()):
+        seconds = [s for s, _ in items]
+        p50, p95, p99 = percentiles(seconds)
+        rows['{} | {}'.format(endpoint, size)] = {
+            'requests': len(items),
+            'errors': sum(1 for _, status in items if status is None or status >= 400),
+            'throughput': len(items) / wall,
+            'p50_ms': p50 * 1000,
+            'p95_ms': p95 * 1000,
+            'p99_ms': p99 * 1000,
+        }
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Drive scripted home/calculate sessions with concurrent users and report latency percentiles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='base URL of a running server, the test client is used otherwise')
+        parser.add_argument('--users', type=int, default=4, help='concurrent virtual users')
+        parser.add_argument('--sessions', type=int, default=3, help='sessions run by each user')
+        parser.add_argument('--curves', nargs='+', choices=sorted(CURVES), default=['small', 'medium'])
+        parser.add_argument('--pages', type=int, default=3, help='pages of points visited per session')
+        parser.add_argument('--ops', type=int, default=10, help='operations posted per session')
+        parser.add_argument('--mix', default='add=5,mul=4,bsgs=1', help='relative weights of the operations')
+        parser.add_argument('--warmup', action='store_true', help='run one untimed session per curve first')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--save', help='write the results to this baseline file')
+        parser.add_argument('--compare', help='baseline file to compare the results against')
+        parser.add_argument('--tolerance', type=float, default=20.0,
+                            help='percent a p95 may grow over the baseline before it counts as a regression')
+
+    def handle(self, *args, **options):
+        mix = {}
+        for item in options['mix'].split(','):
+            name, _, weight = item.partition('=')
+            if name not in OPERATIONS:
+                raise CommandError('unknown operation {} in --mix'.format(name))
+            mix[name] = float(weight or 1)
+
+        def driver():
+            return HttpDriver(options['url']) if options['url'] else ClientDriver()
+
+        seed = options['seed'] if options['seed'] is not None else random.randrange(1 << 32)
+        if options['warmup']:
+            d = driver()
+            for size in options['curves']:
+                session(d, size, 1, len(mix), mix, random.Random(seed), [])
+            d.close()
+
+        records = []
+        lock = threading.Lock()
+
+        def user(index):
+            rng = random.Random(seed + index)
+            d = driver()
+            local = []
+            for i in range(options['sessions']):
+                size = options['curves'][(index + i) % len(options['curves'])]
+                session(d, size, options['pages'], options['ops'], mix, rng, local)
+            d.close()
+            with lock:
+                records.extend(local)
+
+        start = time.perf_counter()
+        if options['users'] == 1:
+            user(0)
+        else:
+            threads = [threading.Thread(target=user, args=(i,)) for i in range(options['users'])]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        wall = time.perf_counter() - start
+
+        rows = summarise(records, wall)
+        self.report(rows, wall, len(records))
+
+        if options['save']:
+            meta = {k: options[k] for k in ('url', 'users', 'sessions', 'curves', 'pages', 'ops', 'mix')}
+            meta.update(seed=seed, wall=wall, requests=len(records))
+            with open(options['save'], 'w') as f:
+                json.dump({'meta': meta, 'results': rows}, f, indent=2)
+            self.stdout.write('baseline written to {}'.format(options['save']))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)['results']
+            regressions = self.compare(rows, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('{} endpoint(s) regressed past {}% on p95: {}'.format(
+                    len(regressions), options['tolerance'], ', '.join(regressions)))
+
+    def report(self, rows, wall, total):
+        self.stdout.write('{:32} {:>6} {:>5} {:>8} {:>9} {:>9} {:>9}'.format(
+            'endpoint | curve', 'reqs', 'errs', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for key, r in rows.items():
+            self.stdout.write('{:32} {:>6} {:>5} {:>8.1f} {:>9.1f} {:>9.1f} {:>9.1f}'.format(
+                key, r['requests'], r['errors'], r['throughput'], r['p50_ms'], r['p95_ms'], r['p99_ms']))
+        self.stdout.write('{} requests in {:.1f} s, {:.1f} req/s'.format(total, wall, total / wall))
+
+    def compare(self, rows, baseline, tolerance):
+        regressions = []
+        self.stdout.write('')
+        self.stdout.write('{:32} {:>9} {:>9} {:>9} {:>9}'.format('change against baseline', 'req/s', 'p50', 'p95', 'p99'))
+        for key, r in rows.items():
+            b = baseline.get(key)
+            if b is None:
+                self.stdout.write('{:32} not in the baseline'.format(key))
+                continue
+            change = {k: (r[k] - b[k]) / b[k] * 100 if b[k] else 0.0
+                      for k in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms')}
+            flag = ''
+            if change['p95_ms'] > tolerance:
+                regressions.append(key)
+                flag = '  REGRESSION'
+            self.stdout.write('{:32} {:>+8.0f}% {:>+8.0f}% {:>+8.0f}% {:>+8.0f}%{}'.format(
+                key, change['throughput'], change['p50_ms'], change['p95_ms'], change['p99_ms'], flag))
+        return regressions
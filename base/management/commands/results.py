@@ -0,0 +1,48 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base import results
+
+#
+# Bulk export and import of the stored discrete logs and scalar
+# multiples (see base/results.py), one JSON object per line
+#
+#   python manage.py results export results.ndjson --curve 2:2:3:100003
+#   python manage.py results import results.ndjson
+#
+
+
+class Command(BaseCommand):
+    help = 'Export the stored discrete logs and scalar multiples as NDJSON, or import them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['export', 'import'])
+        parser.add_argument('path', help='NDJSON file, - for standard output or input')
+        parser.add_argument('--curve', help='key <opt>:<a>:<d>:<p> of the one curve to export')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if options['action'] == 'export':
+            out = self.stdout if path == '-' else open(path, 'w')
+            count = 0
+            for row in results.export_results(options['curve']):
+                out.write(json.dumps(row) + '\n')
+                count += 1
+            if out is not self.stdout:
+                out.close()
+                self.stdout.write('{} results written to {}'.format(count, path))
+            return
+
+        try:
+            source = sys.stdin if path == '-' else open(path)
+        except OSError as e:
+            raise CommandError(str(e))
+        with source:
+            rows = (json.loads(line) for line in source if line.strip())
+            try:
+                count = results.import_results(rows)
+            except (KeyError, ValueError) as e:
+                raise CommandError('malformed result: {}'.format(e))
+        self.stdout.write('{} results read from {}'.format(count, path))
@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from gmpy2 import is_prime
+
+from base.curves import search
+
+#
+# Batch search for curves over p, one JSON object per curve found,
+# written as soon as it is found (see base/curves/search.py)
+#
+#   python manage.py searchcurves 1000003 --models 2 --a 1:200 --d 1:200 --twist-cofactor 4 --limit 5
+#
+
+
+def span(value):
+    start, _, stop = value.partition(':')
+    try:
+        return range(int(start), int(stop)) if stop else range(int(start), int(start) + 1)
+    except ValueError:
+        raise CommandError('{} is not a range start:stop'.format(value))
+
+
+class Command(BaseCommand):
+    help = 'Search for curves over p with a prime (or cofactor h) order and other properties.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('p', type=int)
+        parser.add_argument('--models', nargs='+', choices=['1', '2', '3'], default=['1', '2', '3'],
+                            help='1 Twisted Edwards, 2 Short Weierstrass, 3 Montgomery')
+        parser.add_argument('--a', default='1:100', help='range start:stop of a (A for Montgomery)')
+        parser.add_argument('--d', default='1:100', help='range start:stop of d (b, B)')
+        parser.add_argument('--cofactor', type=int, default=None,
+                            help='cofactor h of the order, 1 for Weierstrass and 4 for the others by default')
+        parser.add_argument('--twist-cofactor', type=int, default=None,
+                            help='largest cofactor allowed on the twist, the twist is not checked otherwise')
+        parser.add_argument('--embedding', type=int, default=None,
+                            help='reject embedding degrees up to this')
+        parser.add_argument('--min-cm', type=int, default=None, help='smallest |D| of the CM discriminant')
+        parser.add_argument('--jobs', type=int, default=None, help='worker processes, all cores by default')
+        parser.add_argument('--limit', type=int, default=None, help='stop after this many curves')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['p'] < 5 or not is_prime(options['p']):
+            raise CommandError('p must be a prime above 3')
+        constraints = {k: options[k] for k in ('cofactor', 'twist_cofactor', 'embedding', 'min_cm')}
+        for res in search.search(options['p'], options['models'], span(options['a']), span(options['d']),
+                                 options['jobs'], options['limit'], options['seed'], **constraints):
+            self.stdout.write(json.dumps(res))
+            self.stdout.flush()
@@ -0,0 +1,55 @@
+# Generated by Django 4.0.2 on 2026-10-19 12:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Curve',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('opt', models.CharField(choices=[('1', 'Twisted Edwards'), ('2', 'Short Weirstrass'), ('3', 'Montgomery')], max_length=1)),
+                ('a', models.CharField(max_length=80)),
+                ('d', models.CharField(max_length=80)),
+                ('p', models.CharField(max_length=80)),
+                ('order', models.CharField(blank=True, max_length=80, null=True)),
+                ('factors', models.JSONField(blank=True, null=True)),
+                ('gx', models.CharField(blank=True, max_length=80, null=True)),
+                ('gy', models.CharField(blank=True, max_length=80, null=True)),
+                ('subgroup_order', models.CharField(blank=True, max_length=80, null=True)),
+                ('cofactor', models.CharField(blank=True, max_length=80, null=True)),
+                ('block_size', models.CharField(default='1000', max_length=80)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PointBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.IntegerField()),
+                ('count', models.IntegerField()),
+                ('curve', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocks', to='base.curve')),
+            ],
+            options={
+                'ordering': ['index'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='curve',
+            index=models.Index(fields=['opt', 'p'], name='base_curve_opt_c3b15d_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pointblock',
+            unique_together={('curve', 'index')},
+        ),
+    ]
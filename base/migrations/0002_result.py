@@ -0,0 +1,30 @@
+# Generated by Django 4.0.2 on 2026-10-19 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Result',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('log', 'Discrete log'), ('mul', 'Scalar multiple')], max_length=3)),
+                ('operand', models.CharField(max_length=512)),
+                ('argument', models.CharField(max_length=512)),
+                ('value', models.CharField(max_length=512)),
+                ('modulus', models.CharField(blank=True, max_length=80, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('curve', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='base.curve')),
+            ],
+            options={
+                'unique_together': {('curve', 'kind', 'operand', 'argument')},
+            },
+        ),
+    ]
@@ -1,3 +1,83 @@
 from django.db import models
 
 # Create your models here.
+
+# Curve parameters and computed values are stored as decimal strings,
+# they routinely go beyond the 64 bit range of an IntegerField.
+
+class Curve(models.Model):
+    opt_choices = (
+    ('1', "Twisted Edwards"),
+    ('2', "Short Weirstrass"),
+    ('3', "Montgomery")
+    )
+    # canonical identifier "<opt>:<a>:<d>:<p>", see catalogue.curve_key()
+    key = models.CharField(max_length=255, unique=True)
+    opt = models.CharField(max_length=1, choices=opt_choices)
+    a = models.CharField(max_length=80)
+    d = models.CharField(max_length=80)
+    p = models.CharField(max_length=80)
+
+    order = models.CharField(max_length=80, null=True, blank=True)
+    # [[prime, exponent], ...] of the group order
+    factors = models.JSONField(null=True, blank=True)
+    # generator of the largest prime order subgroup
+    gx = models.CharField(max_length=80, null=True, blank=True)
+    gy = models.CharField(max_length=80, null=True, blank=True)
+    subgroup_order = models.CharField(max_length=80, null=True, blank=True)
+    cofactor = models.CharField(max_length=80, null=True, blank=True)
+    # width (in x values) of the blocks counted in PointBlock
+    block_size = models.CharField(max_length=80, default='1000')
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['opt', 'p']),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
+class PointBlock(models.Model):
+    # number of affine points with x in [index*block_size, (index+1)*block_size)
+    curve = models.ForeignKey(Curve, on_delete=models.CASCADE, related_name='blocks')
+    index = models.IntegerField()
+    count = models.IntegerField()
+
+    class Meta:
+        unique_together = ('curve', 'index')
+        ordering = ['index']
+
+    def __str__(self):
+        return '{} [{}]'.format(self.curve.key, self.index)
+
+
+class Result(models.Model):
+    # a discrete log (operand = value*argument) or a scalar multiple
+    # (value = argument*operand) worked out on a catalogued curve,
+    # points are the hex of their uncompressed encoding (see
+    # curves/encoding.py), see results.py
+    kind_choices = (
+    ('log', "Discrete log"),
+    ('mul', "Scalar multiple"),
+    )
+    curve = models.ForeignKey(Curve, on_delete=models.CASCADE, related_name='results')
+    kind = models.CharField(max_length=3, choices=kind_choices)
+    operand = models.CharField(max_length=512)
+    # the base point of a log, the scalar of a multiple
+    argument = models.CharField(max_length=512)
+    # k of a log (-1 when there is none), the point of a multiple
+    value = models.CharField(max_length=512)
+    # order the log was reduced by
+    modulus = models.CharField(max_length=80, null=True, blank=True)
+
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('curve', 'kind', 'operand', 'argument')
+
+    def __str__(self):
+        return '{} {} {} {}'.format(self.curve.key, self.kind, self.operand, self.argument)
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+
+from base import catalogue
+from base.curves import encoding
+from base.models import Result
+
+# Store of computed discrete logs and scalar multiples. A division
+# is a full baby-step giant-step search, so its answer is kept in the
+# Result table keyed by the curve and the encoded points, and the
+# most recently used answers in an in-process LRU in front of it, so
+# that a repeated question is a dictionary read.
+
+MAX_CACHED = 1 << 16
+
+# (curve key, kind, operand, argument) -> value
+_CACHE = OrderedDict()
+
+
+def point_key(opt, p, pt):
+    return encoding.encode_points(opt, p, [pt], compressed=False).hex()
+
+
+def cached(key):
+    value = _CACHE.get(key)
+    if value is not None:
+        _CACHE.move_to_end(key)
+    return value
+
+
+def remember(key, value):
+    _CACHE[key] = value
+    while len(_CACHE) > MAX_CACHED:
+        _CACHE.popitem(last=False)
+
+
+def fetch(opt, a, d, p, kind, operand, argument):
+    key = (catalogue.curve_key(opt, a, d, p), kind, operand, argument)
+    value = cached(key)
+    if value is None:
+        value = Result.objects.filter(curve__key=key[0], kind=kind, operand=operand,
+                                      argument=argument).values_list('value', flat=True).first()
+        if value is not None:
+            remember(key, value)
+    return value
+
+
+def store(opt, a, d, p, kind, operand, argument, value, modulus=None):
+    curve = catalogue.get_curve(opt, a, d, p)
+    Result.objects.get_or_create(curve=curve, kind=kind, operand=operand, argument=argument,
+                                 defaults={'value': value, 'modulus': modulus})
+    remember((curve.key, kind, operand, argument), value)
+
+
+def lookup_log(opt, a, d, p, p1, p2):
+    """Return the stored k with p1 = k*p2 (-1 for none), or None."""
+    value = fetch(opt, a, d, p, 'log', point_key(opt, p, p1), point_key(opt, p, p2))
+    return None if value is None else int(value)
+
+
+def store_log(opt, a, d, p, p1, p2, k, n=None):
+    store(opt, a, d, p, 'log', point_key(opt, p, p1), point_key(opt, p, p2), str(k),
+          None if n is None else str(n))
+
+
+def lookup_multiple(opt, a, d, p, pt, k):
+    """Return the stored k*pt, or None."""
+    value = fetch(opt, a, d, p, 'mul', point_key(opt, p, pt), str(k))
+    if value is None:
+        return None
+    return encoding.decode_point(opt, a, d, p, bytes.fromhex(value), compressed=False)
+
+
+def store_multiple(opt, a, d, p, pt, k, res):
+    store(opt, a, d, p, 'mul', point_key(opt, p, pt), str(k), point_key(opt, p, res))
+
+
+def export_results(key=None):
+    """Yield every stored result, of one curve when key is given, as a dict."""
+    results = Result.objects.select_related('curve').order_by('id')
+    if key is not None:
+        results = results.filter(curve__key=key)
+    for r in results.iterator():
+        yield {'curve': r.curve.key, 'kind': r.kind, 'operand': r.operand,
+               'argument': r.argument, 'value': r.value, 'modulus': r.modulus}
+
+
+def import_results(rows, batch_size=500):
+    """Store exported results, the ones already stored are skipped. Returns the count read."""
+    curves, pending, count = {}, [], 0
+    for row in rows:
+        key = row['curve']
+        if key not in curves:
+            opt, a, d, p = key.split(':')
+            curves[key] = catalogue.get_curve(opt, int(a), int(d), int(p))
+        pending.append(Result(curve=curves[key], kind=row['kind'], operand=row['operand'],
+                              argument=row['argument'], value=row['value'], modulus=row.get('modulus')))
+        count += 1
+        if len(pending) >= batch_size:
+            Result.objects.bulk_create(pending, ignore_conflicts=True)
+            pending = []
+    Result.objects.bulk_create(pending, ignore_conflicts=True)
+    return count
+
+
+def clear_cache():
+    _CACHE.clear()
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # not POSIX, identical calls are only coalesced within a process
+    fcntl = None
+
+# Single flight for expensive computations. Concurrent calls with the
+# same key (a canonical (curve, operation, inputs) tuple) share one
+# computation: within a process the first caller computes and the
+# others wait for its result, across worker processes the callers take
+# turns on an flock()ed lock file and every caller after the first
+# finds the answer already stored (the lookup function, reading
+# results.py or the catalogue) instead of computing it again.
+#
+# A caller waits at most TIMEOUT seconds and then computes on its own,
+# a worker that dies holding a lock file loses the lock with its file
+# descriptor. The lock files are left in DIRECTORY, one empty file
+# per key ever computed. DIRECTORY is per user and only used when this
+# user owns it and nobody else can reach it (mode 0700), otherwise
+# identical calls are only coalesced within a process.
+
+UID = os.getuid() if hasattr(os, 'getuid') else 0
+DIRECTORY = os.environ.get('TEDWARDS_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'tedwards-locks-{}'.format(UID)))
+TIMEOUT = 600.0
+# seconds between two tries at a lock file held by another process
+POLL = 0.05
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_LOCK = threading.Lock()
+# key -> Flight in progress in this process
+_FLIGHTS = {}
+
+
+def lock_path(key):
+    return os.path.join(DIRECTORY, hashlib.sha1(repr(key).encode()).hexdigest() + '.lock')
+
+
+def check_directory():
+    """Create DIRECTORY if missing, PermissionError unless it is private to this user."""
+    os.makedirs(DIRECTORY, mode=0o700, exist_ok=True)
+    st = os.stat(DIRECTORY)
+    if st.st_uid != UID or st.st_mode & 0o077:
+        raise PermissionError('{} is not a directory only this user can reach'.format(DIRECTORY))
+
+
+def acquire(key, timeout):
+    """Return the descriptor of the locked file of key, or None after timeout seconds."""
+    check_directory()
+    fd = os.open(lock_path(key), os.O_RDWR | os.O_CREAT, 0o600)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                os.close(fd)
+                return None
+            time.sleep(POLL)
+
+
+def release(fd):
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+def compute_locked(key, compute, lookup, timeout):
+    if fcntl is None:
+        return compute()
+    try:
+        fd = acquire(key, timeout)
+    except PermissionError:
+        # someone else's directory, see the note at the top
+        return compute()
+    try:
+        # another process may have stored the answer while this one waited
+        if fd is not None and lookup is not None:
+            value = lookup()
+            if value is not None:
+                return value
+        return compute()
+    finally:
+        if fd is not None:
+            release(fd)
+
+
+def run(key, compute, lookup=None, timeout=TIMEOUT):
+    """Return compute(), called once for all the concurrent callers with the same key.
+
+    lookup() returns the stored answer of a computation finished in another
+    process, or None."""
+    with _LOCK:
+        flight = _FLIGHTS.get(key)
+        leader = flight is None
+        if leader:
+            flight = _FLIGHTS[key] = Flight()
+    if not leader:
+        if not flight.done.wait(timeout):
+            return compute()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+    try:
+        flight.value = compute_locked(key, compute, lookup, timeout)
+        return flight.value
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _LOCK:
+            del _FLIGHTS[key]
+        flight.done.set()
@@ -1,3 +1,1138 @@
-from django.test import TestCase
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
 
 # Create your tests here.
+
+# cold import of the curves package, timed in a fresh interpreter
+# so that nothing is already in sys.modules
+IMPORT_SCRIPT = '''
+import json, sys, time
+t = time.perf_counter()
+from base.curves import *
+from base.curves import dispatch, group, encoding
+print(json.dumps({'seconds': time.perf_counter() - t, 'modules': sorted(sys.modules)}))
+'''
+
+class ImportTimeTest(SimpleTestCase):
+    # seconds, sympy on its own takes longer than this to import
+    BUDGET = 0.4
+
+    def cold_import(self):
+        out = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=settings.BASE_DIR,
+                             capture_output=True, text=True, check=True).stdout
+        return json.loads(out)
+
+    def test_import_budget(self):
+        # best of three, a single run is at the mercy of the disk cache
+        seconds = min(self.cold_import()['seconds'] for _ in range(3))
+        self.assertLess(seconds, self.BUDGET)
+
+    def test_heavy_modules_not_imported(self):
+        modules = self.cold_import()['modules']
+        for name in ('sympy', 'numpy', 'mpmath'):
+            self.assertNotIn(name, modules)
+
+
+class BirationalMapTest(SimpleTestCase):
+    # above tables.LIMIT, so that dispatch routes between the models instead of using a group table
+    P = 100003
+
+    def points(self, opt, a, d, count=6):
+        from base.curves import dispatch
+
+        module, p = dispatch.MODULES[opt], self.P
+        return [pt for pt in (module.liftpoint(a, d, p, x) for x in range(2, 200)) if pt is not None][:count]
+
+    def test_point_round_trips(self):
+        from base.curves import birational as br
+        from base.curves import dispatch, tables, validate
+
+        p, a, d = self.P, 3, 5
+        A, B = br.edwards_to_montgomery(a, d, p)
+        wa, wb = br.edwards_to_weierstrass(a, d, p)
+        self.assertEqual(br.edwards_point_to_montgomery(a, d, p, br.EDWARDS_IDENTITY), br.MONTGOMERY_IDENTITY)
+        self.assertEqual(br.montgomery_point_to_edwards(A, B, p, br.MONTGOMERY_IDENTITY), br.EDWARDS_IDENTITY)
+        self.assertEqual(br.edwards_point_to_weierstrass(a, d, p, br.EDWARDS_IDENTITY), br.WEIERSTRASS_IDENTITY)
+        m = br.weierstrass_to_montgomery(wa, wb, p)
+        self.assertIsNotNone(m)
+        self.assertEqual(br.weierstrass_point_to_montgomery(*m, p, br.WEIERSTRASS_IDENTITY), br.MONTGOMERY_IDENTITY)
+        points = self.points('1', a, d)
+        for pt in points:
+            u = br.edwards_point_to_montgomery(a, d, p, pt)
+            self.assertTrue(validate.on_curve('3', A, B, p, u))
+            self.assertEqual(br.montgomery_point_to_edwards(A, B, p, u), pt)
+            w = br.edwards_point_to_weierstrass(a, d, p, pt)
+            self.assertTrue(validate.on_curve('2', wa, wb, p, w))
+            v = br.weierstrass_point_to_montgomery(*m, p, w)
+            self.assertTrue(validate.on_curve('3', m[0], m[1], p, v))
+            self.assertEqual(br.montgomery_point_to_weierstrass(m[0], m[1], p, v), w)
+        # the maps are group homomorphisms
+        P, Q = points[:2]
+        w = tables.w_add(wa, p, br.edwards_point_to_weierstrass(a, d, p, P), br.edwards_point_to_weierstrass(a, d, p, Q))
+        self.assertEqual(br.edwards_point_to_weierstrass(a, d, p, dispatch.t_edwards.addpoints(a, d, p, P, Q)), w)
+
+    def test_dispatch_matches_native(self):
+        from base.curves import birational as br
+        from base.curves import dispatch
+
+        p = self.P
+        wa, wb = br.edwards_to_weierstrass(3, 5, p)
+        # the last Weierstrass curve has no Montgomery model and stays native
+        for opt, a, d in (('1', 3, 5), ('3', 3, 5), ('2', wa, wb), ('2', 2, 3)):
+            module = dispatch.MODULES[opt]
+            points = self.points(opt, a, d)
+            for P, Q in zip(points, points[1:]):
+                # the Montgomery module prints its steps
+                with contextlib.redirect_stdout(io.StringIO()):
+                    self.assertEqual(dispatch.addpoints(opt, a, d, p, P, Q), module.addpoints(a, d, p, P, Q))
+                    self.assertEqual(dispatch.doublepoint(opt, a, d, p, P), module.doublepoint(a, d, p, P))
+                    for k in (0, 1, 2, 12345, p + 7):
+                        self.assertEqual(dispatch.multiplypoint(opt, a, d, p, P, k), module.multiplypoint(a, d, p, P, k))
+
+
+def brute_group(opt, a, d, p):
+    """{Weierstrass image: point} of every point of the curve, the identity under None.
+
+    The points come from a table of the squares mod p rather than from a
+    square root, their images through dispatch.point_to_weierstrass()."""
+    from base.curves import dispatch
+
+    roots = {}
+    for y in range(p):
+        roots.setdefault(y*y % p, []).append(y)
+    module = dispatch.MODULES[opt]
+    points = {None: module.IDENTITY}
+    for x in range(p):
+        if opt == '1':
+            den = (d*x*x - 1) % p
+            if den == 0:
+                continue
+            rhs = (a*x*x - 1) * pow(den, -1, p) % p
+        elif opt == '2':
+            rhs = (x*x*x + a*x + d) % p
+        else:
+            rhs = (x*x*x + a*x*x + x) * pow(d, -1, p) % p
+        for y in roots.get(rhs, []):
+            if (x, y) != module.IDENTITY:
+                w = dispatch.point_to_weierstrass(opt, a, d, p, (x, y))
+                points[(int(w[0]), int(w[1]))] = (x, y)
+    return points
+
+
+class IncompleteEdwardsTest(SimpleTestCase):
+    # d = 4 is a square mod 1019, the Edwards curves have 2 (a = 2, not a
+    # square) and 4 (a = 9) points at infinity
+    P = 1019
+    CURVES = ((2, 4), (9, 4))
+
+    def models(self, a, d):
+        from base.curves import birational as br
+
+        p = self.P
+        return (('1', a, d), ('3', *br.edwards_to_montgomery(a, d, p)), ('2', *br.edwards_to_weierstrass(a, d, p)))
+
+    def check_model(self, opt, a, d):
+        from base.curves import dispatch, tables
+
+        p = self.P
+        points = brute_group(opt, a, d, p)
+        wa = dispatch.to_weierstrass(opt, a, d, p)[0]
+        n = len(points) + (dispatch.MODULES[opt].points_at_infinity(a, d, p) if opt == '1' else 0)
+        self.assertEqual(n, dispatch.find_points(opt, a, d, p))
+        images = [w for w in points if w is not None]
+        for W in images[::len(images) // 12] + [w for w in images if w[1] == 0]:
+            P = points[W]
+            for k in sorted({0, 1, 2, 3, n // 2, n // 4, 3*n // 4, n // 8, n - 1, n, n + 1}):
+                kW = tables.w_mul(wa, p, W, k)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if kW in points:
+                        self.assertEqual(dispatch.multiplypoint(opt, a, d, p, P, k), points[kW])
+                        self.assertEqual(dispatch.addpoints(opt, a, d, p, P, points[kW]),
+                                         points.get(tables.w_add(wa, p, W, kW)))
+                    else:
+                        # only an Edwards curve misses points
+                        self.assertEqual(opt, '1')
+                        with self.assertRaises(dispatch.PointAtInfinity):
+                            dispatch.multiplypoint(opt, a, d, p, P, k)
+                        k1W = tables.w_mul(wa, p, W, k - 1)
+                        if k1W in points:
+                            with self.assertRaises(dispatch.PointAtInfinity):
+                                dispatch.addpoints(opt, a, d, p, P, points[k1W])
+
+    def test_every_model_matches_brute_force(self):
+        from unittest import mock
+        from base.curves import tables
+
+        for a, d in self.CURVES:
+            for opt, ma, md in self.models(a, d):
+                with self.subTest(curve=(opt, ma, md)):
+                    # through the group table, then through the formulas
+                    self.check_model(opt, ma, md)
+                    with mock.patch.object(tables, 'LIMIT', 3):
+                        self.check_model(opt, ma, md)
+
+
+class PointOrderTest(TestCase):
+    P = 1019
+    CURVES = IncompleteEdwardsTest.CURVES
+
+    def brute_orders(self, opt, a, d, p, n):
+        """{point: order} of the curve, the least divisor k of n with kP = O."""
+        from base.curves import dispatch, tables
+
+        wa = dispatch.to_weierstrass(opt, a, d, p)[0]
+        divisors = [k for k in range(1, n + 1) if n % k == 0]
+        return {pt: next(k for k in divisors if tables.w_mul(wa, p, w, k) is None)
+                for w, pt in brute_group(opt, a, d, p).items()}
+
+    def check_orders(self, opt, a, d, p):
+        import random
+        from base.curves import dispatch, group, tables
+
+        curve = dispatch.RoutedCurve(opt)
+        n = dispatch.find_points(opt, a, d, p)
+        factors = tables.factor(n)
+        orders = self.brute_orders(opt, a, d, p, n)
+        # the Weierstrass identity has no coordinates to sort by
+        identity = curve.IDENTITY
+        points = ([identity] + sorted(pt for pt in orders if pt != identity))[::5]
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual([group.point_order(curve, a, d, p, pt, n, factors) for pt in points],
+                             [orders[pt] for pt in points])
+            self.assertEqual(group.batch_point_order(curve, a, d, p, points + points[:3], n, factors),
+                             [orders[pt] for pt in points + points[:3]])
+            random.seed(p)
+            g, k = group.random_generator(curve, a, d, p, n, factors)
+        self.assertEqual(orders[g], k)
+        self.assertEqual(k, max(orders.values()))
+
+    def test_every_model_matches_brute_force(self):
+        from unittest import mock
+        from base.curves import tables
+
+        for a, d in self.CURVES:
+            for opt, ma, md in IncompleteEdwardsTest.models(self, a, d):
+                with self.subTest(curve=(opt, ma, md)):
+                    self.check_orders(opt, ma, md, self.P)
+                    with mock.patch.object(tables, 'LIMIT', 3):
+                        self.check_orders(opt, ma, md, self.P)
+
+    def test_origin_is_not_the_identity(self):
+        from unittest import mock
+        from base.curves import birational as br
+        from base.curves import dispatch, s_weirstrass_curve as sw, tables
+
+        p = self.P
+        # b = 0, and a Montgomery curve whose Weierstrass image has b = 0
+        self.assertEqual(br.montgomery_to_weierstrass(0, 3, p)[1], 0)
+        R = sw.liftpoint(5, 0, p, 3)
+        self.assertNotEqual(sw.addpoints(5, 0, p, (0, 0), R), R)
+        self.assertEqual(sw.doublepoint(5, 0, p, (0, 0)), sw.IDENTITY)
+        for opt, a, d in (('2', 5, 0), ('3', 0, 3)):
+            with self.subTest(curve=(opt, a, d)):
+                self.assertEqual(dispatch.bsgs(opt, a, d, p, (0, 0), (0, 0)), 1)
+                IncompleteEdwardsTest.check_model(self, opt, a, d)
+                self.check_orders(opt, a, d, p)
+                with mock.patch.object(tables, 'LIMIT', 3):
+                    IncompleteEdwardsTest.check_model(self, opt, a, d)
+                    self.check_orders(opt, a, d, p)
+                    self.assertEqual(dispatch.bsgs(opt, a, d, p, (0, 0), (0, 0)), 1)
+        self.client.post('/', {'opt': '2', 'a': 5, 'd': p, 'p': p})
+        response = self.client.post('/calculate/0/', {'opt': '4', 'x1': 0, 'y1': 0})
+        self.assertEqual(response.context['res'], 'Point at infinity')
+
+    def test_order_through_a_point_at_infinity(self):
+        from base.curves import dispatch, group, tables
+
+        # 14932P, of order 4, lies at infinity on the Edwards curve, the
+        # point has order 59728 (= #E/3)
+        opt, a, d, p, pt = '1', 63090, 23780, 179623, (144453, 93331)
+        n = dispatch.find_points(opt, a, d, p)
+        wa = dispatch.to_weierstrass(opt, a, d, p)[0]
+        w = dispatch.point_to_weierstrass(opt, a, d, p, pt)
+        k = group.point_order(dispatch.RoutedCurve(opt), a, d, p, pt, n, tables.factor(n))
+        self.assertIsNone(tables.w_mul(wa, p, w, k))
+        for q, _ in tables.factor(k):
+            self.assertIsNotNone(tables.w_mul(wa, p, w, k // q))
+
+    def test_calc_and_batch_views(self):
+        from base.curves import dispatch
+
+        opt, a, d, p = '1', 9, 4, self.P
+        n = dispatch.find_points(opt, a, d, p)
+        orders = self.brute_orders(opt, a, d, p, n)
+        self.client.post('/', {'opt': opt, 'a': a, 'd': d, 'p': p})
+        points = sorted(pt for pt in orders if pt != (0, 1))[:4]
+        for pt in points:
+            response = self.client.post('/calculate/0/', {'opt': '8', 'x1': pt[0], 'y1': pt[1]})
+            self.assertEqual(response.context['res'], orders[pt])
+        response = self.client.post('/calculate/0/', {'opt': '9'})
+        g, k = response.context['res'].replace('(', '').replace(')', '').split(' of order ')
+        g = tuple(int(v) for v in g.split(', '))
+        self.assertEqual(orders[g], int(k))
+        response = self.client.post('/batch/', {'opt': '1', 'points': '\n'.join('{},{}'.format(*pt) for pt in points)})
+        self.assertEqual([k for _, k in response.context['rows']], [orders[pt] for pt in points])
+        response = self.client.post('/batch/', {'opt': '2', 'count': 3, 'points': ''})
+        rows = list(response.context['rows'])
+        self.assertEqual(len(rows), 3)
+        for g, k in rows:
+            self.assertEqual(orders[g], k)
+
+
+class GlvTest(SimpleTestCase):
+    # secp256k1
+    P = 2**256 - 2**32 - 977
+    N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+    def test_decompose_is_short_for_either_basis_order(self):
+        import random
+        from base.curves import glv
+
+        beta, lam, v1, v2, n = params = glv.glv_setup(7, self.P, self.N)
+        rng = random.Random(1)
+        # the swapped basis has a negative determinant
+        for basis in (params, (beta, lam, v2, v1, n)):
+            for _ in range(50):
+                k = rng.randrange(n)
+                k1, k2 = glv.decompose(k, basis)
+                self.assertEqual((k1 + k2*lam - k) % n, 0)
+                self.assertLessEqual(max(abs(k1), abs(k2)).bit_length(), 129)
+
+    def test_multiplypoint_matches(self):
+        import random
+        from base.curves import glv
+        from base.curves import s_weirstrass_curve as sw
+
+        # y^2 = x^3 + 2 over 100003 has prime order 99667 = 1 (mod 3)
+        p, b, n = 100003, 2, 99667
+        self.assertEqual(glv.cm_order(b, p), n)
+        beta, lam, v1, v2, n = params = glv.glv_setup(b, p, n)
+        rng = random.Random(2)
+        pt = next(filter(None, (sw.liftpoint(0, b, p, x) for x in range(1, p))))
+        for basis in (params, (beta, lam, v2, v1, n)):
+            for k in (0, 1, n - 1, n, n + 5) + tuple(rng.randrange(n) for _ in range(20)):
+                self.assertEqual(glv.multiplypoint(0, b, p, pt, k, basis), sw.multiplypoint(0, b, p, pt, k))
+
+
+class LaneEngineTest(SimpleTestCase):
+
+    def curves(self, p):
+        from base.curves import birational as br
+
+        wa, wb = br.edwards_to_weierstrass(3, 5, p)
+        # the last Weierstrass curve has no Montgomery model and runs the complete addition ladder
+        b = next(b for b in range(1, 100) if br.weierstrass_to_montgomery(1, b, p) is None)
+        return [('1', 3, 5), ('3', 3, 5), ('2', wa, wb), ('2', 1, b)]
+
+    def check(self, p, fold):
+        import random
+        from base.curves import dispatch, lanes
+
+        self.assertEqual(lanes.field(p).fold, fold)
+        rng = random.Random(p)
+        for opt, a, d in self.curves(p):
+            module = dispatch.MODULES[opt]
+            points = []
+            while len(points) < 6:
+                pt = module.liftpoint(a, d, p, rng.randrange(p))
+                if pt is not None:
+                    points.append(pt)
+            points += [module.IDENTITY, module.IDENTITY]
+            if opt == '1':
+                # of order 2
+                points.append((0, p - 1))
+            scalars = [0, 1, -1, 2, -12345, -rng.randrange(p), rng.randrange(p), 0, 7][:len(points)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = [dispatch.multiplypoint(opt, a, d, p, pt, k) for pt, k in zip(points, scalars)]
+                self.assertEqual(lanes.multiply(opt, a, d, p, points, scalars), expected)
+                # one point for every lane
+                self.assertEqual(lanes.multiply(opt, a, d, p, points[0], scalars),
+                                 [dispatch.multiplypoint(opt, a, d, p, points[0], k) for k in scalars])
+
+    def test_redc(self):
+        from gmpy2 import next_prime
+
+        self.check(int(next_prime(2**100)), False)
+
+    def test_fold(self):
+        self.check(2**127 - 1, True)
+
+
+class PointEncodingTest(SimpleTestCase):
+    P = 2**255 - 19
+
+    def points(self, opt, a, d, count=8):
+        import random
+        from base.curves import dispatch
+
+        module, rng, res = dispatch.MODULES[opt], random.Random(opt), []
+        while len(res) < count:
+            pt = module.liftpoint(a, d, self.P, rng.randrange(self.P))
+            if pt is not None:
+                res.append((pt[0] % self.P, pt[1] % self.P))
+        return res
+
+    def test_round_trips(self):
+        from base.curves import encoding
+
+        p = self.P
+        # Edwards and Montgomery with both parities of the coordinate that is left out
+        for opt, a, d in (('1', p - 1, 37095705934669439343138083508754565189542113879843219016388785533085940283555),
+                          ('2', p - 3, 7), ('3', 486662, 1)):
+            points = self.points(opt, a, d)
+            for compressed in (True, False):
+                data = encoding.encode_points(opt, p, points, compressed)
+                self.assertEqual(len(data), len(points) * encoding.point_size(opt, p, compressed))
+                decoded = encoding.decode_points(opt, a, d, p, data, compressed)
+                if opt == '3' and compressed:
+                    # u only, the point with the even v comes back
+                    points = [(u, v if v % 2 == 0 else p - v) for u, v in points]
+                self.assertEqual(decoded, points)
+        self.assertEqual(encoding.encode_point('2', p, encoding.WEIERSTRASS_IDENTITY), b'\x00')
+        identity = encoding.encode_points('2', p, [encoding.WEIERSTRASS_IDENTITY])
+        self.assertEqual(encoding.decode_points('2', p - 3, 7, p, identity), [encoding.WEIERSTRASS_IDENTITY])
+        self.assertEqual(encoding.decode_point('1', p - 1, 5, p, encoding.encode_point('1', p, (0, 1))), (0, 1))
+
+    def test_rejects_bad_encodings(self):
+        from gmpy2 import legendre
+        from base.curves import encoding
+
+        p, a, b = self.P, self.P - 3, 7
+        x, y = self.points('2', a, b, 1)[0]
+        data = encoding.encode_point('2', p, (x, y), False)
+        with self.assertRaisesRegex(ValueError, 'not on the curve'):
+            encoding.decode_point('2', a, b, p, encoding.encode_point('2', p, (x, y + 1), False), False)
+        with self.assertRaisesRegex(ValueError, 'prefix'):
+            encoding.decode_point('2', a, b, p, b'\x05' + data[1:], False)
+        with self.assertRaisesRegex(ValueError, 'prefix'):
+            encoding.decode_point('2', a, b, p, b'\x04' + data[1:1 + encoding.field_size(p)])
+        # an x with x^3 + ax + b a non residue
+        bad = next(c for c in range(1, p) if legendre((c**3 + a*c + b) % p, p) == -1)
+        with self.assertRaisesRegex(ValueError, 'no point'):
+            encoding.decode_point('2', a, b, p, encoding.encode_point('2', p, (bad, 0)))
+        with self.assertRaises(ValueError):
+            encoding.decode_points('2', a, b, p, data[:-1], False)
+
+
+class SpecialPrimeTest(SimpleTestCase):
+    P256 = 2**256 - 2**224 + 2**192 + 2**96 - 1
+
+    def test_detect_and_describe(self):
+        from gmpy2 import next_prime
+        from base.curves import primes
+
+        self.assertEqual(primes.detect(2**521 - 1), ('mersenne', 521, 1))
+        self.assertEqual(primes.describe(2**127 - 1), 'Mersenne prime 2^127 - 1')
+        self.assertEqual(primes.detect(2**255 - 19), ('pseudo-mersenne', 255, 19))
+        self.assertEqual(primes.describe(2**256 - 2**32 - 977), 'pseudo-Mersenne prime 2^256 - 4294968273')
+        self.assertEqual(primes.detect(self.P256)[0], 'solinas')
+        self.assertEqual(primes.describe(self.P256), 'Solinas prime 2^256 - 2^224 + 2^192 + 2^96 - 1')
+        for p in (int(next_prime(3**150)), 1000003, 2**61 - 1):
+            self.assertIsNone(primes.detect(p))
+            self.assertIsNone(primes.describe(p))
+
+    def test_reducers_agree_with_mod(self):
+        import random
+        from gmpy2 import next_prime
+        from base.curves import primes
+
+        rng = random.Random(3)
+        for p in (2**521 - 1, 2**255 - 19, 2**256 - 2**32 - 977, self.P256, int(next_prime(3**150))):
+            reduce = primes.reducer(p)
+            values = [0, 1, p - 1, p, p + 1, -1, -p, (p - 1)**2, 4*(p - 1)**2]
+            values += [rng.randrange(p) * rng.randrange(p) for _ in range(200)]
+            values += [rng.randrange(p) - rng.randrange(p) * rng.randrange(p) for _ in range(50)]
+            for x in values:
+                self.assertEqual(reduce(x), x % p)
+        self.assertIsNotNone(primes.fast_reducer(2**521 - 1))
+        self.assertIsNone(primes.fast_reducer(2**255 - 19))
+
+
+class GroupTableTest(SimpleTestCase):
+    # y^2 = x^3 + 7 over 1009 is Z/147 x Z/7, not cyclic
+    CURVE = (0, 7, 1009)
+
+    def test_matches_formulas(self):
+        from base.curves import s_weirstrass_curve as sw, shards, tables
+
+        a, d, p = self.CURVE
+        table = tables.build('2', a, d, p)
+        self.assertEqual((table.n1, table.n2), (147, 7))
+        points = list(shards.points_range('2', a, d, p, 0, p))[::37]
+        for p1, p2 in zip(points, points[1:]):
+            self.assertEqual(table.add(p1, p2), sw.addpoints(a, d, p, p1, p2))
+            self.assertEqual(table.multiply(p1, 1000), sw.multiplypoint(a, d, p, p1, 1000))
+            k = 1000 % table.order(p2)
+            self.assertEqual(table.log(sw.multiplypoint(a, d, p, p2, k), p2), k)
+
+
+class SharedTableTest(SimpleTestCase):
+    KEY = ('2', 3, 5, 1013)
+    # a second process attaches to the table this one built
+    SCRIPT = '''
+import json
+from base.curves import tables
+t = tables.attach({!r})
+print(json.dumps([t.n1, t.n2, t.xs.flags.writeable, t.multiply(t.point(3), 100)]))
+'''
+
+    def test_attach_from_another_process(self):
+        from base.curves import tables
+
+        table = tables.lookup(*self.KEY)
+        self.assertFalse(table.xs.flags.writeable)
+        out = subprocess.run([sys.executable, '-c', self.SCRIPT.format(self.KEY)], cwd=settings.BASE_DIR,
+                             capture_output=True, text=True, check=True).stdout
+        self.assertEqual(json.loads(out), [table.n1, table.n2, False, list(table.multiply(table.point(3), 100))])
+        tables.evict(self.KEY, tables._REGISTRY.pop(self.KEY))
+        self.assertIsNone(tables.attach(self.KEY))
+
+    def test_names_are_secret(self):
+        from unittest import mock
+        from base.curves import shared
+
+        name = shared.segment_name(self.KEY)
+        self.assertEqual(name, shared.segment_name(self.KEY))
+        shared.secret.cache_clear()
+        try:
+            with mock.patch.dict(os.environ, {'TEDWARDS_SHM_SECRET': 'another deployment'}):
+                self.assertNotEqual(shared.segment_name(self.KEY), name)
+        finally:
+            shared.secret.cache_clear()
+        self.assertEqual(shared.segment_name(self.KEY), name)
+
+    def test_foreign_segment_ignored(self):
+        import numpy as np
+        from unittest import mock
+        from multiprocessing import shared_memory
+        from base.curves import shared
+
+        key = ('2', 3, 7, 1013)
+        header = json.dumps({'key': repr(key), 'meta': {}, 'arrays': [['xs', '<i8', [10**6], 0]]}).encode()
+        for content in (header.replace(b'1013', b'1019'), header):
+            # a segment of someone else, or one whose arrays run past its end
+            shm = shared_memory.SharedMemory(name=shared.segment_name(key), create=True, size=4096)
+            try:
+                shm.buf[8:8 + len(content)] = content
+                shm.buf[:8] = len(content).to_bytes(8, 'little')
+                # the segment stays registered to this process, which unlinks it
+                with mock.patch.object(shared.resource_tracker, 'unregister'):
+                    self.assertIsNone(shared.attach(key))
+                    self.assertIsNone(shared.publish(key, {}, {'xs': np.arange(4)}))
+            finally:
+                shm.close()
+                shm.unlink()
+
+
+class MovReductionTest(SimpleTestCase):
+    # y^2 = x^3 + x over 2^31 - 1 is supersingular, #E = p + 1 = 2^31
+    P = 2**31 - 1
+
+    def test_division_through_the_pairing(self):
+        from base.curves import mov, tables
+
+        p, pt = self.P, (5, 0)
+        for x in range(2, 100):
+            f = (x**3 + x) % p
+            if pow(f, (p - 1)//2, p) == 1:
+                pt = (x, pow(f, (p + 1)//4, p))
+                break
+        n = p + 1
+        while tables.w_mul(1, p, pt, n // 2) is None:
+            n //= 2
+        self.assertEqual(mov.embedding_degree(n, p), 2)
+        k = 123456789 % n
+        self.assertEqual(mov.solve(1, 0, p, pt, tables.w_mul(1, p, pt, k), n), k)
+
+
+class SmartAttackTest(SimpleTestCase):
+    # 4p = 1 + 3v^2, one of the y^2 = x^3 + b over p has p points
+    V = 2**32 + 1
+
+    def test_anomalous_division(self):
+        from base.curves import dispatch, smart, tables
+
+        p = (1 + 3*self.V**2) // 4
+        b = next(b for b in range(1, 100) if smart.is_anomalous(0, b, p))
+        self.assertFalse(smart.is_anomalous(1, b, p))
+        x = next(x for x in range(1, 100) if pow((x**3 + b) % p, (p - 1)//2, p) == 1)
+        pt = (x, dispatch.MODULES['2'].liftpoint(0, b, p, x)[1])
+        k = 2**100 % p
+        self.assertEqual(dispatch.bsgs('2', 0, b, p, tables.w_mul(0, p, pt, k), pt), k)
+
+
+class ValidationTest(SimpleTestCase):
+    # (opt, a, d) per model, over a small prime (NumPy int64) and a
+    # large one (limbs)
+    CURVES = [('1', 3, 7), ('2', 2, 3), ('3', 5, 3)]
+    PRIMES = [1019, 2**61 - 1]
+
+    def test_batch_matches_single(self):
+        import random
+        from base.curves import dispatch, validate
+
+        rng = random.Random(1)
+        for opt, a, d in self.CURVES:
+            for p in self.PRIMES:
+                points = [dispatch.MODULES[opt].IDENTITY]
+                while len(points) < 20:
+                    x = rng.randrange(p)
+                    pt = dispatch.MODULES[opt].liftpoint(a, d, p, x)
+                    if pt is not None:
+                        points += [pt, (pt[0], pt[1] + 1), (pt[0] + p, pt[1] - p)]
+                single = [validate.on_curve(opt, a, d, p, pt) for pt in points]
+                self.assertEqual(validate.batch_on_curve(opt, a, d, p, points), single)
+                self.assertEqual(single[:4], [True, True, False, True])
+
+    def test_subgroup(self):
+        from base.curves import tables, validate
+
+        # y^2 = x^3 + 7 over 1009 is Z/147 x Z/7
+        table = tables.build('2', 0, 7, 1009)
+        points = [table.point(i) for i in range(0, table.n, 50)] + [table.point(147*j) for j in range(7)]
+        inside = [table.order(pt) in (1, 7) for pt in points]
+        self.assertEqual(validate.batch_in_subgroup('2', 0, 7, 1009, points, 7), inside)
+        self.assertEqual([validate.in_subgroup('2', 0, 7, 1009, pt, 7) for pt in points], inside)
+
+
+class FormTest(SimpleTestCase):
+    def test_invalid_opt(self):
+        from base import forms
+
+        # every field that depends on opt is still cleaned when opt fails
+        for form in (forms.adp_form({'opt': '9', 'a': 0, 'd': 5, 'p': 101}),
+                     forms.opt_form({'opt': '99', 'x1': 1, 'y1': 2, 'message': 'm'}, curve=('1', 3, 5, 101)),
+                     forms.batch_form({'opt': '9', 'points': '0,1', 'count': 3}, curve=('1', 3, 5, 101))):
+            with self.subTest(form=type(form).__name__):
+                self.assertFalse(form.is_valid())
+                self.assertEqual(list(form.errors), ['opt'])
+
+
+class HashToCurveTest(SimpleTestCase):
+    # P-256, RFC 9380 J.1.1 (P256_XMD:SHA-256_SSWU_RO_, msg = "")
+    P256 = (0xffffffff00000001000000000000000000000000ffffffffffffffffffffffff,
+            0x5ac635d8aa3a93e7b3ebbd55769886bc651d06b0cc53b0f63bce3c3e27d2604b)
+    DST = b'QUUX-V01-CS02-with-P256_XMD:SHA-256_SSWU_RO_'
+    POINT = (0x2c15230b26dbc6fc9a37051158c95b79656e17a1a920b11394ca91c44247d3e4,
+             0x8a7a74985cc5c776cdfe4b1f19884970453912e9d31528c060be9ab5c43e8415)
+
+    def test_rfc_vector(self):
+        from base.curves import hashing
+
+        p, b = self.P256
+        self.assertEqual(hashing.hash_to_curve('2', -3 % p, b, p, b'', self.DST), self.POINT)
+
+    def test_points_on_curve(self):
+        import random
+        from base.curves import hashing, validate
+
+        rng = random.Random(2)
+        # (opt, a, d, method) : Elligator 2 on both Montgomery based
+        # models, SWU, and try and increment for j = 0
+        curves = [('1', 3, 7, 'elligator2'), ('3', 486662, 1, 'elligator2'),
+                  ('2', 2, 3, 'sswu'), ('2', 0, 7, 'increment')]
+        for p in (1019, 2**127 - 1):
+            for opt, a, d, how in curves:
+                self.assertEqual(hashing.method(opt, a, d, p), how)
+                points = hashing.sample(opt, a, d, p, 50, rng)
+                points += hashing.batch_hash_to_curve(opt, a, d, p, ['a', 'b'])
+                self.assertTrue(all(validate.batch_on_curve(opt, a, d, p, points)))
+                us = [rng.randrange(p) for _ in range(10)]
+                self.assertEqual(hashing.batch_map_to_curve(opt, a, d, p, us),
+                                 [hashing.map_to_curve(opt, a, d, p, u) for u in us])
+
+
+class OutOfCoreBsgsTest(SimpleTestCase):
+    def test_matches_and_reuses_table(self):
+        import random
+        from base.curves import babysteps, s_weirstrass_curve as sw, tables
+
+        a, b, p = 2, 3, 1000003
+        n = sw.find_points(a, b, p)
+        rng = random.Random(4)
+        P = tables.w_random(a, b, p, rng)
+        with tempfile.TemporaryDirectory() as tmp:
+            for k in [0, 1, n - 1] + [rng.randrange(n) for _ in range(10)]:
+                Q = tables.w_mul(a, p, P, k) or sw.IDENTITY
+                self.assertEqual(tables.w_mul(a, p, P, babysteps.solve(a, b, p, Q, P, n, tmp)) or sw.IDENTITY, Q)
+            self.assertEqual(len(os.listdir(tmp)), 1)
+            records, m = babysteps.open_table(a, b, p, P, 10, tmp)
+            self.assertTrue((records['key'][1:] >= records['key'][:-1]).all())
+            self.assertEqual(sorted(records['index']), list(range(1, m + 1)))
+
+    def test_tables_are_evicted(self):
+        import random
+        from unittest import mock
+        from base.curves import babysteps, tables
+
+        a, b, p = 2, 3, 1000003
+        rng = random.Random(5)
+        bases = [tables.w_random(a, b, p, rng) for _ in range(4)]
+        self.assertEqual(babysteps.record_dtype().itemsize, babysteps.RECORD_BYTES)
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(babysteps, 'MAX_BYTES', 2500 * babysteps.RECORD_BYTES):
+            def table(P):
+                return babysteps.open_table(a, b, p, P, 1000, tmp)[0].filename
+            first, second = table(bases[0]), table(bases[1])
+            # the first table is used again, the second is now the least recently used
+            os.utime(second, ns=(0, 0))
+            table(bases[0])
+            third = table(bases[2])
+            self.assertEqual(sorted(os.listdir(tmp)), sorted(os.path.basename(f) for f in (first, third)))
+            # a table above MAX_BYTES on its own is kept until the next one
+            big = babysteps.open_table(a, b, p, bases[3], 3000, tmp)[0].filename
+            self.assertEqual(os.listdir(tmp), [os.path.basename(big)])
+
+    def test_private_directory(self):
+        import random
+        import stat
+        from base.curves import babysteps, tables
+
+        a, b, p = 2, 3, 1000003
+        P = tables.w_random(a, b, p, random.Random(6))
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = os.path.join(tmp, 'bsgs')
+            babysteps.open_table(a, b, p, P, 10, directory)
+            self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+            # a directory others can reach is not used
+            os.chmod(directory, 0o755)
+            with self.assertRaises(PermissionError):
+                babysteps.open_table(a, b, p, P, 10, directory)
+
+
+class LoadTestCommandTest(TestCase):
+    def test_baseline_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            options = dict(users=1, sessions=1, curves=['small'], pages=1, ops=3, seed=7, stdout=io.StringIO())
+            call_command('loadtest', save=path, **options)
+            with open(path) as f:
+                results = json.load(f)['results']
+            self.assertIn('home POST | small', results)
+            self.assertEqual(sum(r['errors'] for r in results.values()), 0)
+            call_command('loadtest', compare=path, tolerance=1e9, **options)
+
+
+class ResultStoreTest(TestCase):
+    CURVE = ('2', 2, 3, 1019)
+
+    def test_store_and_round_trip(self):
+        from base import results
+        from base.curves import dispatch
+        from base.models import Result
+
+        opt, a, d, p = self.CURVE
+        pt = next(filter(None, (dispatch.MODULES[opt].liftpoint(a, d, p, x) for x in range(1, p))))
+        q = dispatch.multiplypoint(opt, a, d, p, pt, 77)
+        self.assertIsNone(results.lookup_log(opt, a, d, p, q, pt))
+        results.store_log(opt, a, d, p, q, pt, 77)
+        results.store_multiple(opt, a, d, p, pt, 77, q)
+        results.clear_cache()
+        self.assertEqual(results.lookup_log(opt, a, d, p, q, pt), 77)
+        self.assertEqual(results.lookup_multiple(opt, a, d, p, pt, 77), q)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'results.ndjson')
+            call_command('results', 'export', path, stdout=io.StringIO())
+            Result.objects.all().delete()
+            results.clear_cache()
+            call_command('results', 'import', path, stdout=io.StringIO())
+        self.assertEqual(results.lookup_log(opt, a, d, p, q, pt), 77)
+
+    def test_baby_steps_reused(self):
+        from base.curves import s_weirstrass_curve as sw
+
+        a, d, p = 2, 3, 100003
+        n = sw.find_points(a, d, p)
+        pt = next(filter(None, (sw.liftpoint(a, d, p, x) for x in range(1, p))))
+        for k in (12345, 678, 99999):
+            q = sw.multiplypoint(a, d, p, pt, k)
+            self.assertEqual(sw.multiplypoint(a, d, p, pt, sw.bsgs(a, d, p, q, pt, n)), q)
+        self.assertIn((a, d, p, pt), sw._BABY)
+
+
+class CurveSearchTest(SimpleTestCase):
+
+    def test_hasse_order(self):
+        import random
+        from base.curves import search, shards
+
+        p, rng = 100003, random.Random(1)
+        for a, b in ((2, 3), (5, 7), (11, 13)):
+            self.assertEqual(search.hasse_order(a, b, p, rng), shards.count_range('2', a, b, p, 0, p) + 1)
+
+    def test_search(self):
+        from gmpy2 import is_prime
+        from base.curves import search
+
+        p = 1000003
+        found = list(search.search(p, ['1', '2'], range(1, 40), range(1, 40), jobs=1, limit=3, twist_cofactor=4))
+        self.assertEqual(len(found), 3)
+        for res in found:
+            self.assertTrue(search.valid(res['opt'], res['a'], res['d'], p))
+            self.assertEqual(res['order'], res['cofactor'] * res['subgroup_order'])
+            self.assertTrue(is_prime(res['subgroup_order']))
+            self.assertTrue(search.twist_secure(res['order'], p, 4))
+
+
+class CountPointsCommandTest(SimpleTestCase):
+    CURVE = ['1', '3', '5', '10007']
+
+    def interrupted(self, name, after, *args):
+        from unittest import mock
+        from base.curves import shards
+
+        worker, calls = getattr(shards, name), []
+        def stop(*a):
+            calls.append(a)
+            if len(calls) > after:
+                raise KeyboardInterrupt
+            return worker(*a)
+        with mock.patch.object(shards, name, stop), self.assertRaises(KeyboardInterrupt):
+            call_command('countpoints', *self.CURVE, *args, stdout=io.StringIO())
+
+    def command(self, *args):
+        out = io.StringIO()
+        call_command('countpoints', *self.CURVE, '--jobs', '1', '--block', '100', *args, stdout=out)
+        return json.loads(out.getvalue())
+
+    def test_count_resumes(self):
+        from base.curves import dispatch, shards
+
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = os.path.join(tmp, 'count.json')
+            self.interrupted('count_shard', 5, '--jobs', '1', '--block', '100', '--checkpoint', checkpoint)
+            with open(checkpoint) as f:
+                self.assertEqual(len(json.load(f)['done']), 5)
+            res = self.command('--checkpoint', checkpoint)
+            with open(checkpoint) as f:
+                self.assertEqual(len(json.load(f)['done']), len(shards.shards(10007, 100)))
+        self.assertEqual(res['order'], dispatch.find_points('1', 3, 5, 10007))
+
+    def test_points_resume(self):
+        from base.curves import shards
+
+        with tempfile.TemporaryDirectory() as tmp:
+            whole, part = os.path.join(tmp, 'whole'), os.path.join(tmp, 'part')
+            expected = self.command('--points', whole)
+            self.interrupted('write_shard', 7, '--jobs', '1', '--block', '100', '--points', part)
+            self.assertFalse(os.path.exists(os.path.join(part, 'points.txt')))
+            res = self.command('--points', part)
+            self.assertEqual(res['affine_points'], expected['affine_points'])
+            with open(res['path']) as f, open(expected['path']) as g:
+                self.assertEqual(f.read(), g.read())
+        self.assertEqual(res['affine_points'], len(list(shards.points_range('1', 3, 5, 10007, 0, 10007))))
+
+
+class SearchApiTest(SimpleTestCase):
+
+    def test_limits(self):
+        from unittest import mock
+        from base import views
+
+        response = self.client.get('/api/search/', {'p': 2**127 - 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('below 2^64', response.json()['error'])
+        with mock.patch.object(views.search, 'search', return_value=iter([{'opt': '2'}])) as search:
+            response = self.client.get('/api/search/', {'p': 1000003, 'limit': 1})
+            self.assertEqual(b''.join(response.streaming_content), b'{"opt": "2"}\n')
+        self.assertEqual(search.call_args.kwargs['jobs'], views.SEARCH_JOBS)
+
+
+class CurveQueryTest(SimpleTestCase):
+    # not a prime, a singular curve, primes without a short Weierstrass model
+    BAD = ('2:2:3:15', '1:3:3:101', '2:0:0:101', '1:3:5:2', '2:2:2:3')
+
+    def test_bad_curves_rejected(self):
+        for key in self.BAD:
+            with self.subTest(key=key):
+                for url in ('/api/points/0/', '/api/points/point/0/', '/api/hash/', '/export/0/'):
+                    self.assertEqual(self.client.get(url, {'curve': key}).status_code, 400)
+                response = self.client.post('/api/validate/?curve=' + key, '{"points": [[0, 1]]}', content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_curve_reduced(self):
+        response = self.client.get('/api/points/0/', {'curve': '1:104:4:101'})
+        self.assertEqual(response.json()['curve'], '1:3:4:101')
+
+    def test_hash_at_infinity(self):
+        # d = 4 is a square mod 7, the sums of the last two messages lie at infinity
+        response = self.client.get('/api/hash/', {'curve': '1:3:4:7', 'msg': ['a', 'b', 'c'], 'random': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['points'], [[0, 6], None, None])
+        self.assertEqual(self.client.get('/api/hash/', {'curve': '2:2:3:{}'.format(2**607 - 1)}).status_code, 400)
+
+
+class SubgroupTest(TestCase):
+    def validate(self, key, points):
+        return self.client.post('/api/validate/?curve=' + key, json.dumps({'points': points, 'subgroup': True}),
+                                content_type='application/json')
+
+    def test_validate_never_counts(self):
+        from unittest import mock
+        from base import catalogue
+        from base.models import Curve
+
+        with mock.patch.object(catalogue, 'count_blocks') as count:
+            response = self.validate('2:2:3:2305843009213693951', [[0, 1]])
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(self.validate('2:2:3:{}'.format(2**607 - 1), [[0, 1]]).status_code, 400)
+        count.assert_not_called()
+        self.assertFalse(Curve.objects.exists())
+        catalogue.facts('1', 3, 5, 1019)
+        response = self.validate('1:3:5:1019', [[0, 1], [1, 1]])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['in_subgroup'], [True, False])
+
+    def test_division_by_itself(self):
+        from base import views
+        from base.curves import dispatch
+
+        # d = 4 is a square, multiples of these points go through the
+        # points at infinity of the Edwards curve
+        opt, a, d, p = '1', 9, 4, 1019
+        curve = dispatch.RoutedCurve(opt)
+        for pt in brute_group(opt, a, d, p).values():
+            if pt != (0, 1):
+                with self.subTest(point=pt):
+                    self.assertEqual(views.divide(curve, opt, a, d, p, pt, pt)[0], 1)
+
+
+class SeekPointsTest(TestCase):
+
+    def test_seek_by_index(self):
+        from base import catalogue
+        from base.curves import shards
+        from base.models import PointBlock
+
+        opt, a, d, p = '1', 3, 5, 10007
+        points = list(shards.points_range(opt, a, d, p, 0, p))
+        for index in (0, 999, 5432, len(points) - 3, len(points)):
+            x, y = catalogue.seek_points(opt, a, d, p, index)
+            self.assertEqual(list(zip(x, y)), points[index:index + catalogue.PAGE_POINTS])
+        # the last page counted every block
+        self.assertEqual(PointBlock.objects.count(), catalogue.block_count(catalogue.lookup(opt, a, d, p)))
+
+    def test_order_from_blocks(self):
+        from base import catalogue
+        from base.curves import s_weirstrass_curve
+
+        # counted apart from the blocks : every page of generatePoints() and the point at infinity
+        a, b, p = 2, 3, 10007
+        points = sum(len(s_weirstrass_curve.generatePoints(a, b, p, x)[0]) for x in range(0, p, 1000))
+        catalogue.seek_points('2', a, b, p, points)
+        self.assertEqual(int(catalogue.facts('2', a, b, p).order), points + 1)
+
+    def test_generate_points_order(self):
+        from base import catalogue
+
+        # the root generatePoints() takes for p = 1 mod 4, and the (x,0) points of an Edwards curve
+        for opt, a, d, p, point in (('3', 3, 5, 10009, (10, 8974)), ('1', 4, 7, 1013, (506, 0))):
+            module = catalogue.curve_module(opt)
+            with self.subTest(curve=(opt, a, d, p)), contextlib.redirect_stdout(io.StringIO()):
+                pages = [module.generatePoints(a, d, p, x) for x in range(0, p, 1000)]
+                points = [pt for x, y in pages for pt in zip(x, y)]
+                self.assertIn(point, points)
+                self.assertEqual(module.count_points(a, d, p, 0, p), len(points))
+                for index in range(0, len(points), catalogue.PAGE_POINTS):
+                    x, y = catalogue.seek_points(opt, a, d, p, index)
+                    self.assertEqual(list(zip(x, y)), points[index:index + catalogue.PAGE_POINTS])
+
+    def test_large_field_refused(self):
+        for url in ('/api/points/point/5/?curve=2:2:3:2305843009213693951',
+                    '/api/curves/2:2:3:2305843009213693951/points/point/5/',
+                    '/curves/2:2:3:2305843009213693951/points/point/5/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class CommandLineTest(SimpleTestCase):
+
+    def run_cli(self, lines, *args, curve='2:2:3:1019'):
+        done = subprocess.run([sys.executable, '-m', 'base.curves', '--curve', curve, *args],
+                              input=''.join(json.dumps(line) + '\n' for line in lines), cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True)
+        self.stderr = done.stderr
+        # every line of stdout is a result
+        return [json.loads(line) for line in done.stdout.splitlines()]
+
+    def test_operations(self):
+        from base.curves import dispatch
+
+        enumerated = self.run_cli([{'op': 'enumerate', 'count': 5}])[0]['result']
+        pt = tuple(enumerated[-1])
+        lines = [
+            {'id': 'a', 'op': 'add', 'p1': list(pt), 'p2': list(pt)},
+            {'id': 'm', 'op': 'mul', 'point': list(pt), 'k': 77},
+            {'id': 'l', 'op': 'dlog', 'point': list(dispatch.multiplypoint('2', 2, 3, 1019, pt, 77)), 'base': list(pt)},
+            {'id': 'c', 'op': 'count'},
+            {'id': 'x', 'op': 'mul', 'point': [1, 1], 'k': 2},
+        ]
+        for jobs in ('1', '2'):
+            res = self.run_cli(lines, '--jobs', jobs)
+            self.assertEqual([r['id'] for r in res], ['a', 'm', 'l', 'c', 'x'])
+            self.assertEqual(tuple(res[0]['result']), dispatch.doublepoint('2', 2, 3, 1019, pt))
+            self.assertEqual(tuple(res[1]['result']), dispatch.multiplypoint('2', 2, 3, 1019, pt, 77))
+            self.assertEqual(dispatch.multiplypoint('2', 2, 3, 1019, pt, res[2]['result']), tuple(lines[2]['point']))
+            self.assertEqual(res[3]['result'], dispatch.find_points('2', 2, 3, 1019))
+            self.assertIn('not on the curve', res[4]['error'])
+
+    def test_prints_kept_off_stdout(self):
+        # (0, 0) runs in the Montgomery module, which prints its steps
+        lines = [{'op': 'mul', 'point': [0, 0], 'k': 3}, {'op': 'add', 'p1': [0, 0], 'p2': [0, 0]}]
+        for jobs in ('1', '2'):
+            res = self.run_cli(lines, '--jobs', jobs, curve='3:3:5:100003')
+            self.assertEqual(res, [{'result': [0, 0]}, {'result': [0, 1]}])
+            self.assertIn('multiplied by 3', self.stderr)
+
+
+class SingleFlightTest(SimpleTestCase):
+
+    def test_concurrent_calls_share_one_computation(self):
+        import threading
+        import time
+        from base import singleflight
+
+        calls, out = [], []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 42
+
+        threads = [threading.Thread(target=lambda: out.append(singleflight.run(('test', 1), compute)))
+                   for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(out, [42] * 20)
+
+    def test_lookup_after_lock(self):
+        from base import singleflight
+
+        self.assertEqual(singleflight.run(('test', 2), lambda: 1, lambda: 2), 2)
+        self.assertEqual(singleflight.run(('test', 2), lambda: 1, lambda: None), 1)
+
+    def test_private_lock_directory(self):
+        import stat
+        from unittest import mock
+        from base import singleflight
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = os.path.join(tmp, 'locks')
+            with mock.patch.object(singleflight, 'DIRECTORY', directory):
+                self.assertEqual(singleflight.run(('test', 3), lambda: 1), 1)
+                self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+                path = singleflight.lock_path(('test', 3))
+                self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+                # a directory others can reach is left alone
+                os.chmod(directory, 0o755)
+                self.assertEqual(singleflight.run(('test', 4), lambda: 2), 2)
+                self.assertFalse(os.path.exists(singleflight.lock_path(('test', 4))))
+
+
+class DivisionPlannerTest(SimpleTestCase):
+    # y^2 = x^3 - 3x + 1 over the next prime after 2^44, #E = 3*5*2333*2963*169661
+    P = 17592186044423
+    ORDER = 17592180477285
+
+    def test_pohlig_hellman_chosen_for_smooth_order(self):
+        import random
+        from base.curves import planner, tables
+
+        p, rng = self.P, random.Random(1)
+        pt = tables.w_random(p - 3, 1, p, rng)
+        factors = [[3, 1], [5, 1], [2333, 1], [2963, 1], [169661, 1]]
+        k = 1234567890123
+        q = tables.w_mul(p - 3, p, pt, k)
+        chosen = planner.plan('2', p - 3, 1, p, q, pt, self.ORDER, factors)
+        self.assertEqual(chosen['method'], 'pohlig-hellman')
+        self.assertLess(chosen['seconds'], chosen['options'][-1]['seconds'])
+        self.assertEqual(planner.solve('2', p - 3, 1, p, q, pt, self.ORDER, factors, chosen), k % chosen['order'])
+
+    def test_every_model(self):
+        from base.curves import dispatch, planner
+
+        for opt, a, d, p in (('1', 3, 5, 100003), ('3', 3, 5, 100003), ('2', 2, 3, 1019)):
+            module = dispatch.MODULES[opt]
+            pt = next(filter(None, (module.liftpoint(a, d, p, x) for x in range(2, p))))
+            n = dispatch.find_points(opt, a, d, p)
+            q = dispatch.multiplypoint(opt, a, d, p, pt, 777)
+            k = planner.solve(opt, a, d, p, q, pt, n, planner.factorise(n))
+            self.assertEqual(dispatch.multiplypoint(opt, a, d, p, pt, k), q)
+
+    def test_wrong_answer_falls_through(self):
+        from unittest import mock
+        from base.curves import dispatch, planner
+
+        opt, a, d, p = '2', 2, 3, 1019
+        pt = next(filter(None, (dispatch.MODULES[opt].liftpoint(a, d, p, x) for x in range(2, p))))
+        n = dispatch.find_points(opt, a, d, p)
+        q = dispatch.multiplypoint(opt, a, d, p, pt, 777)
+        chosen = {'order': n, 'options': [{'method': 'mov'}, {'method': 'bsgs'}]}
+        with mock.patch.object(planner.mov, 'solve', return_value=778) as solve:
+            k = planner.solve(opt, a, d, p, q, pt, n, chosen=chosen)
+        solve.assert_called_once()
+        self.assertEqual(dispatch.multiplypoint(opt, a, d, p, pt, k), q)
+
+
+class EcmFactoringTest(SimpleTestCase):
+    def test_factorise(self):
+        from gmpy2 import is_prime
+        from base.curves import ecm
+
+        for n in (1, 2, 1000003 * 1000033, 101**3 * 1000000007, 18446744073709551557**2,
+                  (2**31 - 1)**2 * (2**61 - 1), 2**64 + 1, 12 * 1099511627791 * 1125899906842597):
+            factors = ecm.factorise(n, jobs=1)
+            product = 1
+            for q, e in factors:
+                self.assertTrue(is_prime(q))
+                product *= q**e
+            self.assertEqual(product, n)
+            self.assertEqual([q for q, _ in factors], sorted(q for q, _ in factors))
+
+    def test_ecm_finds_a_40_bit_factor(self):
+        from base.curves import ecm
+
+        # neither factor is within reach of trial division or rho
+        n = 1099511627791 * 1125899906842597
+        g = ecm.ecm(n, jobs=1)
+        self.assertIn(g, (1099511627791, 1125899906842597))
+
+
+class HttpCacheTest(TestCase):
+    URL = '/curves/1:3:4:101/points/0/'
+
+    def test_conditional_get(self):
+        first = self.client.get(self.URL, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', first['Cache-Control'])
+        self.assertFalse(first['ETag'].startswith('W/'))
+        again = self.client.get(self.URL, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], first['ETag'])
+
+    def test_compressed_body_and_identity_etag(self):
+        import gzip
+
+        compressed = self.client.get(self.URL, HTTP_ACCEPT_ENCODING='gzip')
+        plain = self.client.get(self.URL)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertNotEqual(plain['ETag'], compressed['ETag'])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+    def test_canonical_redirect(self):
+        response = self.client.get('/curves/1:104:4:101/points/point/3/')
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response['Location'], '/curves/1:3:4:101/points/point/3/')
+        self.assertEqual(self.client.get('/api/curves/1:3:4:100/points/0/').status_code, 400)
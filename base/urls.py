@@ -4,5 +4,17 @@ from . import views
 urlpatterns = [
     path('',views.home,name="home"),
     path('calculate/<str:start>/',views.calc,name="calculate"),
+    path('calculate/point/<int:index>/',views.calc,name="calculate_point"),
+    path('curves/<str:key>/points/<int:start>/',views.points,name="curve_points"),
+    path('curves/<str:key>/points/point/<int:index>/',views.points,name="curve_points_point"),
+    path('batch/',views.batch,name="batch"),
+    path('export/<str:start>/',views.export,name="export"),
+    path('api/points/<str:start>/',views.api_points,name="api_points"),
+    path('api/points/point/<int:index>/',views.api_points,name="api_points_point"),
+    path('api/curves/<str:key>/points/<int:start>/',views.api_curve_points,name="api_curve_points"),
+    path('api/curves/<str:key>/points/point/<int:index>/',views.api_curve_points,name="api_curve_points_point"),
+    path('api/validate/',views.api_validate,name="api_validate"),
+    path('api/hash/',views.api_hash,name="api_hash"),
+    path('api/search/',views.api_search,name="api_search"),
     path('credits/', views.credits, name="credits")
 ]
\ No newline at end of file
@@ -1,10 +1,26 @@
+import json
+
 from django import forms
-from django.shortcuts import render
+from django.shortcuts import redirect, render
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
 from base import forms
+from base import catalogue
+from base import results
+from base import singleflight
+from base import httpcache
 from base.curves import *
-from sympy import nextprime
-import math
-from gmpy2 import mpz
+from base.curves import group
+from base.curves import encoding
+from base.curves import primes
+from base.curves import dispatch
+from base.curves import hashing
+from base.curves import planner
+from base.curves import search
+from base.curves import validate
+from base.curves.dispatch import PointAtInfinity, RoutedCurve
+from gmpy2 import is_prime, mpz, next_prime
 # Create your views here.
 # a = 0
 # d = 0
@@ -30,12 +46,23 @@ def home(request):
             d = request.session['d'] = adp_form.cleaned_data['d']
             p = request.session['p'] = adp_form.cleaned_data['p']
             request.session['set'] = True
-            new_p = request.session['new_p'] = nextprime(p-1)
+            # a catalogued curve already has a prime p, skip nextprime
+            known = catalogue.lookup(opt, a, d, p)
+            if known is None:
+                new_p = int(next_prime(p-1))
+                known = catalogue.lookup(opt, a, d, new_p)
+            else:
+                new_p = p
+            request.session['new_p'] = new_p
             lo = request.session['lo'] = int(new_p + 1 - 2*(new_p**0.5))
             hi = request.session['hi'] = int(new_p + 1 + 2*(new_p**0.5))
             # lo = request.session['lo'] = mpz(new_p + 1 - 2*(new_p**0.5))
             # hi = request.session['hi'] = mpz(new_p + 1 + 2*(new_p**0.5))
             prime = (new_p == p)
+            # Mersenne, pseudo-Mersenne and Solinas primes get their own reduction
+            prime_form = primes.describe(new_p)
+            # #E = p, division runs Smart's attack
+            anomalous = dispatch.is_anomalous(opt, a, d, new_p)
 
             #deciding on labels        
             a_label = 'a'
@@ -46,10 +73,58 @@ def home(request):
               a_label = 'A'
               d_label = 'B'
                         
-            return render(request, 'base/home.html', {'adp_form': adp_form, 'stage': 2, 'a': a, 'd': d, 'p': p, 'new_p': new_p, 'lo': lo, 'hi': hi, 'prime': prime, 'a_label': a_label, 'd_label': d_label, 'p_label': p_label})
+            return render(request, 'base/home.html', {'adp_form': adp_form, 'stage': 2, 'a': a, 'd': d, 'p': p, 'new_p': new_p, 'lo': lo, 'hi': hi, 'prime': prime, 'a_label': a_label, 'd_label': d_label, 'p_label': p_label, 'known': known, 'prime_form': prime_form, 'anomalous': anomalous})
     return render(request, 'base/home.html', {'adp_form': adp_form, 'stage': 1})
 
-def calc(request, start=0):
+#
+# divide() :- (k, message, plan) with p1 = k*p2 by the cheapest method
+# (see curves/planner.py), the answer is stored (see results.py) ; a
+# division estimated above CONFIRM_SECONDS only runs once confirmed
+#
+
+CONFIRM_SECONDS = 30
+
+def divide(curve, opt, a, d, p, p1, p2, confirmed=False):
+    # work modulo the order of the base point, not of the group
+    known = catalogue.facts(opt, a, d, p)
+    n = group.point_order(curve, a, d, p, (p2[0] % p, p2[1] % p), int(known.order), known.factors)
+    # no k exists outside <p2>, n*p1 tells without a search
+    if not validate.in_subgroup(opt, a, d, p, p1, n):
+        return -1, '({}, {}) is not in the subgroup of order {} generated by ({}, {})'.format(p1[0], p1[1], n, p2[0], p2[1]), ''
+    chosen = planner.plan(opt, a, d, p, p1, p2, n, known.factors)
+    summary = planner.describe(chosen)
+    if chosen['seconds'] > CONFIRM_SECONDS and not confirmed:
+        return 0, 'Estimated {}, tick "Confirm long runs" to start it'.format(summary), summary
+    k = planner.solve(opt, a, d, p, p1, p2, n, known.factors, chosen)
+    results.store_log(opt, a, d, p, p1, p2, k, n)
+    return k, '', summary
+
+def stored_log(opt, a, d, p, p1, p2):
+    k = results.lookup_log(opt, a, d, p, p1, p2)
+    return None if k is None else (k, '', '')
+
+#
+# page_points() :- (([x], [y]), pages) of the page of points from
+# x = start, or of the PAGE_POINTS points from point number index (see
+# catalogue.seek_points()), pages holds the range shown and the starts
+# of the pages around it
+#
+
+def page_points(opt, a, d, p, start, index=None):
+    if index is None:
+        points = RoutedCurve(opt).generatePoints(a, d, p, start)
+        end = min(p-1, start+999)
+    else:
+        points = catalogue.seek_points(opt, a, d, p, index)
+        start = points[0][0] if points[0] else p-1
+        end = points[0][-1] if points[0] else p-1
+    pages = {'start': start, 'end': end, 'prev': max(0, start-1000), 'next': min(p-1, start+1000), 'index': index}
+    if index is not None:
+        pages['prev_index'] = max(0, index - catalogue.PAGE_POINTS)
+        pages['next_index'] = index + catalogue.PAGE_POINTS if len(points[0]) == catalogue.PAGE_POINTS else None
+    return points, pages
+
+def calc(request, start=0, index=None):
     # handle start value
     start = int(start)
 
@@ -57,21 +132,23 @@ def calc(request, start=0):
     if not request.session['set']:
         return render(request,'base/notset.html')
     else:
-        curve = t_edwards
         opt1 = request.session['opt']
         # print("views -> opt1", opt1)
 
         a = request.session['a']
         d = request.session['d']
         new_p = request.session['new_p']
-        curve = t_edwards
-        if opt1 == '1':
-            curve = t_edwards
-        elif opt1 == '2':
-            curve = s_weirstrass_curve
-        elif opt1 == '3':
-            curve = montgomery_curve
-        points = curve.generatePoints(a, d, new_p, start)
+        # operations run in the cheapest curve model, see curves/dispatch.py
+        curve = RoutedCurve(opt1)
+        known = catalogue.lookup(opt1, a, d, new_p)
+        if known is not None:
+            catalogue.prepare(known)
+        try:
+            points, pages = page_points(opt1, a, d, new_p, start, index)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        # the same page under a URL that names the curve, cacheable, see points()
+        permalink = points_url(catalogue.curve_key(opt1, a % new_p, d % new_p, new_p), start if index is None else None, index)
         opt_form = forms.opt_form()
 
         a_label = 'a'
@@ -85,7 +162,8 @@ def calc(request, start=0):
         # Operations +,-,* trigger POST
         if request.method == "POST":
 
-            opt_form = forms.opt_form(request.POST)
+            # points off the curve are rejected by the form, see forms.opt_form.clean()
+            opt_form = forms.opt_form(request.POST, curve=(opt1, a, d, new_p))
             
             if opt_form.is_valid():
 
@@ -100,23 +178,364 @@ def calc(request, start=0):
                 x_res = 0
                 y_res = 0
                 k = 0
+                res = ''
+                plan = ''
 
-                if(opt == '2'):
-                    (x_res,y_res) = curve.addpoints(a,d,new_p,(x1,y1), (x2,y2))
-                elif(opt == '3'):
-                    (x_res,y_res) = curve.substractpoints(a,d,new_p,(x1,y1), (x2,y2))
-                elif(opt == '4'):
-                    (x_res,y_res) = curve.doublepoint(a,d,new_p,(x1,y1))
-                elif(opt == '5'):
-                    (x_res,y_res) = curve.multiplypoint(a,d,new_p,(x1,y1), x2)
-                elif(opt == '6'):
+                try:
+                    if(opt == '2'):
+                        (x_res,y_res) = curve.addpoints(a,d,new_p,(x1,y1), (x2,y2))
+                    elif(opt == '3'):
+                        (x_res,y_res) = curve.substractpoints(a,d,new_p,(x1,y1), (x2,y2))
+                    elif(opt == '4'):
+                        (x_res,y_res) = curve.doublepoint(a,d,new_p,(x1,y1))
+                    elif(opt == '5'):
+                        # answers are kept, see results.py
+                        stored = results.lookup_multiple(opt1, a, d, new_p, (x1,y1), x2)
+                        if stored is None:
+                            stored = curve.multiplypoint(a,d,new_p,(x1,y1), x2)
+                            if stored[1] != -1:
+                                results.store_multiple(opt1, a, d, new_p, (x1,y1), x2, stored)
+                        (x_res,y_res) = stored
+                except PointAtInfinity:
+                    # an Edwards curve whose d is a square, see curves/dispatch.py
+                    res = 'Point at infinity'
+                if(opt == '6'):
                     # (x_res, y_res) = curve.bsgs(a,d,new_p,(x1,y1),(x2,y2))
-                    k = curve.bsgs(a,d,new_p,(x1,y1),(x2,y2))
+                    k = results.lookup_log(opt1, a, d, new_p, (x1,y1), (x2,y2))
+                    if k is None:
+                        # identical divisions running together share one search, see singleflight.py
+                        confirmed = opt_form.cleaned_data['confirm']
+                        k, res, plan = singleflight.run(('log', catalogue.curve_key(opt1, a, d, new_p), (x1,y1), (x2,y2), confirmed),
+                                                        lambda: divide(curve, opt1, a, d, new_p, (x1,y1), (x2,y2), confirmed),
+                                                        lambda: stored_log(opt1, a, d, new_p, (x1,y1), (x2,y2)))
+                        known = catalogue.lookup(opt1, a, d, new_p)
+                elif(opt == '7'):
+                    known = catalogue.facts(opt1, a, d, new_p)
+                    res = known.order
+                elif(opt == '8'):
+                    known = catalogue.facts(opt1, a, d, new_p)
+                    res = group.point_order(curve, a, d, new_p, (x1 % new_p, y1 % new_p), int(known.order), known.factors)
+                elif(opt == '9'):
+                    known = catalogue.facts(opt1, a, d, new_p)
+                    g, order = group.random_generator(curve, a, d, new_p, int(known.order), known.factors)
+                    if g is None:
+                        res = 'No point found'
+                    else:
+                        res = '({}, {}) of order {}'.format(g[0], g[1], order)
+                elif(opt == '10'):
+                    (x_res,y_res) = hashing.sample(opt1, a, d, new_p, 1)[0]
+                elif(opt == '11'):
+                    hashed = hashing.hash_to_curve(opt1, a, d, new_p, opt_form.cleaned_data['message'])
+                    if hashed is None:
+                        res = 'Point at infinity'
+                    else:
+                        (x_res,y_res) = hashed
+                if opt1 == '2' and (x_res,y_res) == s_weirstrass_curve.IDENTITY:
+                    # no coordinates to show, see curves/s_weirstrass_curve.py
+                    res = 'Point at infinity'
 
-                return render(request,'base/calculate.html',{'opt_form': opt_form, 'a': a, 'd': d, 'p': new_p, 'xarray': points[0], 'yarray': points[1], 'Array': zip(points[0], points[1]), 'point_count': len(points[0]), 'x_res': x_res, 'y_res': y_res, 'k':k, 'result': True, 'start': start, 'end': min(new_p-1, start+999), 'prev': max(0, start-1000), 'next': min(new_p-1, start+1000), 'p_minus_1': new_p-1,'curve': opt1, 'a_label': a_label, 'd_label': d_label, 'p_label': p_label})
+                return render(request,'base/calculate.html',{'opt_form': opt_form, 'a': a, 'd': d, 'p': new_p, 'xarray': points[0], 'yarray': points[1], 'Array': zip(points[0], points[1]), 'point_count': len(points[0]), 'x_res': x_res, 'y_res': y_res, 'k':k, 'res': res, 'plan': plan, 'result': True, 'p_minus_1': new_p-1,'curve': opt1, 'a_label': a_label, 'd_label': d_label, 'p_label': p_label, 'known': known, 'permalink': permalink, **pages})
 
         # GET
-        return render(request,'base/calculate.html',{'opt_form': opt_form, 'a': a, 'd': d, 'p': new_p, 'xarray': points[0], 'yarray': points[1], 'Array': zip(points[0], points[1]), 'point_count': len(points[0]), 'start': start, 'end': min(new_p-1, start+999), 'prev': max(0, start-1000), 'next': min(new_p-1, start+1000), 'p_minus_1': new_p-1,'curve': opt1, 'a_label': a_label, 'd_label': d_label, 'p_label': p_label})
+        return render(request,'base/calculate.html',{'opt_form': opt_form, 'a': a, 'd': d, 'p': new_p, 'xarray': points[0], 'yarray': points[1], 'Array': zip(points[0], points[1]), 'point_count': len(points[0]), 'p_minus_1': new_p-1,'curve': opt1, 'a_label': a_label, 'd_label': d_label, 'p_label': p_label, 'known': known, 'permalink': permalink, **pages})
     
 def credits(request):
-    return render(request, 'base/credits.html')
\ No newline at end of file
+    return render(request, 'base/credits.html')
+
+def batch(request):
+    if not request.session.get('set'):
+        return render(request,'base/notset.html')
+
+    opt1 = request.session['opt']
+    a = request.session['a']
+    d = request.session['d']
+    new_p = request.session['new_p']
+    curve = RoutedCurve(opt1)
+
+    a_label = 'a'
+    d_label = 'd'
+    p_label = 'p'
+    if opt1 == '3':
+      a_label = 'A'
+      d_label = 'B'
+
+    batch_form = forms.batch_form()
+    known = None
+    rows = []
+
+    if request.method == "POST":
+        batch_form = forms.batch_form(request.POST, curve=(opt1, a, d, new_p))
+        if batch_form.is_valid():
+            opt = batch_form.cleaned_data['opt']
+            known = catalogue.facts(opt1, a, d, new_p)
+            n = int(known.order)
+
+            if opt == '1':
+                points = [(x % new_p, y % new_p) for x, y in batch_form.cleaned_data['points']]
+                rows = list(zip(points, group.batch_point_order(curve, a, d, new_p, points, n, known.factors)))
+            elif opt == '2':
+                rows = [group.random_generator(curve, a, d, new_p, n, known.factors) for _ in range(batch_form.cleaned_data['count'])]
+
+    return render(request, 'base/batch.html', {'batch_form': batch_form, 'a': a, 'd': d, 'p': new_p, 'known': known, 'rows': rows, 'a_label': a_label, 'd_label': d_label, 'p_label': p_label})
+
+#
+# request_curve() :- (opt, a, d, p) of the ?curve=<opt>:<a>:<d>:<p>
+# query (see catalogue.curve_key()), checked by canonical_curve(), or
+# of the session, None if neither is set
+#
+# canonical_curve() :- (opt, a, d, p) of a curve key with a and d
+# reduced mod p, ValueError when it is not a curve over a prime
+# field above 3 (the short Weierstrass model the operations run in
+# needs p > 3)
+#
+# an anonymous ?curve= may not name a field from API_MAX_P on, every
+# request on it then stays quick
+#
+
+API_MAX_P = 1 << 521
+
+def parse_curve_key(key):
+    opt, a, d, p = key.split(':')
+    if opt not in ('1', '2', '3'):
+        raise ValueError('unknown curve model {}'.format(opt))
+    return opt, int(a), int(d), int(p)
+
+def canonical_curve(key):
+    opt, a, d, p = parse_curve_key(key)
+    if p < 5 or not is_prime(p):
+        raise ValueError('p must be a prime above 3, {} is not'.format(p))
+    a, d = a % p, d % p
+    if not search.valid(opt, a, d, p):
+        raise ValueError('{}:{}:{}:{} is singular'.format(opt, a, d, p))
+    return opt, a, d, p
+
+def request_curve(request):
+    key = request.GET.get('curve')
+    if key:
+        curve = canonical_curve(key)
+        if curve[3] >= API_MAX_P:
+            raise ValueError('p must be below 2^{}'.format(API_MAX_P.bit_length() - 1))
+        return curve
+    if not request.session.get('set'):
+        return None
+    return request.session['opt'], request.session['a'], request.session['d'], request.session['new_p']
+
+#
+# export() :- the points of the page starting at x = start as
+# fixed width binary records, ?format=uncompressed for both
+# coordinates (see curves/encoding.py)
+#
+
+def export(request, start=0):
+    try:
+        curve = request_curve(request)
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
+    if curve is None:
+        return render(request,'base/notset.html')
+    opt, a, d, p = curve
+    compressed = request.GET.get('format', 'compressed') != 'uncompressed'
+    x, y = RoutedCurve(opt).generatePoints(a, d, p, int(start))
+    response = HttpResponse(encoding.encode_points(opt, p, zip(x, y), compressed), content_type='application/octet-stream')
+    response['Content-Disposition'] = 'attachment; filename="points-{}-{}.bin"'.format(int(start), 'compressed' if compressed else 'uncompressed')
+    return response
+
+#
+# api_points() :- JSON version of export(), one hex string per point,
+# the PAGE_POINTS points from point number index for the index URLs
+# (see catalogue.seek_points())
+#
+
+def api_points(request, start=0, index=None):
+    try:
+        curve = request_curve(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if curve is None:
+        return JsonResponse({'error': 'no curve set, pass ?curve=<opt>:<a>:<d>:<p>'}, status=400)
+    compressed = request.GET.get('format', 'compressed') != 'uncompressed'
+    return points_json(*curve, start, index, compressed)
+
+def points_json(opt, a, d, p, start, index, compressed):
+    if index is None:
+        x, y = RoutedCurve(opt).generatePoints(a, d, p, int(start))
+    else:
+        try:
+            x, y = catalogue.seek_points(opt, a, d, p, index)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    size = encoding.point_size(opt, p, compressed)
+    data = encoding.encode_points(opt, p, zip(x, y), compressed)
+    return JsonResponse({
+        'curve': catalogue.curve_key(opt, a, d, p),
+        'start': int(start) if index is None else (x[0] if x else None),
+        'index': index,
+        'format': 'compressed' if compressed else 'uncompressed',
+        'point_size': size,
+        'points': [data[i:i + size].hex() for i in range(0, len(data), size)],
+    })
+
+def points_url(key, start=0, index=None):
+    if index is None:
+        return reverse('curve_points', args=[key, start])
+    return reverse('curve_points_point', args=[key, index])
+
+#
+# points() :- the page of points of calc() for the curve named in the
+# URL instead of the session, read only ; the points of a URL never
+# change, so the page is served immutable with a strong ETag and
+# compressed (see httpcache.py), and a curve key that is not
+# canonical redirects to the one that is
+#
+# api_curve_points() :- the same for api_points()
+#
+
+def canonical_redirect(request, key):
+    curve = canonical_curve(key)
+    canonical = catalogue.curve_key(*curve)
+    if canonical == key:
+        return curve, None
+    match = request.resolver_match
+    return curve, redirect(match.view_name, permanent=True, **{**match.kwargs, 'key': canonical})
+
+def points(request, key, start=0, index=None):
+    try:
+        curve, moved = canonical_redirect(request, key)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if moved is not None:
+        return moved
+    return httpcache.immutable(request, ('points', key, start, index), lambda: render_points(request, key, *curve, start, index))
+
+def render_points(request, key, opt, a, d, p, start, index):
+    try:
+        points, pages = page_points(opt, a, d, p, start, index)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    labels = ('A', 'B', 'p') if opt == '3' else ('a', 'd', 'p')
+    if index is None:
+        pages['prev_url'] = points_url(key, pages['prev']) if pages['start'] > 0 else None
+        pages['next_url'] = points_url(key, pages['next']) if pages['end'] < p-1 else None
+    else:
+        pages['prev_url'] = points_url(key, index=pages['prev_index']) if index > 0 else None
+        pages['next_url'] = points_url(key, index=pages['next_index']) if pages['next_index'] is not None else None
+    return render(request, 'base/points.html', {'key': key, 'a': a, 'd': d, 'p': p, 'xarray': points[0], 'yarray': points[1], 'point_count': len(points[0]), 'curve': opt, 'a_label': labels[0], 'd_label': labels[1], 'p_label': labels[2], **pages})
+
+def api_curve_points(request, key, start=0, index=None):
+    try:
+        curve, moved = canonical_redirect(request, key)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if moved is not None:
+        return moved
+    compressed = request.GET.get('format', 'compressed') != 'uncompressed'
+    return httpcache.immutable(request, ('api_points', key, start, index, compressed), lambda: points_json(*curve, start, index, compressed))
+
+#
+# api_validate() :- POST of {"points": [[x, y], ...], "subgroup": true}
+# as JSON, whether each point is on the curve and, with "subgroup",
+# in the subgroup of the largest prime factor of the group order
+# (n*P = O), every point at once (see curves/validate.py) ; the order
+# is only read from the catalogue, this view never counts a curve
+#
+
+@csrf_exempt
+def api_validate(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST a JSON body {"points": [[x, y], ...]}'}, status=405)
+    try:
+        curve = request_curve(request)
+        body = json.loads(request.body or b'{}')
+        points = [(int(x), int(y)) for x, y in body.get('points', [])]
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if curve is None:
+        return JsonResponse({'error': 'no curve set, pass ?curve=<opt>:<a>:<d>:<p>'}, status=400)
+    opt, a, d, p = curve
+    on_curve = validate.batch_on_curve(opt, a, d, p, points)
+    data = {'curve': catalogue.curve_key(opt, a, d, p), 'on_curve': on_curve}
+    if body.get('subgroup'):
+        known = catalogue.lookup(opt, a, d, p)
+        if known is None or known.order is None:
+            return JsonResponse({'error': 'the order of {} is not catalogued, count it with Group Order (#E) on the calculator first'.format(data['curve'])}, status=409)
+        n = max((int(q) for q, _ in known.factors), default=1)
+        on = [pt for pt, ok in zip(points, on_curve) if ok]
+        inside = iter(validate.batch_in_subgroup(opt, a, d, p, on, n))
+        data['subgroup_order'] = n
+        data['in_subgroup'] = [ok and next(inside) for ok in on_curve]
+    return JsonResponse(data)
+
+#
+# point_json() :- [x, y] of a point, null for a point at infinity
+# (see curves/hashing.py) and for the Weierstrass identity, which has
+# no coordinates
+#
+
+def point_json(pt):
+    return None if pt in (None, s_weirstrass_curve.IDENTITY) else list(pt)
+
+#
+# api_hash() :- points of the curve without enumeration, hashed from
+# every ?msg= (hash_to_curve, ?encode=1 for encode_to_curve) and
+# ?random=<count> random ones (see curves/hashing.py)
+#
+
+def api_hash(request):
+    try:
+        curve = request_curve(request)
+        count = int(request.GET.get('random', 0))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if curve is None:
+        return JsonResponse({'error': 'no curve set, pass ?curve=<opt>:<a>:<d>:<p>'}, status=400)
+    if not 0 <= count <= 1000:
+        return JsonResponse({'error': 'random: at most 1000 points'}, status=400)
+    opt, a, d, p = curve
+    messages = request.GET.getlist('msg')
+    if request.GET.get('encode'):
+        hashed = [hashing.encode_to_curve(opt, a, d, p, m) for m in messages]
+    else:
+        hashed = hashing.batch_hash_to_curve(opt, a, d, p, messages)
+    return JsonResponse({
+        'curve': catalogue.curve_key(opt, a, d, p),
+        'method': hashing.method(opt, a, d, p),
+        'dst': hashing.DST.decode(),
+        'points': [point_json(pt) for pt in hashed],
+        'random': [point_json(pt) for pt in hashing.sample(opt, a, d, p, count)],
+    })
+
+#
+# api_search() :- curves over ?p= meeting the constraints, streamed
+# as one JSON object per line while the search runs (see
+# curves/search.py), ?models=123&a=1:100&d=1:100&cofactor=&
+# twist_cofactor=&embedding=&min_cm=&limit=
+#
+
+SEARCH_CANDIDATES = 100000
+# an anonymous request may not start more than this : p below
+# SEARCH_MAX_P, where counting and factoring stay quick, and
+# SEARCH_JOBS worker processes
+SEARCH_MAX_P = 1 << 64
+SEARCH_JOBS = 2
+
+def api_search(request):
+    try:
+        p = int(request.GET['p'])
+        models = [m for m in request.GET.get('models', '123') if m in '123']
+        a_range, d_range = (range(*(int(v) for v in request.GET.get(k, '1:100').split(':'))) for k in ('a', 'd'))
+        limit = min(int(request.GET.get('limit', 10)), 100)
+        constraints = {k: int(request.GET[k]) for k in ('cofactor', 'twist_cofactor', 'embedding', 'min_cm') if request.GET.get(k)}
+    except (KeyError, ValueError, TypeError) as e:
+        return JsonResponse({'error': 'bad search parameters: {}'.format(e)}, status=400)
+    if p < 5 or not is_prime(p):
+        return JsonResponse({'error': 'p must be a prime above 3'}, status=400)
+    if p >= SEARCH_MAX_P:
+        return JsonResponse({'error': 'p must be below 2^{}, see manage.py searchcurves for larger ones'.format(SEARCH_MAX_P.bit_length() - 1)}, status=400)
+    if len(models) * len(a_range) * len(d_range) > SEARCH_CANDIDATES:
+        return JsonResponse({'error': 'at most {} candidates'.format(SEARCH_CANDIDATES)}, status=400)
+
+    def lines():
+        for res in search.search(p, models, a_range, d_range, jobs=SEARCH_JOBS, limit=limit, **constraints):
+            yield json.dumps(res) + '\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tedwards.settings')
 
 application = get_wsgi_application()
+
+# under gunicorn --preload this runs once in the master : the group
+# tables of the small catalogued curves are built before the workers
+# fork and shared with all of them (see base/curves/shared.py)
+if os.environ.get('TEDWARDS_PRELOAD_TABLES'):
+    from base import catalogue
+
+    catalogue.preload_tables()